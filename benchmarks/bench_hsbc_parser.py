@@ -0,0 +1,75 @@
+"""
+Benchmark typed hsbc parser against the previous string clean up path
+
+run from repository root: `python benchmarks/bench_hsbc_parser.py --rows 100000`
+"""
+import argparse
+import random
+import sys
+import tempfile
+import time
+import pandas as pd
+
+from datetime import date, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.joinpath("src", "extracts")))
+
+from utilities.hsbc import read_hsbc_txn  # noqa: E402
+
+
+def write_export(path: Path, rows: int):
+    """Write synthetic hsbc export -> dd/mm/yyyy, payee, quoted amount with thousands separator"""
+    _random = random.Random(0)
+    _start = date(2015, 1, 1)
+    with open(path, "w") as f:
+        for _ in range(rows):
+            _date = _start + timedelta(days=_random.randint(0, 3650))
+            _amount = _random.uniform(-2500, 2500)
+            f.write(f'{_date.strftime("%d/%m/%Y")},CARD PAYMENT TO SHOP{_random.randint(0, 999)},"{_amount:,.2f}"\n')
+
+
+def legacy_parse(path: Path) -> pd.DataFrame:
+    """Previous path: read untyped, cast to str, strip separators and quotes, infer date format per element"""
+    _df_in = pd.read_csv(str(path), header=None)
+    _df_in.columns = ['date', 'payee', 'amount']
+    _df_in[['payee', 'amount']] = _df_in[['payee', 'amount']].astype(str)
+    _df_in['date'] = pd.to_datetime(_df_in['date'], dayfirst=True)
+    _df_in.loc[:, 'amount'] = _df_in['amount'].str.replace(',', '')
+    _df_in.loc[:, 'amount'] = _df_in['amount'].str.replace('"', '')
+    _df_in[['amount']] = _df_in[['amount']].astype(float)
+    return _df_in
+
+
+def best_of(func, path: Path, repeat: int) -> float:
+    _timings = []
+    for _ in range(repeat):
+        _start = time.perf_counter()
+        func(path)
+        _timings.append(time.perf_counter() - _start)
+    return min(_timings)
+
+
+def main():
+    _parser = argparse.ArgumentParser(description="benchmark hsbc txn parsing")
+    _parser.add_argument("--rows", type=int, default=100000)
+    _parser.add_argument("--repeat", type=int, default=3)
+    args = _parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as _dir:
+        _path = Path(_dir).joinpath("2024-01-25_txn.csv")
+        write_export(_path, args.rows)
+
+        _legacy, _typed = legacy_parse(_path), read_hsbc_txn(_path)
+        assert _legacy["amount"].round(2).equals(_typed["amount"].round(2))
+        assert _legacy["date"].equals(_typed["date"])
+
+        _legacy_time = best_of(legacy_parse, _path, args.repeat)
+        _typed_time = best_of(read_hsbc_txn, _path, args.repeat)
+    print(f"rows: {args.rows}")
+    print(f"legacy parse: {_legacy_time:.3f}s")
+    print(f"typed parse:  {_typed_time:.3f}s ({_legacy_time / _typed_time:.1f}x faster)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,183 @@
+"""
+Benchmark peak memory of the transaction transforms against the previous deepcopy based versions
+
+run from repository root: `python benchmarks/bench_memory.py --years 5 --rows-per-day 40`
+
+Each transform runs in a fresh process on a synthetic history. Peak allocation during the transform is
+measured with tracemalloc, peak rss with resource where available (not on windows).
+"""
+import argparse
+import copy
+import logging
+import multiprocessing
+import sys
+import tracemalloc
+import numpy as np
+import pandas as pd
+
+from datetime import datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.joinpath("src", "extracts")))
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+def make_ynab_history(years: int, rows_per_day: int) -> pd.DataFrame:
+    """Synthetic ynab export -> Date (dd/mm/yyyy), Payee, Category, Memo, Outflow, Inflow"""
+    _random = np.random.default_rng(0)
+    _dates = pd.date_range("2019-01-01", periods=365 * years, freq="D").repeat(rows_per_day)
+    _rows = len(_dates)
+    _amounts = np.round(_random.uniform(-250, 100, _rows), 2)
+    _payees = np.where(_random.random(_rows) < 0.02, "Transfer : Cash",
+                       "Shop " + pd.Series(_random.integers(0, 500, _rows)).astype(str))
+    _categories = np.where(_random.random(_rows) < 0.5, "Monthly: Groceries", "Monthly: Discretionary")
+    return pd.DataFrame({
+        "Date": _dates.strftime("%d/%m/%Y"),
+        "Payee": _payees,
+        "Category": _categories,
+        "Memo": "",
+        "Outflow": np.where(_amounts < 0, -_amounts, np.nan),
+        "Inflow": np.where(_amounts >= 0, _amounts, np.nan),
+    })
+
+
+def make_balance(df_txn: pd.DataFrame) -> pd.DataFrame:
+    """Monthly statements on the 25th which reconcile with the transactions"""
+    _dates = pd.to_datetime(df_txn["transaction_date"])
+    _statement_dates = pd.date_range(_dates.min(), _dates.max(), freq="MS") + pd.Timedelta(days=24)
+    _totals = df_txn.groupby(_dates)["amount"].sum().cumsum()
+    _closing = _totals.reindex(_statement_dates, method="ffill").fillna(0).round(2).to_numpy()
+    return pd.DataFrame({
+        "statement_date": _statement_dates,
+        "opening_balance": np.concatenate([[0], _closing[:-1]]),
+        "closing_balance": _closing,
+    })
+
+
+def legacy_clean_df_txn(df_param: pd.DataFrame) -> list:
+    """Previous clean_df_txn: deepcopy, chained inplace fillna, deepcopies of the cash rows"""
+    df_ynab = copy.deepcopy(df_param)
+    df_ynab = df_ynab.astype({'Outflow': float, 'Inflow': float})
+    df_ynab['Outflow'].fillna(0, inplace=True)
+    df_ynab['Inflow'].fillna(0, inplace=True)
+    df_ynab['amount'] = df_ynab['Inflow'] - df_ynab['Outflow']
+    df_ynab['account'] = 'HSBC DC'
+    df_ynab.rename(columns={'Date': 'transaction_date', 'Payee': 'payee', 'Memo': 'memo'}, inplace=True)
+    df_ynab.loc[df_ynab['payee'] == 'Transfer : Cash', 'Category'] = 'Transfer-out: Cash'
+    df_ynab['master_category'] = df_ynab['Category'].str.split(':').str[0]
+    df_ynab['subcategory'] = df_ynab['Category'].str.split(':').str[1].str.strip()
+    df_ynab['transaction_date'] = pd.to_datetime(df_ynab['transaction_date'], dayfirst=True)
+    df_ynab = df_ynab.astype({'amount': float})
+    df_cash = copy.deepcopy(df_ynab.loc[df_ynab['payee'] == 'Transfer : Cash', :])
+    if not df_cash.empty:
+        df_cash['account'] = 'Cash'
+        df_cash['amount'] = df_cash['amount'] * -1
+        df_cash['payee'] = 'Transfer : HSBC DC'
+        df_cash['master_category'] = 'Transfer-in'
+        df_cash['subcategory'] = 'HSBC DC'
+        df_cash_debit = copy.deepcopy(df_cash)
+        df_cash_debit['amount'] = df_cash_debit['amount'] * -1
+        df_cash_debit['payee'] = 'Misc'
+        df_cash_debit['master_category'] = 'Monthly'
+        df_cash_debit['subcategory'] = 'Discretionary'
+        df_cash = pd.concat([df_cash, df_cash_debit])
+        df_cash.sort_values(by=['transaction_date', 'amount'], inplace=True)
+    cols = ['account', 'transaction_date', 'payee', 'master_category', 'subcategory', 'memo', 'amount']
+    return [df_ynab[cols], df_cash[cols]]
+
+
+def legacy_validate_full_amount_bank(df_in: pd.DataFrame, df_balance: pd.DataFrame) -> bool:
+    """Previous validate_full_amount_bank, reconciling path: deepcopy, sort, merges, concat and ffill"""
+    _df = copy.deepcopy(df_in)
+    _df = _df.sort_values(by=["transaction_date"])
+    _max_txn_date = _df.tail(1)["transaction_date"].values[0]
+    _max_date = _max_txn_date
+    for _statement_date in list(df_balance["statement_date"]):
+        if _statement_date.date() < datetime.strptime(_max_txn_date, "%Y-%m-%d").date():
+            continue
+        _max_date = _statement_date
+        break
+    _df_balance = df_balance.loc[df_balance["statement_date"] <= _max_date, :].copy()
+    _df['balance'] = _df['amount'].cumsum()
+    _df['eod_balance'] = _df.groupby('transaction_date')['balance'].transform('last')
+    _df.loc[_df.groupby('transaction_date').tail(1).index, 'end_of_day'] = 'True'
+    _df['end_of_day'] = _df['end_of_day'].fillna('False')
+    _df["transaction_date"] = pd.to_datetime(_df["transaction_date"]).copy()
+    _df_add = pd.merge(_df_balance, _df, left_on=["statement_date"], right_on=["transaction_date"], how="left")
+    _df_add = _df_add.loc[_df_add["account"].isna()]
+    _df_add["transaction_date"] = _df_add["statement_date"]
+    cols = ["account", "transaction_date", "payee", "master_category", "subcategory", "memo", "amount"]
+    _df_add = _df_add[cols]
+    _df = pd.concat([_df, _df_add], ignore_index=True).copy()
+    _df.sort_values(by=['transaction_date'], inplace=True)
+    _df.reset_index(drop=True, inplace=True)
+    _df["eod_balance"].fillna(method="ffill", inplace=True)
+    _df_balance["statement_date"] = pd.to_datetime(_df_balance["statement_date"])
+    _df_eom = pd.merge(_df_balance, _df, left_on=["statement_date"], right_on=["transaction_date"], how="inner")
+    return _df_eom.loc[round(_df_eom["closing_balance"], 2) != round(_df_eom["eod_balance"], 2)].empty
+
+
+def run_case(case: str, variant: str, years: int, rows_per_day: int) -> dict:
+    """Build the input, then run one transform, measuring the memory it needs on top of its input"""
+    logging.disable(logging.CRITICAL)
+    import generate_final_from_ynab as final
+
+    _df_ynab = make_ynab_history(years, rows_per_day)
+    if case == "clean_df_txn":
+        _args = (_df_ynab,)
+        _func = legacy_clean_df_txn if variant == "legacy" else (lambda _df: final.clean_df_txn(_df, "2024-01-25"))
+    else:
+        _df_txn = final.clean_df_txn(_df_ynab, "2024-01-25")[0]["df"]
+        _df_balance = make_balance(_df_txn)
+        if variant == "legacy":
+            _df_txn = _df_txn.assign(transaction_date=_df_txn["transaction_date"].dt.strftime("%Y-%m-%d"))
+            _func = legacy_validate_full_amount_bank
+        else:
+            _func = (lambda _df, _df_bal: final.validate_full_amount_bank(_df, _df_bal)[0])
+        _args = (_df_txn, _df_balance)
+        del _df_ynab
+
+    _rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss if resource else None
+    tracemalloc.start()
+    _result = _func(*_args)
+    _, _peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    _rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss if resource else None
+    return {
+        "rows": len(_args[0].index),
+        "peak_alloc_mb": _peak / 2 ** 20,
+        # ru_maxrss is in kilobytes on linux
+        "peak_rss_growth_mb": (_rss_after - _rss_before) / 2 ** 10 if resource else None,
+        "valid": _result if isinstance(_result, bool) else None,
+    }
+
+
+def main():
+    _parser = argparse.ArgumentParser(description="benchmark peak memory of transaction transforms")
+    _parser.add_argument("--years", type=int, default=5)
+    _parser.add_argument("--rows-per-day", type=int, default=40)
+    args = _parser.parse_args()
+
+    _context = multiprocessing.get_context("spawn")
+    for _case in ["clean_df_txn", "validate_full_amount_bank"]:
+        _results = {}
+        for _variant in ["legacy", "current"]:
+            with _context.Pool(1) as _pool:
+                _results[_variant] = _pool.apply(run_case, (_case, _variant, args.years, args.rows_per_day))
+        _legacy, _current = _results["legacy"], _results["current"]
+        if _legacy["valid"] is not None:
+            assert _legacy["valid"] and _current["valid"], "synthetic history does not reconcile"
+        print(f"{_case} ({_current['rows']} rows)")
+        print(f"  peak allocated: legacy {_legacy['peak_alloc_mb']:.1f} MB, current {_current['peak_alloc_mb']:.1f} MB "
+              f"({_legacy['peak_alloc_mb'] / _current['peak_alloc_mb']:.1f}x less)")
+        if _current["peak_rss_growth_mb"] is not None:
+            print(f"  peak rss growth: legacy {_legacy['peak_rss_growth_mb']:.1f} MB, "
+                  f"current {_current['peak_rss_growth_mb']:.1f} MB")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+"""
+Locates where an account's transaction history stops reconciling with its statement balances
+
+Steps
+1. run `python diagnose_reconciliation.py`
+    - optionally `-a <account>` e.g. hsbc_cc, the debit card by default
+    - optionally `-f <file name>` to diagnose a file in the root folder e.g. transaction_hsbc_dc.csv,
+      the fact table in the facts folder by default
+2. the first statement period and day where the running balance diverges, and the rows most likely to
+   explain it, are logged and written to <error file>_periods.csv and <error file>_candidates.csv
+"""
+import logging
+import argparse
+
+from typing import Final
+from pathlib import Path
+
+from utilities import setup_logging, write_df, get_balance, get_extracts_path, read_fact, read_fact_csv
+from utilities import get_account_adapter, localize_mismatch, set_exact_money
+
+from generate_final_from_ynab import log_mismatch_diagnosis
+
+
+def diagnose_account(extracts_path: Path, account: str, file_name: str = None, limit: int = 10) -> dict:
+    """Locate first statement period and day where the transactions of an account diverge from its balances
+
+    Args:
+        extracts_path: (Path) extracts directory
+        account: (str) account name e.g. hsbc_dc
+        file_name: (str) transaction file in the extracts directory, the fact table if not supplied
+        limit: (int) number of candidate rows
+
+    Returns:
+        dict: diagnosis, see localize_mismatch
+    """
+    _adapter = get_account_adapter(account)
+    if file_name:
+        _file_path = Path.joinpath(extracts_path, file_name)
+        _df = read_fact_csv(_file_path)
+    else:
+        _file_path = Path.joinpath(extracts_path, "facts", f"{_adapter.fact_name}.csv")
+        _df = read_fact(_adapter.fact_name, Path.joinpath(extracts_path, "facts"))
+    _logger.info(f"diagnosing {_file_path} against {_adapter.balance_filename}...")
+    _diagnosis = localize_mismatch(df_txn=_df, df_balance=get_balance(_adapter.balance_filename), limit=limit)
+
+    _df_periods = _diagnosis["periods"]
+    _logger.info(f"...{len(_df_periods.index)} statement periods, "
+                 f"{int((~_df_periods['match'].astype(bool)).sum())} differ")
+    log_mismatch_diagnosis(_diagnosis)
+
+    _error_stem = Path(_adapter.error_filename).stem
+    for _name, _df_out in [("periods", _df_periods), ("candidates", _diagnosis["candidates"])]:
+        _path = Path.joinpath(extracts_path, f"{_error_stem}_{_name}.csv")
+        _logger.info(f"...writing file {_path}")
+        write_df(df_in=_df_out, path=str(_path))
+    return _diagnosis
+
+
+def setup_args():
+    _parser.add_argument("-a", "--account", type=str, default="hsbc_dc",
+                         help="account to diagnose e.g. hsbc_dc, hsbc_cc")
+    _parser.add_argument("-f", "--file_name", type=str, default=None,
+                         help="transaction file in the root folder, the fact table if not supplied")
+    _parser.add_argument("-n", "--limit", type=int, default=10,
+                         help="number of candidate rows to report")
+    _parser.add_argument("--exact-money", action="store_true",
+                         help="hold amounts as integer pence, totals and reconciliation are exact")
+
+
+def main(args_in: dict):
+    """Main entrypoint"""
+    if args_in.get("exact_money"):
+        set_exact_money(True)
+    _diagnosis = diagnose_account(extracts_path=get_extracts_path(), account=str(args_in.get("account")),
+                                  file_name=args_in.get("file_name"), limit=int(args_in.get("limit") or 10))
+    if _diagnosis["first_period"] is not None:
+        _logger.info(f"candidates:\n{_diagnosis['candidates'].to_string(index=False)}")
+
+
+_logger = logging.getLogger(__name__)
+setup_logging()
+_parser: Final = argparse.ArgumentParser(
+    description="Python utility to locate where transactions stop reconciling with statement balances")
+setup_args()
+
+
+if __name__ == '__main__':
+    main(vars(_parser.parse_args()))
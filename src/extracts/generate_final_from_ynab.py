@@ -1,432 +1,566 @@
 import logging
+import argparse
 import os
 import pandas as pd
-import copy
 
+from functools import partial
+from typing import Final
 from pathlib import Path
-from datetime import datetime
 
-from utilities import setup_logging, write_df, get_balance, get_files_list, validate_category, get_extracts_path
+from utilities import setup_logging, write_df, get_balance, get_files_list, get_extracts_path
+from utilities import get_balance_index, BalanceIndex, run_statements, StatementError, RunManifest
+from utilities import read_fact, read_fact_csv, write_fact, empty_fact, FactKeyIndex
+from utilities import BalanceCheckpoint, hash_balances, hash_transactions
+from utilities import reconcile_statements, statement_detail, localize_mismatch
+from utilities import get_category_keys, find_missing_categories, validate_statements
+from utilities import AccountAdapter, get_account_adapter, get_account_adapters
+from utilities import set_exact_money, to_money, to_pounds
 
 os.environ['NUMEXPR_MAX_THREADS'] = '4'
 os.environ['NUMEXPR_NUM_THREADS'] = '2'
 
 
-def validate_monthly_amount_bank(df_in: pd.DataFrame, statement_date: str, df_balance: pd.DataFrame) -> bool:
-    """Validate monthly bank df to check if reconcile with opening and closing balances
+def validate_full_amount_bank(df_in: pd.DataFrame, df_balance: pd.DataFrame) -> tuple:
+    """Validate full bank df to check if reconcile with opening and closing balances
+
+    Each statement is compared with the running balance after the last transaction on or before its date,
+    see reconcile_statements.
 
     Args:
         df_in: (Dataframe) monthly bank df
-        statement_date: (str) statement date in yyyy-mm-dd format
-        df_balance: (DataFrame) dataframe containing balance
+        df_balance: (Dataframe) balances df
 
     Returns:
-        bool: status if df amounts reconcile
+        tuple: (bool, mismatch df) status if df amounts reconcile
     """
-    _opening_balance = df_balance.loc[df_balance["statement_date"] == statement_date, "opening_balance"].values[0]
-    _closing_balance = df_balance.loc[df_balance["statement_date"] == statement_date, "closing_balance"].values[0]
-    _expected_total = round(_closing_balance - _opening_balance, 2)
-    _actual_total = round(df_in["amount"].sum(), 2)
-    _logger.debug(f"...actual opening balance: {_opening_balance}")
-    _logger.debug(f"...actual closing balance: {_closing_balance}")
-    _logger.debug(f"...expected total: {_expected_total}, actual total: {_actual_total}")
-    if _expected_total != _actual_total:
-        return False
+    _logger.info("...reconcile end of transaction period balance")
+    _df_report = reconcile_statements(df_txn=df_in, df_balance=df_balance)
+    _df_mismatch = _df_report.loc[~_df_report["match"]]
+    if not _df_mismatch.empty:
+        for _, _row in _df_mismatch.iterrows():
+            _logger.info(f"...statement {_row['statement_date'].date()}: expected {_row['closing_balance']}, "
+                         f"actual {_row['actual_balance']}")
+        log_mismatch_diagnosis(localize_mismatch(df_txn=df_in, df_balance=df_balance, limit=3))
+        return False, statement_detail(df_txn=df_in, df_report=_df_report)
     else:
-        return True
+        _expected_final_balance = _df_report["closing_balance"].values[-1] if not _df_report.empty else 0
+        _actual_balance = round(to_pounds(df_in["amount"].sum()), 2)
+        _logger.info(f"...expected final balance: {_expected_final_balance}, actual final balance: {_actual_balance}")
+        return True, _df_mismatch
 
 
-def validate_monthly_amount_cash(df_in: pd.DataFrame) -> bool:
-    """Validate monthly cash df to check if reconcile with opening and closing balances
+def log_mismatch_diagnosis(diagnosis: dict):
+    """Log first statement period where the running balance diverges and the rows most likely to explain it
 
     Args:
-        df_in: (Dataframe) monthly bank df
-
-    Returns:
-        bool: status if df amounts reconcile
+        diagnosis: (dict) see localize_mismatch
     """
-    _actual_total = round(df_in["amount"].sum(), 2)
-    _logger.debug(f"...actual net amount: {_actual_total}")
-    if _actual_total != 0:
-        return False
-    else:
-        return True
-
-
-def validate_full_amount_bank(df_in: pd.DataFrame, df_balance: pd.DataFrame) -> tuple:
-    """Validate full bank df to check if reconcile with opening and closing balances
-
-    Dataframe operations used:
-    cumsum
-    https://pandas.pydata.org/pandas-docs/stable/reference/api/pandas.DataFrame.cumsum.html?highlight=cumsum#pandas.DataFrame.cumsum
-
-    groupby transform last
-    https://pandas.pydata.org/pandas-docs/stable/reference/api/pandas.core.groupby.GroupBy.last.html
+    _period = diagnosis["first_period"]
+    if _period is None:
+        _logger.info("...no statement period differs")
+        return
+    _logger.info(f"...running balance first diverges in the statement period ending "
+                 f"{_period['statement_date'].date()}, difference {_period['period_difference']}")
+    if _period["opening_gap"] != 0:
+        _logger.info(f"...opening balance differs from the previous closing balance by {_period['opening_gap']}")
+    if diagnosis["first_day"] is not None:
+        _logger.info(f"...first diverging day: {diagnosis['first_day'].date()}")
+    for _row in diagnosis["candidates"].itertuples():
+        _logger.info(f"...candidate {_row.rank}: {_row.transaction_date.date()} {_row.payee} {_row.amount}, "
+                     f"{_row.explanation}{', duplicate' if _row.duplicate else ''}, residual {_row.residual}")
+
+
+def reconcile_amount_bank(df_in: pd.DataFrame, df_balance: pd.DataFrame, checkpoint: BalanceCheckpoint,
+                          account: str, full: bool = False) -> tuple:
+    """Reconcile full bank df with balances, starting from the last reconciled statement
+
+    Transactions up to the checkpoint statement are not reconciled again as long as their dates and amounts,
+    and the balances of statements up to it, are unchanged. Otherwise, or if full is set, the whole history is
+    reconciled. The checkpoint moves to the last statement on or before the latest transaction once the df
+    reconciles.
 
     Args:
-        df_in: (Dataframe) monthly bank df
+        df_in: (Dataframe) full bank df
         df_balance: (Dataframe) balances df
+        checkpoint: (BalanceCheckpoint) reconciled statement checkpoints
+        account: (str) account of the bank df e.g. transaction_hsbc_dc
+        full: (bool) reconcile the whole history, e.g. for an audit
 
     Returns:
         tuple: (bool, mismatch df) status if df amounts reconcile
     """
-    _logger.info("...sort df, get max txn date")
-    _df = copy.deepcopy(df_in)
-    _df = _df.sort_values(by=["transaction_date"])
-    _max_txn_date = _df.tail(1)["transaction_date"].values[0]
-
-    _logger.info("...get available dates in balance file")
-    _statement_dates = list(df_balance["statement_date"])
-
-    _logger.info("...get subset of balance df")
-    _max_date = _max_txn_date
-    for _statement_date in _statement_dates:
-        if _statement_date.date() < datetime.strptime(_max_txn_date, "%Y-%m-%d").date():
-            continue
+    _dates = pd.to_datetime(df_in["transaction_date"])
+    _saved = None if full else checkpoint.get(account)
+    _df_check = df_in
+    _df_balance_check = df_balance
+    if _saved is not None:
+        _checkpoint_date = _saved["statement_date"]
+        _before = (_dates <= _checkpoint_date).to_numpy()
+        if hash_transactions(df_in, _checkpoint_date) != _saved["txn_hash"] \
+                or hash_balances(df_balance, _checkpoint_date) != _saved["balance_hash"]:
+            _logger.info(f"...transactions or balances up to {_checkpoint_date.date()} changed")
+            _logger.info(f"...reconciling full history")
+        elif _before.all():
+            _logger.info(f"...no transactions after checkpoint {_checkpoint_date.date()}")
+            return True, pd.DataFrame()
         else:
-            _max_date = _statement_date
-            break
-
-    _df_balance = df_balance.loc[df_balance["statement_date"] <= _max_date, :].copy()
-    _logger.info(f"...max date: {_max_date}")
-
-    _logger.info("...calculate end of day balance\n")
-    _df['balance'] = _df['amount'].cumsum()
-    _df['eod_balance'] = _df.groupby('transaction_date')['balance'].transform('last')
-    _df.loc[_df.groupby('transaction_date').tail(1).index, 'end_of_day'] = 'True'
-    _df['end_of_day'] = _df['end_of_day'].fillna('False')
-
-    _logger.info("locate additional end of day dates...")
-    _df["transaction_date"] = pd.to_datetime(_df["transaction_date"]).copy()
-    _df_add = pd.merge(_df_balance, _df, left_on=["statement_date"], right_on=["transaction_date"], how="left")
-    _df_add = _df_add.loc[_df_add["account"].isna()]
-    _df_add["transaction_date"] = _df_add["statement_date"]
-    cols = ["account", "transaction_date", "payee", "master_category", "subcategory", "memo", "amount"]
-    _df_add = _df_add[cols]
-
-    _logger.info("...add additional end of day dates")
-    _df = pd.concat([_df, _df_add], ignore_index=True).copy()
-    _df.sort_values(by=['transaction_date'], inplace=True)
-    _df.reset_index(drop=True, inplace=True)
-    _df["eod_balance"].fillna(method="ffill", inplace=True)
-    _df_balance["statement_date"] = pd.to_datetime(_df_balance["statement_date"])
+            _logger.info(f"...reconciling transactions after checkpoint {_checkpoint_date.date()}")
+            _df_opening = pd.DataFrame({
+                "account": [df_in["account"].iloc[0]],
+                "transaction_date": [_checkpoint_date],
+                "payee": ["Balance brought forward"],
+                "amount": [to_money(_saved["balance"])],
+            })
+            _df_check = pd.concat([_df_opening, df_in.loc[~_before]], ignore_index=True)
+            _df_balance_check = df_balance.loc[df_balance["statement_date"] >= _checkpoint_date]
+
+    _status, _df_mismatch = validate_full_amount_bank(df_in=_df_check, df_balance=_df_balance_check)
+    if _status:
+        _statement_dates = df_balance.loc[df_balance["statement_date"] <= _dates.max(), "statement_date"]
+        if not _statement_dates.empty:
+            _statement_date = _statement_dates.max()
+            _upto = (_dates <= _statement_date).to_numpy()
+            checkpoint.save(account=account,
+                            statement_date=_statement_date,
+                            balance=to_pounds(df_in.loc[_upto, "amount"].sum()),
+                            rows=_upto.sum(),
+                            balance_hash=hash_balances(df_balance, _statement_date),
+                            txn_hash=hash_transactions(df_in, _statement_date))
+    return _status, _df_mismatch
+
+
+def clean_df_txn(df_param: pd.DataFrame, statement_date: str, account: str = "hsbc_dc") -> list:
+    """generate transaction dfs of an account, the ynab df is not modified"""
+    return get_account_adapter(account).to_transactions(df_ynab=df_param, statement_date=statement_date)
+
+
+def generate_txn_dfs(statement: tuple) -> list:
+    """Generate transaction dfs from ynab csv file
 
-    _logger.info("...reconcile end of transaction period balance")
-    _df_eom = pd.merge(_df_balance, _df,
-                       left_on=["statement_date"],
-                       right_on=["transaction_date"],
-                       how="inner")
-    _df_mismatch = _df_eom.loc[round(_df_eom["closing_balance"], 2) != round(_df_eom["eod_balance"], 2)]
-    if not _df_mismatch.empty:
-        _df_combined = pd.merge(_df, _df_balance,
-                                left_on=["transaction_date"],
-                                right_on=["statement_date"],
-                                how="left")
-        cols = ["transaction_date", "payee", "amount", "balance", "eod_balance", "closing_balance"]
-        _df_combined = _df_combined[cols]
-        _df_combined["closing_balance"].fillna(0, inplace=True)
-        _df_combined.loc[(_df_combined["closing_balance"] == 0),
-                         (round(_df_combined["closing_balance"], 2) == round(_df_combined["eod_balance"], 2)),
-                         "match"] = "True"
-        _df_combined["match"].fillna("False", inplace=True)
-        return False, _df_combined
-    else:
-        _df_balance_final = _df_balance.tail(1)
-        _expected_final_balance = _df_balance_final["closing_balance"].values[0]
-        _actual_balance = round(_df["amount"].sum(), 2)
-        _logger.info(f"...expected final balance: {_expected_final_balance}, actual final balance: {_actual_balance}")
-        return True, _df_mismatch
+    Args:
+        statement: (tuple) account name e.g. hsbc_dc, ynab csv file (Path)
+
+    Returns:
+        list: transaction dfs (dict) -> statement_date, file_type, df
+    """
+    _account, _ynab_file = statement
+    _logger.info(f"generating transaction dfs using ynab file: {_ynab_file.stem}...")
+    _statement_date = str(_ynab_file.stem[0:10])
+    _df_in = pd.read_csv(str(_ynab_file))
+    _dfs = clean_df_txn(df_param=_df_in, statement_date=_statement_date, account=_account)
+    _logger.info(f"...transaction dfs generation complete")
+    return _dfs
+
+
+def _transaction_stage(adapter: AccountAdapter) -> str:
+    """Manifest stage of an account, the debit card keeps the stage it was recorded under"""
+    return "transaction" if adapter.name == "hsbc_dc" else f"transaction_{adapter.name}"
 
 
-# noinspection PyTypeChecker
-def clean_df_txn(df_param: pd.DataFrame, statement_date: str) -> list:
-    """generate transaction dfs"""
-    df_ynab = copy.deepcopy(df_param)
-
-    # combine outflow and inflow
-    df_ynab = df_ynab.astype({'Outflow': float, 'Inflow': float})
-    df_ynab['Outflow'].fillna(0, inplace=True)
-    df_ynab['Inflow'].fillna(0, inplace=True)
-    df_ynab['amount'] = df_ynab['Inflow'] - df_ynab['Outflow']
-
-    # construct columns
-    df_ynab['account'] = 'HSBC DC'
-    df_ynab.rename(columns={'Date': 'transaction_date', 'Payee': 'payee', 'Memo': 'memo'}, inplace=True)
-    df_ynab.loc[df_ynab['payee'] == 'Transfer : Cash', 'Category'] = 'Transfer-out: Cash'
-    df_ynab['master_category'] = df_ynab['Category'].str.split(':').str[0]
-    df_ynab['subcategory'] = df_ynab['Category'].str.split(':').str[1].str.strip()
-    df_ynab['transaction_date'] = pd.to_datetime(df_ynab['transaction_date'], dayfirst=True)
-    df_ynab = df_ynab.astype({'amount': float})
-
-    # construct df_cash
-    df_cash = copy.deepcopy(df_ynab.loc[df_ynab['payee'] == 'Transfer : Cash', :])
-    if not df_cash.empty:
-        df_cash['account'] = 'Cash'
-        df_cash['amount'] = df_cash['amount'] * -1
-        df_cash['payee'] = 'Transfer : HSBC DC'
-        df_cash['master_category'] = 'Transfer-in'
-        df_cash['subcategory'] = 'HSBC DC'
-
-        df_cash_debit = copy.deepcopy(df_cash)
-        df_cash_debit['amount'] = df_cash_debit['amount'] * -1
-        df_cash_debit['payee'] = 'Misc'
-        df_cash_debit['master_category'] = 'Monthly'
-        df_cash_debit['subcategory'] = 'Discretionary'
-
-        df_cash = pd.concat([df_cash, df_cash_debit])
-        df_cash.sort_values(by=['transaction_date', 'amount'], inplace=True)
-
-    cols = ['account', 'transaction_date', 'payee', 'master_category', 'subcategory', 'memo', 'amount']
-    df_ynab = df_ynab[cols]
-    transaction_files = []
-    file_txn_dc = {
-        "statement_date": statement_date,
-        "file_type": "hsbc_dc",
-        "df": df_ynab
-    }
-    transaction_files.append(file_txn_dc)
-    if not df_cash.empty:
-        df_cash = df_cash[cols]
-        file_txn_cash = {
-            "statement_date": statement_date,
-            "file_type": "cash",
-            "df": df_cash
-        }
-        transaction_files.append(file_txn_cash)
-
-    return transaction_files
-
-
-def generate_sep_txn_files(extracts_path: Path):
-    """Process ynab csv files, output to transaction csv files
+def generate_sep_txn_files(extracts_path: Path, workers: int = 1, force: bool = False, dry_run: bool = False,
+                           start_date: str = None, end_date: str = None) -> bool:
+    """Process ynab csv files of every account, output to transaction csv files
+
+    Statements of all accounts are processed in one run, in parallel with more than one worker. Statements
+    are regenerated when the ynab file changed since the last run.
 
     Args:
         extracts_path (str): working directory
+        workers: (int) number of statements processed in parallel
+        force: (bool) regenerate all statements
+        dry_run: (bool) only report which statements would be generated
+        start_date: (str) first statement date in yyyy-mm-dd format, all statements if not supplied
+        end_date: (str) last statement date in yyyy-mm-dd format, all statements if not supplied
+
+    Returns:
+        bool: False if any statement failed, valid statements are written regardless
     """
     _logger.info("**********************************")
     _logger.info("*** generating transaction files ***")
     _logger.info("**********************************")
 
     _logger.info("get ynab files...")
-    _ynab_files_list = get_files_list(file_path=extracts_path, suffix=["ynab"])
-    _logger.info(f"...{len(_ynab_files_list)} files found\n")
-    if not _ynab_files_list:
+    _statements = []
+    for _adapter in get_account_adapters(exported=True):
+        _ynab_files_list = get_files_list(file_path=extracts_path, suffix=[_adapter.ynab_suffix],
+                                          start_date=start_date, end_date=end_date)
+        if _ynab_files_list:
+            _logger.info(f"...{len(_ynab_files_list)} {_adapter.label} files found")
+        _statements += [(_adapter, _file) for _file in _ynab_files_list]
+    _logger.info(f"...{len(_statements)} files found\n")
+    if not _statements:
         _logger.info(f"...nothing to process. terminating \n")
         exit()
 
     _logger.info(f"generating transaction dfs...")
-    _txn_dfs = []
-    for _file in _ynab_files_list:
-        _logger.info(f"generating transaction dfs using ynab file: {_file.stem}...")
-        _statement_date = str(_file.stem[0:10])
-        _df_in = pd.read_csv(str(_file))
-        _dfs = clean_df_txn(df_param=_df_in, statement_date=_statement_date)
-        _logger.info(f"...transaction dfs generation complete")
-        for _df in _dfs:
-            _txn_dfs.append(_df)
+    _manifest = RunManifest(extracts_path)
+    _pending_statements = []
+    for _adapter, _file in _statements:
+        _rerun, _reason = _manifest.plan(stage=_transaction_stage(_adapter), statement_date=str(_file.stem[0:10]),
+                                         inputs=[_file], force=force, adopt=not dry_run)
+        if not _rerun:
+            _logger.info(f"...skipping {_file.stem}: {_reason}")
+            continue
+        _action = "would generate" if dry_run else "generating"
+        _logger.info(f"...{_action} transaction files for {_file.stem}: {_reason}")
+        _pending_statements.append((_adapter.name, _file))
 
+    if dry_run:
+        _manifest.close()
+        return True
+
+    _results = run_statements(func=generate_txn_dfs, items=_pending_statements, workers=workers)
+    _failed = False
     _logger.info(f"writing transaction dfs to disk...")
-    for _txn_df in _txn_dfs:
-        _statement_date = _txn_df["statement_date"]
-        _file_type = _txn_df["file_type"]
-        _filename = f"{_statement_date}_transaction_{_file_type}.csv"
-        _path = str(Path.joinpath(extracts_path, _filename))
-        _logger.info(f"...writing file {_filename}")
-        write_df(df_in=_txn_df["df"], path=_path)
+    for _result in _results:
+        if _result["error"]:
+            _logger.error(f"...{_result['error']}")
+            _failed = True
+            continue
+
+        _outputs = []
+        for _txn_df in _result["result"]:
+            _statement_date = _txn_df["statement_date"]
+            _file_type = _txn_df["file_type"]
+            _filename = f"{_statement_date}_transaction_{_file_type}.csv"
+            _path = Path.joinpath(extracts_path, _filename)
+            _logger.info(f"...writing file {_filename}")
+            write_df(df_in=_txn_df["df"], path=str(_path))
+            _outputs.append(_path)
+        _account, _ynab_file = _result["item"]
+        _manifest.record(stage=_transaction_stage(get_account_adapter(_account)),
+                         statement_date=str(_ynab_file.stem[0:10]), inputs=[_ynab_file], dimensions=[],
+                         outputs=_outputs)
     _logger.info("...writing to disk complete\n")
+    _manifest.close()
+    return not _failed
 
 
-def validate_sep_txn_files(extracts_path: Path):
+def get_account_balance_index(extracts_path: Path, adapter: AccountAdapter) -> BalanceIndex:
+    """Return balances of a reconciled account, exit if its balance file is missing
+
+    Args:
+        extracts_path: (Path) extracts directory
+        adapter: (AccountAdapter) account
+
+    Returns:
+        BalanceIndex: balances of the account indexed by statement date
+    """
+    if not Path.joinpath(extracts_path, adapter.balance_filename).is_file():
+        _logger.error(f"...{adapter.balance_filename} not found. please add {adapter.label} balances")
+        exit()
+    return get_balance_index(adapter.balance_filename)
+
+
+def validate_sep_txn_files(extracts_path: Path, start_date: str = None, end_date: str = None) -> pd.DataFrame:
     """Validate separate transaction files to check amounts reconcile with opening and closing balances
 
+    Statements of each account are validated against the balances of that account.
+
     Args:
         extracts_path: (Path) working directory
+        start_date: (str) first statement date in yyyy-mm-dd format, all statements if not supplied
+        end_date: (str) last statement date in yyyy-mm-dd format, all statements if not supplied
+
+    Returns:
+        DataFrame: validation report, one row per file, see validate_statements
     """
     _logger.info("**********************************")
     _logger.info("*** running validation ***")
     _logger.info("**********************************")
-    _logger.info("get separate transaction hsbc dc dfs...")
-    _txn_files_list = get_files_list(file_path=extracts_path, suffix=["transaction_hsbc_dc"])
-
-    _logger.info(f"...{len(_txn_files_list)} files found\n")
-    if not _txn_files_list:
-        _logger.info(f"...nothing to validate\n")
-    else:
-        _logger.info(f"validating hsbc dc files...")
-        _df_balance = get_balance()
+    _logger.info("get separate transaction dfs...")
+    _statements = []
+    for _adapter in get_account_adapters():
+        _txn_files_list = get_files_list(file_path=extracts_path, suffix=[_adapter.fact_name],
+                                         start_date=start_date, end_date=end_date)
+        if not _txn_files_list:
+            continue
+        _balance_index = get_account_balance_index(extracts_path, _adapter) if _adapter.reconciled else None
         for _file in _txn_files_list:
-            _logger.info(f"validating {_file.stem}...")
-            _df_in = pd.read_csv(str(_file), sep=",")
-            _statement_date = str(_file.stem[0:10])
-            _status_amount = validate_monthly_amount_bank(df_in=_df_in,
-                                                          statement_date=_statement_date,
-                                                          df_balance=_df_balance)
-
-            _status_category, _result = validate_category(file_path=str(_file), file_type="txn")
-            if _status_amount and _status_category:
-                _logger.info(f"...file is valid\n")
-            elif not _status_amount:
-                _logger.error(f"...some amounts do not reconcile. please investigate {_file}")
-                exit()
-            else:
-                _logger.error(f"...some category values are not populated, please check {_file}")
-
-    _logger.info("get separate transaction cash dfs...")
-    _txn_files_list = get_files_list(file_path=extracts_path, suffix=["transaction_cash"])
-    _logger.info(f"...{len(_txn_files_list)} files found\n")
-    if not _txn_files_list:
+            _statements.append({
+                "file_path": _file,
+                "statement_date": str(_file.stem[0:10]),
+                "file_type": str(_file.stem[23:]),
+                "df": read_fact_csv(_file),
+                "reconciled": _adapter.reconciled,
+                "balance_index": _balance_index,
+            })
+    _logger.info(f"...{len(_statements)} files found\n")
+    if not _statements:
         _logger.info(f"...nothing to validate\n")
-    else:
-        _logger.info(f"validating cash files...")
-        for _file in _txn_files_list:
-            _logger.info(f"validating {_file.stem}...")
-            _df_in = pd.read_csv(str(_file), sep=",")
-            _status_amount = validate_monthly_amount_cash(df_in=_df_in)
-            _status_category = validate_category(file_path=str(_file), file_type="txn")
-            if _status_amount and _status_category:
-                _logger.info(f"...file is valid\n")
-            elif not _status_amount:
-                _logger.error(f"...some amounts do not reconcile. please investigate {_file}")
-                exit()
-            else:
-                _logger.error(f"...some category values are not populated, please check {_file}")
+        return validate_statements([], category_keys=frozenset(), balance_index=None)
+
+    _logger.info(f"validating transaction files...")
+    _df_report = validate_statements(_statements, category_keys=get_category_keys(), balance_index=None)
+
+    for _, _row in _df_report.iterrows():
+        _logger.info(f"validating {Path(_row['file']).stem}...")
+        if _row["error"]:
+            _logger.error(f"...{_row['error']}. please update "
+                          f"{get_account_adapter(_row['file_type']).balance_filename}")
+            exit()
+        elif not _row["amount_valid"]:
+            _logger.error(f"...some amounts do not reconcile. expected total {_row['expected_total']}, "
+                          f"actual total {_row['actual_total']}. please investigate {_row['file']}")
+            exit()
+        elif not _row["category_valid"]:
+            _logger.error(f"...some category values are not populated, please check {_row['file']}")
+            _logger.error(f"...missing categories: {', '.join(_row['missing_categories'])}")
+        else:
+            _logger.info(f"...file is valid\n")
+    return _df_report
 
 
-def validate_master_txn_file(extracts_path: Path):
-    """Validate separate transaction files to check amounts reconcile with opening and closing balances
+def validate_master_account(account: str, extracts_path: Path, full: bool = False) -> int:
+    """Validate fact table of an account, amounts reconcile with its balances and categories exist
+
+    Args:
+        account: (str) account name e.g. hsbc_dc
+        extracts_path: (Path) root directory
+        full: (bool) reconcile the whole history rather than from the last checkpoint
+
+    Returns:
+        int: number of transactions validated
+
+    Raises:
+        StatementError: amounts do not reconcile, the mismatch is written to the account error file, or
+            categories are missing
+    """
+    _adapter = get_account_adapter(account)
+    _logger.info(f"get {_adapter.label} transaction df...")
+    _facts_dir = Path.joinpath(extracts_path, "facts")
+    _path = Path.joinpath(_facts_dir, f"{_adapter.fact_name}.csv")
+    _df = read_fact(_adapter.fact_name, _facts_dir)
+
+    _logger.info("get dimensions df...")
+    _df_balance = get_balance(_adapter.balance_filename)
+
+    with BalanceCheckpoint(extracts_path) as _checkpoint:
+        _status_amount, _df_mismatch = reconcile_amount_bank(df_in=_df, df_balance=_df_balance, checkpoint=_checkpoint,
+                                                             account=_adapter.fact_name, full=full)
+    if not _status_amount:
+        _file_path = Path.joinpath(extracts_path, _adapter.error_filename)
+        write_df(df_in=_df_mismatch, path=str(_file_path), sep=",")
+        raise StatementError(f"some amounts do not reconcile. please investigate {_file_path}")
+    if not find_missing_categories(_df, get_category_keys()).empty:
+        raise StatementError(f"some category values are not populated, please check {_path}")
+    return len(_df.index)
+
+
+def validate_master_txn_file(extracts_path: Path, full: bool = False, workers: int = 1):
+    """Validate fact tables of reconciled accounts to check amounts reconcile with opening and closing balances
+
+    Each account is reconciled with its own balances, in parallel with more than one worker. Accounts
+    without a fact table yet are skipped.
 
     Args:
         extracts_path: (Path) root directory
+        full: (bool) reconcile the whole history rather than from the last checkpoint
+        workers: (int) number of accounts validated in parallel
     """
     _logger.info("**********************************")
-    _logger.info("*** validating master hsbc dc file ***")
+    _logger.info("*** validating master files ***")
     _logger.info("**********************************")
 
-    _logger.info("get hsbc dc transaction df...")
-    _path = Path.joinpath(extracts_path, "facts", "transaction_hsbc_dc.csv")
-    _df = pd.read_csv(_path, sep=",")
+    _facts_dir = Path.joinpath(extracts_path, "facts")
+    _accounts = []
+    for _adapter in get_account_adapters():
+        if not _adapter.reconciled:
+            continue
+        if not Path.joinpath(_facts_dir, f"{_adapter.fact_name}.csv").is_file():
+            _logger.info(f"...no {_adapter.fact_name} fact table, skipping")
+            continue
+        if not Path.joinpath(extracts_path, _adapter.balance_filename).is_file():
+            _logger.info(f"...no {_adapter.balance_filename}, skipping {_adapter.fact_name}")
+            continue
+        _accounts.append(_adapter.name)
+
+    _results = run_statements(func=partial(validate_master_account, extracts_path=extracts_path, full=full),
+                              items=_accounts, workers=workers)
+    _failed = False
+    for _result in _results:
+        if _result["error"]:
+            _logger.error(f"...{get_account_adapter(_result['item']).label}: {_result['error']}")
+            _failed = True
+        else:
+            _logger.info(f"...{get_account_adapter(_result['item']).label}: all balances match. file is valid\n")
+    if _failed:
+        exit()
+    return
 
-    _logger.info("get dimensions df...")
-    _df_balance = get_balance()
 
-    _status_amount, _df_mismatch = validate_full_amount_bank(df_in=_df, df_balance=_df_balance)
-    _status_category, _result = validate_category(file_path=_path, file_type="txn")
+def combine_account_txn_dfs(account: str, sep_dfs: list, extracts_path: Path, full: bool = False) -> tuple:
+    """Combine separate transaction dfs of an account with its fact table
 
-    if _status_amount and _status_category:
-        _logger.info(f"...all balances match. file is valid\n")
-    elif not _status_amount:
-        _file_name = "transaction_error.csv"
-        _file_path = Path.joinpath(extracts_path, _file_name)
-        write_df(df_in=_df_mismatch, path=str(_file_path), sep=",")
-        _logger.error(f"...some amounts do not reconcile. please investigate {_file_path}")
-        exit()
+    The combined fact table is written to the extracts directory, once it reconciles with the balances of
+    the account.
+
+    Args:
+        account: (str) account name e.g. hsbc_dc
+        sep_dfs: (list) separate transaction dfs (dict) -> name, df
+        extracts_path: (Path) extracts directory
+        full: (bool) reconcile the whole history rather than from the last checkpoint
+
+    Returns:
+        tuple: (combined fact df, number of rows added)
+
+    Raises:
+        StatementError: amounts do not reconcile, the mismatch is written to the account error file
+    """
+    _adapter = get_account_adapter(account)
+    _facts_dir = Path.joinpath(extracts_path, "facts")
+    _master_txn_file_path = Path.joinpath(_facts_dir, f"{_adapter.fact_name}.csv")
+    _logger.info(f"...creating df from {_master_txn_file_path}")
+    if _master_txn_file_path.is_file():
+        _df = read_fact(_adapter.fact_name, _facts_dir)
     else:
-        _logger.error(f"...some category values are not populated, please check {_path}")
-        exit()
-    return
+        _logger.info(f"...{_master_txn_file_path.name} not found, starting a new fact table")
+        _df = empty_fact()
+    _logger.info(f"...df created\n")
+
+    _df_balance = get_balance(_adapter.balance_filename) if _adapter.reconciled else None
+    _new_rows = 0
+    _logger.info(f"locating separate files for {_master_txn_file_path}...")
+    _df_combined = _df
+    cols = _df_combined.columns
+    with FactKeyIndex(extracts_path, _adapter.fact_name) as _key_index:
+        _key_index.sync(fact_path=_master_txn_file_path, df_fact=_df)
+        for _sep_df in sep_dfs:
+            _logger.info(f"...combining {_sep_df['name']}")
+            _df_new = _key_index.new_rows(_sep_df["df"])
+            _key_index.add(_df_new)
+            _logger.info(f"...additional rows found: {len(list(_df_new.index))}")
+            if len(list(_df_new.index)) > 0:
+                _new_rows += len(list(_df_new.index))
+                _df_new = _df_new[cols]
+                _df_combined = pd.concat([_df_combined, _df_new], ignore_index=True)
+                if _adapter.reconciled:
+                    with BalanceCheckpoint(extracts_path) as _checkpoint:
+                        _status_amount, _df_mismatch = reconcile_amount_bank(
+                            df_in=_df_combined,
+                            df_balance=_df_balance,
+                            checkpoint=_checkpoint,
+                            account=_adapter.fact_name,
+                            full=full)
+                    if _status_amount:
+                        _logger.info(f"...amounts reconcile. combination valid")
+                    else:
+                        _file_path = Path.joinpath(extracts_path, _adapter.error_filename)
+                        write_df(df_in=_df_mismatch, path=str(_file_path), sep=",")
+                        raise StatementError(f"some amounts do not reconcile. please investigate {_file_path}")
+                else:
+                    _logger.info(f"...{_adapter.label} file. validation not needed\n")
+            else:
+                _logger.info(f"...no rows to be added\n")
+        if _new_rows > 0:
+            _path = Path.joinpath(extracts_path, f"{_adapter.fact_name}.csv")
+            _logger.info(f"...writing df to folder: {_path}\n")
+            write_fact(df_in=_df_combined, file_path=_path)
+            _key_index.commit(fact_path=_path)
+    return _df_combined, _new_rows
 
 
-def combine_txn_files(extracts_path: Path):
-    """Combine transaction files into single file
+def combine_account_txn_files(account: str, extracts_path: Path, full: bool = False) -> int:
+    """Combine separate transaction files of an account with its fact table, see combine_account_txn_dfs
 
     Args:
+        account: (str) account name e.g. hsbc_dc
         extracts_path: (Path) extracts directory
+        full: (bool) reconcile the whole history rather than from the last checkpoint
+
+    Returns:
+        int: number of rows added
+    """
+    _adapter = get_account_adapter(account)
+    _sep_dfs = [{"name": str(_file), "df": read_fact_csv(_file)}
+                for _file in get_files_list(file_path=extracts_path, suffix=[_adapter.fact_name])]
+    _, _new_rows = combine_account_txn_dfs(account=account, sep_dfs=_sep_dfs, extracts_path=extracts_path, full=full)
+    return _new_rows
+
+
+def combine_txn_files(extracts_path: Path, full: bool = False, workers: int = 1):
+    """Combine transaction files of every account into its fact table
+
+    Accounts are combined and reconciled independently, in parallel with more than one worker. An account
+    which does not reconcile is not written, the others are.
+
+    Args:
+        extracts_path: (Path) extracts directory
+        full: (bool) reconcile the whole history rather than from the last checkpoint
+        workers: (int) number of accounts combined in parallel
     """
     _logger.info("**********************************")
     _logger.info("*** combine separate txn files with master ***")
     _logger.info("**********************************")
 
-    _logger.info("get master transaction files...")
-    _txn_file_types = ["transaction_hsbc_dc", "transaction_hsbc_cc", "transaction_cash"]
-    _master_dfs = []
-    for _file_type in _txn_file_types:
-        _master_txn_file_path = Path.joinpath(extracts_path, "facts", f"{_file_type}.csv")
-        _logger.info(f"...creating df from {_master_txn_file_path}")
-        _df = pd.read_csv(_master_txn_file_path, sep=",")
-        _entry = {"file_type": _file_type, "file_path": _master_txn_file_path, "df": _df, "sep_dfs": []}
-        _master_dfs.append(_entry)
-        _logger.info(f"...df created\n")
-
     _logger.info("get separate transaction files...")
-    suffixes = ["transaction_hsbc_dc", "transaction_hsbc_cc", "transaction_cash"]
-    _sep_txn_files = get_files_list(file_path=extracts_path, suffix=suffixes)
-    _logger.info(f"...{len(_sep_txn_files)} files found\n")
-
-    if not _sep_txn_files:
-        _logger.info("...exiting\n")
+    _accounts = []
+    for _adapter in get_account_adapters():
+        _sep_txn_files = get_files_list(file_path=extracts_path, suffix=[_adapter.fact_name])
+        if _sep_txn_files:
+            _logger.info(f"...{len(_sep_txn_files)} {_adapter.fact_name} files found")
+            _accounts.append(_adapter.name)
+    if not _accounts:
+        _logger.info("...no files found, exiting\n")
         exit()
 
-    _logger.info("associating separate txn files with master...")
-    for _sep_txn_file in _sep_txn_files:
-        _logger.info(f"finding master file for {_sep_txn_file}...")
-        _sep_df = pd.read_csv(_sep_txn_file, sep=",")
-        _statement_date = str(_sep_txn_file.stem[0:10])
-        _file_type = str(_sep_txn_file.stem[11:])
-        for _master_df in _master_dfs:
-            if _master_df["file_type"] == _file_type:
-                _entry = {"file_path": _sep_txn_file, "df": _sep_df}
-                _master_df["sep_dfs"].append(_entry)
-                _logger.info(f"...associated with master file {_master_df['file_path']}\n")
-                break
-
     _logger.info("combine separate txn files with master...")
-    _df_balance = get_balance()
-    for _master_df in _master_dfs:
-        _new_rows = 0
-        if _master_df["sep_dfs"]:
-            _logger.info(f"locating separate files for {_master_df['file_path']}...")
-            _df = _master_df["df"]
-            _df_combined = copy.deepcopy(_df)
-            cols = _df_combined.columns
-            for _sep_txn_file in _master_df["sep_dfs"]:
-                _logger.info(f"...combining {_sep_txn_file['file_path']}")
-                _sep_df = _sep_txn_file["df"]
-                _df_new = pd.merge(_sep_df, _df,
-                                   on=["transaction_date", "amount", "payee"],
-                                   how="left",
-                                   suffixes=(None, "_y"))
-                _df_new = _df_new.loc[_df_new["master_category_y"].isna()]
-                _logger.info(f"...additional rows found: {len(list(_df_new.index))}")
-                if len(list(_df_new.index)) > 0:
-                    _new_rows += len(list(_df_new.index))
-                    _df_new = _df_new[cols]
-                    _df_combined = pd.concat([_df_combined, _df_new], ignore_index=True)
-                    if _master_df["file_type"] == "transaction_hsbc_dc":
-                        _status_amount, _df_mismatch = validate_full_amount_bank(
-                            df_in=_df_combined,
-                            df_balance=_df_balance)
-                        if _status_amount:
-                            _logger.info(f"...amounts reconcile. combination valid")
-                        else:
-                            _file_name = "transaction_error.csv"
-                            _file_path = Path.joinpath(extracts_path, _file_name)
-                            write_df(df_in=_df_mismatch, path=str(_file_path), sep=",")
-                            _logger.error(f"...some amounts do not reconcile. please investigate {_file_path}")
-                            exit()
-                    else:
-                        _logger.info("...cash file. validation not needed\n")
-                else:
-                    _logger.info(f"...no rows to be added\n")
-            if _new_rows > 0:
-                _filename = f"{_master_df['file_type']}.csv"
-                _path = str(Path.joinpath(extracts_path, _filename))
-                _logger.info(f"...writing df to folder: {_path}\n")
-                write_df(df_in=_df_combined, path=_path, sep=",")
+    _results = run_statements(func=partial(combine_account_txn_files, extracts_path=extracts_path, full=full),
+                              items=_accounts, workers=workers)
+    _failed = False
+    for _result in _results:
+        if _result["error"]:
+            _logger.error(f"...{get_account_adapter(_result['item']).label}: {_result['error']}")
+            _failed = True
+    if _failed:
+        exit()
 
 
-def main():
+def setup_args():
+    _parser.add_argument("-w", "--workers", type=int, default=1,
+                         help="number of statements and accounts processed in parallel")
+    _parser.add_argument("--force", action="store_true",
+                         help="regenerate transaction files for all statements")
+    _parser.add_argument("--dry-run", action="store_true",
+                         help="only report which statements would be regenerated")
+    _parser.add_argument("--start-date", default=None,
+                         help="first statement date to generate and validate, yyyy-mm-dd")
+    _parser.add_argument("--end-date", default=None,
+                         help="last statement date to generate and validate, yyyy-mm-dd")
+    _parser.add_argument("--full-validation", action="store_true",
+                         help="reconcile the whole transaction history rather than from the last checkpoint")
+    _parser.add_argument("--exact-money", action="store_true",
+                         help="hold amounts as integer pence, totals and reconciliation are exact")
+
+
+def main(args_in: dict):
     """Main entrypoint"""
+    if args_in.get("exact_money"):
+        set_exact_money(True)
     extracts_path = get_extracts_path()
-
-    generate_sep_txn_files(extracts_path=extracts_path)
-    validate_sep_txn_files(extracts_path=extracts_path)
-    validate_master_txn_file(extracts_path=extracts_path)
-    combine_txn_files(extracts_path=extracts_path)
+    workers = int(args_in.get("workers") or 1)
+    dry_run = bool(args_in.get("dry_run"))
+    start_date = args_in.get("start_date")
+    end_date = args_in.get("end_date")
+
+    if not generate_sep_txn_files(extracts_path=extracts_path, workers=workers, force=bool(args_in.get("force")),
+                                  dry_run=dry_run, start_date=start_date, end_date=end_date):
+        _logger.error("...some transaction files could not be generated. terminating\n")
+        exit(1)
+    if dry_run:
+        return
+    validate_sep_txn_files(extracts_path=extracts_path, start_date=start_date, end_date=end_date)
+    full_validation = bool(args_in.get("full_validation"))
+    validate_master_txn_file(extracts_path=extracts_path, full=full_validation, workers=workers)
+    combine_txn_files(extracts_path=extracts_path, full=full_validation, workers=workers)
 
 
 _logger = logging.getLogger(__name__)
 setup_logging()
+_parser: Final = argparse.ArgumentParser(
+    description="Python utility to generate transaction files from ynab files")
+setup_args()
 
 
 if __name__ == '__main__':
-    main()
+    main(vars(_parser.parse_args()))
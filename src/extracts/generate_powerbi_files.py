@@ -1,108 +1,311 @@
-import copy
 import logging
 import os
+import argparse
+import numpy as np
 import pandas as pd
 import calendar
-import csv
 
+from typing import Final
 from pathlib import Path
 
-from utilities import setup_logging, write_df, get_files_list
-from utilities import get_category, get_extracts_path
+from utilities import setup_logging, write_df, get_files_list, read_fact, empty_fact, FACT_COLUMNS
+from utilities import get_category, get_extracts_path, money_dtype, set_exact_money, to_money, to_pounds
+from utilities import AggregateState, month_fingerprints, hash_aggregate_inputs, rollup_cube, rollup_levels
+from utilities import CategoryKeyStore, normalise_zero
 
 os.environ['NUMEXPR_MAX_THREADS'] = '4'
 os.environ['NUMEXPR_NUM_THREADS'] = '2'
 
+# budget.csv start and end of budgets without a first or last month
+START_YEAR_MONTH = 190001
+END_YEAR_MONTH = 999912
 
-def generate_txn_file() -> (int, int):
-    """Generate transaction fact file by combining transaction files
+# finest grain of transaction totals, every aggregate level is rolled up from it without reading transactions
+ROLLUP_FILE = "transaction_rollup.csv"
+ROLLUP_GRAIN = ["account", "master_category", "category", "category_key", "year_month", "category_year_month"]
+# aggregate level -> file name, grouping columns (a subset of the grain, none for the grand total)
+ROLLUP_LEVELS = {
+    "monthly_total": ("transaction_monthly_total.csv",
+                      ["category", "category_key", "year_month", "category_year_month"]),
+    "overall_total": ("transaction_overall_total.csv", ["category", "category_key"]),
+    "master_category_monthly_total": ("transaction_master_category_monthly_total.csv",
+                                      ["master_category", "year_month"]),
+    "account_monthly_total": ("transaction_account_monthly_total.csv", ["account", "year_month"]),
+    "grand_total": ("transaction_grand_total.csv", []),
+}
+
+# power bi files updated month by month in incremental mode, rebuilt when one is missing
+AGGREGATE_FILES = [ROLLUP_FILE] + [_filename for _filename, _ in ROLLUP_LEVELS.values()] + ["master.csv"]
+
+
+def read_fact_dfs() -> dict:
+    """Read fact tables from the facts folder
 
     Returns:
-        (int, int): min year, max year
+        dict: fact table name -> fact df, ordered by name
     """
+    facts_dir = Path.joinpath(get_extracts_path(), "facts")
+    _logger.info("get transaction files...")
+    _fact_dfs = {}
+    for _file in get_files_list(file_path=Path(facts_dir), starts_with="transaction"):
+        _fact_dfs[_file.stem] = read_fact(_file.stem, Path(facts_dir))
+    return _fact_dfs
+
+
+def _join_labels(*columns: pd.Series, sep: str) -> pd.Categorical:
+    """Join values of columns row by row into a categorical, formatting each distinct combination once
 
+    Args:
+        columns: (Series) columns to join, without missing values
+        sep: (str) separator
+
+    Returns:
+        Categorical: joined labels, categories sorted
+    """
+    # combine integer codes of the columns into one code per row, then decode the distinct codes only
+    _codes = np.zeros(len(columns[0]), dtype="int64")
+    _uniques = []
+    for _column in columns:
+        _column_codes, _column_uniques = pd.factorize(_column)
+        _codes = _codes * len(_column_uniques) + _column_codes
+        _uniques.append(_column_uniques)
+    _row_codes, _combinations = pd.factorize(_codes)
+    _parts = []
+    for _column_uniques in reversed(_uniques):
+        _parts.insert(0, np.asarray(_column_uniques, dtype=object)[_combinations % len(_column_uniques)])
+        _combinations = _combinations // len(_column_uniques)
+    _labels = np.array([sep.join(str(_value) for _value in _combination) for _combination in zip(*_parts)],
+                       dtype=object)
+    _label_codes, _categories = pd.factorize(_labels, sort=True)
+    return pd.Categorical.from_codes(_label_codes[_row_codes], categories=_categories)
+
+
+def generate_category_file() -> pd.DataFrame:
+    """Generate category dimension file, with the category_key each category keeps in the manifest
+
+    category_key and year_month are the keys power bi files are joined on, category and category_year_month
+    are kept for display. Keys do not depend on the row of a category in category.csv, see CategoryKeyStore.
+
+    Returns:
+        DataFrame: category_key and the columns of category.csv
+
+    Raises:
+        ValueError: a category appears more than once in category.csv
+    """
     extracts_path = get_extracts_path()
-    facts_dir = Path.joinpath(extracts_path, "facts")
     powerbi_dir = Path.joinpath(extracts_path, "powerbi")
 
+    _df_category = get_category().copy()
+    _duplicated = _df_category.loc[_df_category["category"].duplicated(), "category"].unique()
+    if len(_duplicated):
+        raise ValueError(f"categories appear more than once in category.csv: {', '.join(_duplicated)}")
+    with CategoryKeyStore(extracts_path) as _store:
+        _keys = _store.assign(_df_category["category"].tolist())
+    _df_category.insert(0, "category_key", np.asarray(_keys, dtype="int64"))
+
+    _filename = "dim_category.csv"
+    _path = str(Path.joinpath(powerbi_dir, _filename))
+    _logger.info(f"...writing file {_path}")
+    write_df(df_in=_df_category, path=_path)
+    return _df_category
+
+
+def _category_key(categories: pd.Series, df_category: pd.DataFrame) -> np.ndarray:
+    """Return category_key of each category, 0 for categories not in the category dimension
+
+    Args:
+        categories: (Series) category labels, plain or categorical
+        df_category: (DataFrame) category dimension, see generate_category_file
+
+    Returns:
+        ndarray: int64 category keys
+    """
+    _keys = df_category.set_index("category")["category_key"]
+    if isinstance(categories.dtype, pd.CategoricalDtype):
+        # look up each distinct category once
+        return _keys.reindex(categories.cat.categories).fillna(0).to_numpy(dtype="int64")[categories.cat.codes]
+    return _keys.reindex(categories).fillna(0).to_numpy(dtype="int64")
+
+
+def generate_txn_file(fact_dfs: dict, df_category: pd.DataFrame) -> pd.DataFrame:
+    """Generate transaction fact file by combining fact tables
+
+    Args:
+        fact_dfs: (dict) fact table name -> fact df, see read_fact_dfs
+        df_category: (DataFrame) category dimension, see generate_category_file
+
+    Returns:
+        DataFrame: combined transaction df, labels as categoricals, year_month as yyyymm integer
+    """
+    powerbi_dir = Path.joinpath(get_extracts_path(), "powerbi")
+
     _logger.info("**********************************")
     _logger.info("*** combine separate txn files ***")
     _logger.info("**********************************")
-    _logger.info("get transaction files...")
 
-    _files = get_files_list(file_path=Path(facts_dir), starts_with="transaction")
-    _transaction_files = []
-    columns = ["account", "transaction_date", "payee", "master_category", "subcategory", "memo", "amount"]
-    _df_combined = pd.DataFrame(columns=columns)
-    for _file in _files:
-        _logger.info(f"file {_file.stem} added to combined file...")
-        _transaction_files.append(_file)
-        _df_new = pd.read_csv(str(_file))
-        _df_combined = pd.concat([_df_combined, _df_new], ignore_index=True)
+    for _fact_name in fact_dfs:
+        _logger.info(f"file {_fact_name} added to combined file...")
+    _df_combined = pd.concat([empty_fact()] + [_df_new[FACT_COLUMNS] for _df_new in fact_dfs.values()],
+                             ignore_index=True)
     _df_combined['transaction_date'] = pd.to_datetime(_df_combined['transaction_date'])
-    _df_combined['memo'].fillna('', inplace=True)
-    _df_combined['amount'] = _df_combined['amount'].astype(float)
-    _df_combined['master_category'] = _df_combined['master_category'].astype(str)
-    _df_combined['subcategory'] = _df_combined['subcategory'].astype(str)
-
-    _df_combined = _df_combined.loc[_df_combined['amount'] != 0]
-    _df_combined["category"] = _df_combined["master_category"] + ": " + _df_combined['subcategory']
-    _df_combined["year_month"] = _df_combined["transaction_date"].dt.year * 100 \
-        + _df_combined["transaction_date"].dt.month
-    _df_combined["category_year_month"] = _df_combined["category"] + "-" + _df_combined["year_month"].astype(str)
+    _df_combined['memo'] = _df_combined['memo'].fillna('')
+    _df_combined['amount'] = _df_combined['amount'].astype(money_dtype())
+    _df_combined = _df_combined.loc[_df_combined['amount'] != 0].reset_index(drop=True)
+
+    # repeated labels are held once as categoricals, with categories sorted so groupby order is unchanged
+    for _column in ['account', 'payee']:
+        _df_combined[_column] = _df_combined[_column].astype('category')
+    for _column in ['master_category', 'subcategory']:
+        _df_combined[_column] = _df_combined[_column].astype(str).astype('category')
+    _df_combined["category"] = _join_labels(_df_combined["master_category"], _df_combined["subcategory"], sep=": ")
+    _df_combined["category_key"] = _category_key(_df_combined["category"], df_category)
+    _df_combined["year_month"] = (_df_combined["transaction_date"].dt.year * 100
+                                  + _df_combined["transaction_date"].dt.month).astype("int64")
+    _df_combined["category_year_month"] = _join_labels(_df_combined["category"], _df_combined["year_month"], sep="-")
 
     _filename = "transaction.csv"
     _path = str(Path.joinpath(powerbi_dir, _filename))
     _logger.info(f"...writing file {_path}")
     write_df(df_in=_df_combined, path=_path)
+    return _df_combined
+
 
-    min_year = int(str(min(_df_combined["year_month"]))[:4])
-    max_year = int(str(max(_df_combined["year_month"]))[:4])
+def get_year_range(df_txn: pd.DataFrame, max_year: int = None) -> (int, int):
+    """Return first year of transactions and last year of the power bi files
+
+    Args:
+        df_txn: (DataFrame) combined transaction df
+        max_year: (int) last year of the power bi files, last year of transactions if not supplied
+
+    Returns:
+        (int, int): min year, max year
+    """
+    min_year = int(min(df_txn["year_month"])) // 100
+    if max_year is None:
+        max_year = int(max(df_txn["year_month"])) // 100
     _logger.debug(f"min year: {min_year}, max year: {max_year}")
-    return min_year, max_year
+    return min_year, int(max_year)
 
 
-def generate_txn_monthly_total_file():
-    """Generate transaction monthly totals by category"""
+def plan_aggregates(df_txn: pd.DataFrame, min_year: int, max_year: int, full_rebuild: bool = False) -> dict:
+    """Find months whose transactions changed since the power bi aggregates were last built
 
+    The aggregates are rebuilt in full when asked to, on the first run, when budget.csv, category.csv, the
+    year range or the grain of the aggregates changed, or when one of the aggregate files is missing. The stored
+    state is removed until save_aggregate_plan is called, so a run which stops half way is followed by a full
+    rebuild.
+
+    Args:
+        df_txn: (DataFrame) combined transaction df
+        min_year: (int) first year of the power bi files
+        max_year: (int) last year of the power bi files
+        full_rebuild: (bool) rebuild every aggregate from the whole transaction history
+
+    Returns:
+        dict: year_months (list, None for a full rebuild), previous rollup df, fingerprints, input_hash
+    """
     extracts_path = get_extracts_path()
     powerbi_dir = Path.joinpath(extracts_path, "powerbi")
+    dimensions_dir = Path.joinpath(extracts_path, "dimensions")
 
-    _filepath = Path.joinpath(powerbi_dir, "transaction.csv")
-    _df_combined = pd.read_csv(str(_filepath))
+    _fingerprints = month_fingerprints(df_txn)
+    _input_hash = hash_aggregate_inputs([Path.joinpath(dimensions_dir, "budget.csv"),
+                                         Path.joinpath(dimensions_dir, "category.csv")], min_year, max_year,
+                                        ",".join(ROLLUP_GRAIN))
+    with AggregateState(extracts_path) as _state:
+        _year_months = None if full_rebuild else _state.touched_months(_fingerprints, _input_hash)
+        if not all(Path.joinpath(powerbi_dir, _filename).is_file() for _filename in AGGREGATE_FILES):
+            _year_months = None
+        _state.clear()
+
+    _df_previous = None
+    if _year_months is None:
+        _logger.info("...rebuilding power bi aggregates")
+    else:
+        _logger.info(f"...updating power bi aggregates of {len(_year_months)} month(s) "
+                     f"{', '.join(str(_month) for _month in _year_months)}")
+        # amounts are read back exactly as they were written
+        _df_previous = pd.read_csv(str(Path.joinpath(powerbi_dir, ROLLUP_FILE)), sep=",", keep_default_na=False,
+                                   dtype={_column: str for _column in ROLLUP_GRAIN
+                                          if _column not in ["category_key", "year_month"]},
+                                   float_precision="round_trip")
+        _df_previous["amount"] = to_money(_df_previous["amount"])
+    return {"year_months": _year_months, "previous_rollup": _df_previous,
+            "fingerprints": _fingerprints, "input_hash": _input_hash}
+
+
+def save_aggregate_plan(plan: dict):
+    """Record the transactions the power bi aggregates were built from, see plan_aggregates
 
-    _df_group = pd.DataFrame(_df_combined.groupby(['category', 'year_month', 'category_year_month'])['amount'].sum())
-    _df_group.reset_index(inplace=True)
-    _filename = "transaction_monthly_total.csv"
-    _path = str(Path.joinpath(powerbi_dir, _filename))
-    _logger.info(f"...writing file {_path}")
-    write_df(df_in=_df_group, path=_path)
-    return _df_group
+    Args:
+        plan: (dict) aggregate plan, after every aggregate file is written
+    """
+    with AggregateState(get_extracts_path()) as _state:
+        _state.save(plan["fingerprints"], plan["input_hash"])
 
 
-def generate_txn_overall_total_file():
-    """Generate transaction overall totals by category"""
+def _touched(df_in: pd.DataFrame, plan: dict) -> pd.Series:
+    """Return mask of rows in months touched since the aggregates were last built"""
+    return df_in["year_month"].astype("int64").isin(plan["year_months"])
 
-    extracts_path = get_extracts_path()
-    powerbi_dir = Path.joinpath(extracts_path, "powerbi")
 
-    _filepath = Path.joinpath(powerbi_dir, "transaction.csv")
-    _df_combined = pd.read_csv(str(_filepath))
+def generate_rollup_files(df_txn: pd.DataFrame, plan: dict = None) -> dict:
+    """Generate transaction totals of every aggregate level in ROLLUP_LEVELS
 
-    _df_group = pd.DataFrame(_df_combined.groupby(['category'])['amount'].sum())
-    _df_group.reset_index(inplace=True)
-    _filename = "transaction_overall_total.csv"
-    _path = str(Path.joinpath(powerbi_dir, _filename))
-    _logger.info(f"...writing file {_path}")
-    write_df(df_in=_df_group, path=_path)
+    Transactions are summed once, at the finest grain (ROLLUP_GRAIN), and every level is rolled up from those
+    sums, so a new level costs no pass over the transactions. Totals are rounded to pence unless exact.
+
+    Args:
+        df_txn: (DataFrame) combined transaction df
+        plan: (dict) aggregate plan, only touched months are summed from transactions, see plan_aggregates
 
+    Returns:
+        dict: rollup -> finest grain df, and level name -> aggregate df e.g. monthly_total, overall_total
+    """
+    powerbi_dir = Path.joinpath(get_extracts_path(), "powerbi")
 
-def generate_date_file(min_year: int, max_year: int):
+    if plan is None or plan["year_months"] is None:
+        _df_rollup = rollup_cube(df_txn, ROLLUP_GRAIN)
+    else:
+        # replace sums of touched months, other months are kept from the previous run
+        _df_previous = plan["previous_rollup"]
+        _df_rollup = pd.concat([_df_previous.loc[~_touched(_df_previous, plan)],
+                                rollup_cube(df_txn.loc[_touched(df_txn, plan)], ROLLUP_GRAIN)], ignore_index=True)
+        _df_rollup = _df_rollup.sort_values(by=ROLLUP_GRAIN, ignore_index=True)
+        _df_rollup["amount"] = _df_rollup["amount"].astype(money_dtype())
+
+    _dfs = {"rollup": _df_rollup}
+    _dfs.update(rollup_levels(_df_rollup, {_name: _columns for _name, (_, _columns) in ROLLUP_LEVELS.items()}))
+    _filenames = {"rollup": ROLLUP_FILE}
+    _filenames.update({_name: _filename for _name, (_filename, _) in ROLLUP_LEVELS.items()})
+    for _name, _filename in _filenames.items():
+        _path = str(Path.joinpath(powerbi_dir, _filename))
+        _logger.info(f"...writing file {_path}")
+        write_df(df_in=_dfs[_name], path=_path)
+    return _dfs
+
+
+def _get_actual_amounts(df_txn_monthly_total: pd.DataFrame) -> pd.DataFrame:
+    """Return spend per category and month as positive amounts in pounds, months without spend and categories
+    outside the category dimension are left out"""
+    _amount = to_pounds(df_txn_monthly_total["amount"])
+    _df_actual = pd.DataFrame({
+        "category_key": df_txn_monthly_total["category_key"].astype("int64"),
+        "year_month": df_txn_monthly_total["year_month"].astype("int64"),
+        "actual_amount": _amount * -1,
+    })
+    return _df_actual.loc[(_amount < 0) & (_df_actual["category_key"] != 0)]
+
+
+def generate_date_file(min_year: int, max_year: int) -> pd.DataFrame:
     """Generate date dimension file
 
     Args:
         min_year: min year of transactions
         max_year: min year of transactions
+
+    Returns:
+        DataFrame: date dimension df
     """
     powerbi_dir = Path.joinpath(get_extracts_path(), "powerbi")
     current_year = min_year
@@ -131,84 +334,79 @@ def generate_date_file(min_year: int, max_year: int):
     _path = str(Path.joinpath(powerbi_dir, _filename))
     _logger.info(f"...writing file {_path}")
     write_df(df_in=_df_date, path=_path)
+    return _df_date
 
 
-def generate_budget_values(min_year: int, max_year: int):
-    """Generate master file
+def generate_budget_values(min_year: int, max_year: int, df_category: pd.DataFrame) -> pd.DataFrame:
+    """Generate budget values file, budget amount of each category for every month it applies to
 
     Args:
         min_year: min year of transactions
         max_year: max year of transactions
+        df_category: (DataFrame) category dimension, see generate_category_file
+
+    Returns:
+        DataFrame: category, category_key, year_month, category_year_month, budget_amount
     """
 
     extracts_path = get_extracts_path()
     dimensions_dir = Path.joinpath(extracts_path, "dimensions")
     powerbi_dir = Path.joinpath(extracts_path, "powerbi")
 
-    # collect budget values
-    _budget_file_path = Path.joinpath(dimensions_dir, "budget.csv")
-    _budget_file = open(str(_budget_file_path), 'r')
-    reader = csv.DictReader(_budget_file)
-    _budget_values = []
-    for dictionary in reader:
-        if float(dictionary.get("amount")) != 0:
-            start_year_month = int(dictionary.get("start"))
-            end_year_month = int(dictionary.get("end"))
-            if end_year_month == 999912:
-                end_year_month = int(str(max_year) + "12")
-
-            if start_year_month == 190001:
-                start_year_month = int(str(min_year) + "01")
-
-            current_year_month = start_year_month
-            while current_year_month <= end_year_month:
-                category_year_month = dictionary.get("category") + "-" + str(current_year_month)
-                budget_amount = float(dictionary.get("amount"))
-                new_row = {
-                    "category": dictionary.get("category"),
-                    "year_month": current_year_month,
-                    "category_year_month": category_year_month,
-                    "budget_amount": budget_amount
-                }
-                _budget_values.append(new_row)
-
-                if str(current_year_month)[-2:] == "12":
-                    current_year_month = (int(str(current_year_month)[:4]) + 1) * 100 + 1
-                else:
-                    current_year_month += 1
-    _df_budget = pd.DataFrame(_budget_values)
+    # budget intervals, open-ended start/end (190001/999912) span the years of the power bi files
+    _df_interval = pd.read_csv(str(Path.joinpath(dimensions_dir, "budget.csv")), sep=",",
+                               dtype={"category": str, "start": "int64", "end": "int64", "amount": float},
+                               keep_default_na=False)
+    _df_interval = _df_interval.loc[_df_interval["amount"] != 0]
+    _start = _df_interval["start"].mask(_df_interval["start"] == START_YEAR_MONTH, min_year * 100 + 1).to_numpy()
+    _end = _df_interval["end"].mask(_df_interval["end"] == END_YEAR_MONTH, max_year * 100 + 12).to_numpy()
+
+    # one row per interval and month, months counted from year 0 so intervals expand with array repeats
+    _start_month = _start // 100 * 12 + _start % 100 - 1
+    _months = np.maximum(_end // 100 * 12 + _end % 100 - 1 - _start_month + 1, 0)
+    _interval = np.repeat(np.arange(len(_start_month)), _months)
+    _month = _start_month[_interval] + np.arange(len(_interval)) - np.repeat(np.cumsum(_months) - _months, _months)
+    _year_month = _month // 12 * 100 + _month % 12 + 1
+
+    _category = _df_interval["category"].to_numpy()[_interval]
+    _df_budget = pd.DataFrame({
+        "category": _category,
+        "category_key": _category_key(_df_interval["category"], df_category)[_interval],
+        "year_month": _year_month,
+        "category_year_month": _category + "-" + _year_month.astype(str),
+        "budget_amount": _df_interval["amount"].to_numpy()[_interval],
+    })
 
     _filename = "budget_values.csv"
     _path = str(Path.joinpath(powerbi_dir, _filename))
     _logger.info(f"...writing file {_path}")
     write_df(df_in=_df_budget, path=_path)
+    return _df_budget
 
 
-def generate_combined_budget():
-    """Generate combined budget"""
+def generate_combined_budget(df_budget: pd.DataFrame, df_txn_monthly_total: pd.DataFrame) -> pd.DataFrame:
+    """Generate combined budget
 
-    powerbi_dir = Path.joinpath(get_extracts_path(), "powerbi")
+    Args:
+        df_budget: (DataFrame) budget values df
+        df_txn_monthly_total: (DataFrame) transaction monthly totals df
+
+    Returns:
+        DataFrame: category, category_key, year_month, category_year_month, budget_amount
+    """
 
-    # collect budget values
-    _budget_file_path = Path.joinpath(powerbi_dir, "budget_values.csv")
-    _df_budget = pd.read_csv(str(_budget_file_path), sep=",")
+    powerbi_dir = Path.joinpath(get_extracts_path(), "powerbi")
 
     # collect actual transaction amounts
-    _txn_monthly_total_file_path = Path.joinpath(powerbi_dir, "transaction_monthly_total.csv")
-    _df_txn_monthly_total = pd.read_csv(str(_txn_monthly_total_file_path), sep=",")
-    _df_txn_monthly_total.loc[_df_txn_monthly_total["amount"] < 0, "actual_amount"] = \
-        _df_txn_monthly_total["amount"] * -1
-    _df_txn_monthly_total = _df_txn_monthly_total.loc[_df_txn_monthly_total["actual_amount"].notnull(), :]
-    columns = ["category_year_month", "actual_amount"]
-    _df_txn_monthly_total = _df_txn_monthly_total[columns]
+    _df_txn_monthly_total = _get_actual_amounts(df_txn_monthly_total)
 
     # update budget with actual values
-    _df_budget = pd.merge(_df_budget, _df_txn_monthly_total,
-                          how="left", on=["category_year_month"], suffixes=("", "_x"))
+    _df_budget = pd.merge(df_budget, _df_txn_monthly_total,
+                          how="left", on=["category_key", "year_month"], suffixes=("", "_x"))
 
     # fill blanks
-    _df_budget['budget_amount'].fillna(0, inplace=True)
-    columns = ["category", "year_month", "category_year_month", "budget_amount"]
+    _df_budget['budget_amount'] = _df_budget['budget_amount'].fillna(0)
+    columns = ["category", "category_key", "year_month", "category_year_month", "budget_amount"]
     _df_budget = _df_budget[columns]
 
     # write df
@@ -216,106 +414,167 @@ def generate_combined_budget():
     _path = str(Path.joinpath(powerbi_dir, _filename))
     _logger.info(f"...writing file {_path}")
     write_df(df_in=_df_budget, path=_path)
+    return _df_budget
 
 
-def generate_master_file():
-    """Generate master file"""
+def _update_master(df_master: pd.DataFrame, df_budget_combined: pd.DataFrame, df_actual: pd.DataFrame,
+                   plan: dict) -> pd.DataFrame:
+    """Update budget and actual of touched months in the previous master df, running totals by their change
 
-    powerbi_dir = Path.joinpath(get_extracts_path(), "powerbi")
-
-    # collect budget values
-    _budget_file_path = Path.joinpath(powerbi_dir, "budget_combined.csv")
-    _df_budget = pd.read_csv(str(_budget_file_path), sep=",")
-
-    # collect actual transaction amounts
-    _txn_monthly_total_file_path = Path.joinpath(powerbi_dir, "transaction_monthly_total.csv")
-    _df_txn_monthly_total = pd.read_csv(str(_txn_monthly_total_file_path), sep=",")
-    _df_txn_monthly_total.loc[_df_txn_monthly_total["amount"] < 0, "actual_amount"] = \
-        _df_txn_monthly_total["amount"] * -1
-    _df_txn_monthly_total = _df_txn_monthly_total.loc[_df_txn_monthly_total["actual_amount"].notnull(), :]
-    columns = ["category_year_month", "actual_amount"]
-    _df_txn_monthly_total = _df_txn_monthly_total[columns]
+    Args:
+        df_master: (DataFrame) previous master df, built with the same categories, budget and months
+        df_budget_combined: (DataFrame) combined budget df
+        df_actual: (DataFrame) actual amounts, see _get_actual_amounts
+        plan: (dict) aggregate plan, see plan_aggregates
 
-    # construct master dataframe
-    _df_category = get_category()
-    columns = ["master_category", "subcategory", "category"]
-    _df_category = _df_category[columns]
-
-    columns = ["master_category", "subcategory", "category", "budget", "category_date", "year_month",
-               "category_year_month"]
-    _df_master = pd.DataFrame(columns=columns)
-    _date_file_path = Path.joinpath(powerbi_dir, "dim_date.csv")
-    _date_file = open(str(_date_file_path), 'r')
-    reader = csv.DictReader(_date_file)
-    _date_list = list()
-    for dictionary in reader:
-        _df_row = copy.deepcopy(_df_category)
-        _df_row["category_date"] = dictionary.get("date_value")
-        _df_row["year_month"] = dictionary.get("year_month")
-        _df_row["category_year_month"] = _df_row["category"] + "-" + str(dictionary.get("year_month"))
-        _df_row["budget"] = 0
-        _df_master = pd.concat([_df_master, _df_row], ignore_index=True)
-
-    # update with budget values
-    _df_master = pd.merge(_df_master, _df_budget, how="left", on=["category_year_month"], suffixes=("", "_x"))
-
-    def _get_amount(amount):
-        if amount:
-            return amount
-        else:
-            return 0
-    _df_master['budget'] = _df_master['budget_amount'].apply(_get_amount)
-    _df_master['budget'].fillna(0, inplace=True)
-    columns = ["master_category", "subcategory", "category", "budget", "category_date", "year_month",
-               "category_year_month"]
-    _df_master = _df_master[columns]
+    Returns:
+        DataFrame: updated master df
+    """
+    if not plan["year_months"]:
+        return df_master
+    _df_master = df_master.copy()
+    _touched_rows = _touched(_df_master, plan)
+    _keys = pd.MultiIndex.from_frame(_df_master.loc[_touched_rows, ["category_key", "year_month"]])
+    _actual = pd.Series(df_actual.set_index(["category_key", "year_month"])["actual_amount"].reindex(_keys)
+                        .fillna(0).to_numpy(), index=_df_master.index[_touched_rows])
+    _actual_budget = pd.MultiIndex.from_frame(
+        df_budget_combined.loc[df_budget_combined["budget_amount"] == -1, ["category_key", "year_month"]])
+    _budget = _df_master.loc[_touched_rows, "budget"].mask(_keys.isin(_actual_budget), _actual)
+
+    _df_change = pd.DataFrame({"budget": 0.0, "actual": 0.0}, index=_df_master.index)
+    _df_change.loc[_touched_rows, "budget"] = _budget - _df_master.loc[_touched_rows, "budget"]
+    _df_change.loc[_touched_rows, "actual"] = _actual - _df_master.loc[_touched_rows, "actual"]
+    _df_master.loc[_touched_rows, "budget"] = _budget
+    _df_master.loc[_touched_rows, "actual"] = _actual
+
+    # running totals before the first touched month are unchanged
+    _later = _df_master["year_month"] >= min(plan["year_months"])
+    _df_change = _df_change.loc[_later].groupby(_df_master.loc[_later, "category_key"]).cumsum()
+    for _column in ["budget", "actual"]:
+        _df_master.loc[_later, f"{_column}_running_total"] = normalise_zero(
+            (_df_master.loc[_later, f"{_column}_running_total"] + _df_change[_column]).round(2))
+    _df_master.loc[_later, "balance"] = normalise_zero((_df_master.loc[_later, "budget_running_total"]
+                                                        - _df_master.loc[_later, "actual_running_total"]).round(2))
+    return _df_master
+
+
+def generate_master_file(df_budget_combined: pd.DataFrame, df_txn_monthly_total: pd.DataFrame,
+                         df_date: pd.DataFrame, df_category: pd.DataFrame, plan: dict = None) -> pd.DataFrame:
+    """Generate master file
 
-    # combine with actual file
-    _df_master = pd.merge(_df_master, _df_txn_monthly_total,
-                          how="left", on=["category_year_month"], suffixes=("", "_y"))
+    Args:
+        df_budget_combined: (DataFrame) combined budget df
+        df_txn_monthly_total: (DataFrame) transaction monthly totals df
+        df_date: (DataFrame) date dimension df
+        df_category: (DataFrame) category dimension df, see generate_category_file
+        plan: (dict) aggregate plan, only touched months are updated, see plan_aggregates
 
-    def _get_amount(amount):
-        if amount:
-            return amount
-        else:
-            return 0
+    Returns:
+        DataFrame: budget, actual and running totals per category and month
+    """
 
-    _df_master.loc[_df_master['budget'] == -1, "budget"] = _df_master['actual_amount'].apply(_get_amount)
-    _df_master.loc[:, "actual"] = _df_master['actual_amount'].apply(_get_amount)
+    powerbi_dir = Path.joinpath(get_extracts_path(), "powerbi")
+    _filename = "master.csv"
+    _path = str(Path.joinpath(powerbi_dir, _filename))
 
-    _df_master['budget'].fillna(0, inplace=True)
-    _df_master['actual'].fillna(0, inplace=True)
+    # collect actual transaction amounts
+    _df_txn_monthly_total = _get_actual_amounts(df_txn_monthly_total)
+
+    if plan is not None and plan["year_months"] is not None:
+        _df_previous = pd.read_csv(_path, sep=",", keep_default_na=False, float_precision="round_trip",
+                                   dtype={"master_category": str, "subcategory": str, "category": str,
+                                          "category_key": "int64", "category_date": str, "year_month": "int64",
+                                          "category_year_month": str})
+        _df_master = _update_master(df_master=_df_previous, df_budget_combined=df_budget_combined,
+                                    df_actual=_df_txn_monthly_total, plan=plan)
+        _logger.info(f"...writing file {_path}")
+        write_df(df_in=_df_master, path=_path)
+        return _df_master
 
-    columns = ["master_category", "subcategory", "category", "budget", "actual", "category_date", "year_month",
-               "category_year_month"]
+    # construct master dataframe
+    columns = ["master_category", "subcategory", "category", "category_key"]
+    _df_category = df_category[columns]
+
+    # every category for every month, month by month
+    _df_month = pd.DataFrame({
+        "category_date": df_date["date_value"].dt.strftime("%Y-%m-%d"),
+        "year_month": df_date["year_month"].astype("int64"),
+    })
+    _df_master = pd.merge(_df_month, _df_category, how="cross")
+    _df_master["category_year_month"] = np.asarray(
+        _join_labels(_df_master["category"], _df_master["year_month"], sep="-"), dtype=object)
+
+    # update with budget values, combine with actual values, budget of -1 is the actual amount
+    _df_master = pd.merge(_df_master, df_budget_combined[["category_key", "year_month", "budget_amount"]],
+                          how="left", on=["category_key", "year_month"])
+    _df_master = pd.merge(_df_master, _df_txn_monthly_total, how="left", on=["category_key", "year_month"])
+    _df_master["actual"] = _df_master["actual_amount"].fillna(0)
+    _budget = _df_master["budget_amount"].fillna(0)
+    _df_master["budget"] = _budget.mask(_budget == -1, _df_master["actual"])
+
+    columns = ["master_category", "subcategory", "category", "category_key", "budget", "actual", "category_date",
+               "year_month", "category_year_month"]
     _df_master = _df_master[columns]
 
-    # generate running total
-    _df_master["budget_running_total"] = _df_master.groupby(["category"])["budget"].cumsum()
-    _df_master["actual_running_total"] = _df_master.groupby(["category"])["actual"].cumsum()
-    _df_master["balance"] = _df_master["budget_running_total"] - _df_master["actual_running_total"]
+    # generate running total, rounded as _update_master rounds them
+    for _column in ["budget", "actual"]:
+        _df_master[f"{_column}_running_total"] = normalise_zero(
+            _df_master.groupby(["category_key"])[_column].cumsum().round(2))
+    _df_master["balance"] = normalise_zero(
+        (_df_master["budget_running_total"] - _df_master["actual_running_total"]).round(2))
 
-    _filename = "master.csv"
-    _path = str(Path.joinpath(powerbi_dir, _filename))
     _logger.info(f"...writing file {_path}")
     write_df(df_in=_df_master, path=_path)
+    return _df_master
 
 
-def main():
-    """Main entrypoint"""
+def generate_powerbi_dfs(fact_dfs: dict, max_year: int = None, full_rebuild: bool = False):
+    """Generate power bi files from fact tables, each file is passed on to the next in memory
+
+    Transaction totals and the master file are only updated for months whose transactions changed since the
+    last run, see plan_aggregates.
 
-    min_year, max_year = generate_txn_file()
-    max_year = 2024
-    generate_txn_monthly_total_file()
-    generate_date_file(min_year=min_year, max_year=max_year)
-    generate_budget_values(min_year=min_year, max_year=max_year)
-    generate_combined_budget()
-    generate_master_file()
+    Args:
+        fact_dfs: (dict) fact table name -> fact df, see read_fact_dfs
+        max_year: (int) last year of the power bi files, last year of transactions if not supplied
+        full_rebuild: (bool) rebuild transaction totals and master file from the whole history
+    """
+    _df_category = generate_category_file()
+    _df_txn = generate_txn_file(fact_dfs=fact_dfs, df_category=_df_category)
+    min_year, max_year = get_year_range(_df_txn, max_year=max_year)
+    _plan = plan_aggregates(df_txn=_df_txn, min_year=min_year, max_year=max_year, full_rebuild=full_rebuild)
+    _df_txn_monthly_total = generate_rollup_files(df_txn=_df_txn, plan=_plan)["monthly_total"]
+    _df_date = generate_date_file(min_year=min_year, max_year=max_year)
+    _df_budget = generate_budget_values(min_year=min_year, max_year=max_year, df_category=_df_category)
+    _df_budget_combined = generate_combined_budget(df_budget=_df_budget, df_txn_monthly_total=_df_txn_monthly_total)
+    generate_master_file(df_budget_combined=_df_budget_combined, df_txn_monthly_total=_df_txn_monthly_total,
+                         df_date=_df_date, df_category=_df_category, plan=_plan)
+    save_aggregate_plan(_plan)
+
+
+def setup_args():
+    _parser.add_argument("--max-year", type=int, default=None,
+                         help="last year of the date dimension and open-ended budgets, last year of transactions "
+                              "if not supplied")
+    _parser.add_argument("--full-rebuild", action="store_true",
+                         help="rebuild transaction totals and master file from the whole history")
+    _parser.add_argument("--exact-money", action="store_true",
+                         help="hold amounts as integer pence, totals and reconciliation are exact")
+
+
+def main(args_in: dict):
+    """Main entrypoint"""
+    if args_in.get("exact_money"):
+        set_exact_money(True)
+    generate_powerbi_dfs(fact_dfs=read_fact_dfs(), max_year=args_in.get("max_year"),
+                         full_rebuild=bool(args_in.get("full_rebuild")))
 
 
 _logger = logging.getLogger(__name__)
 setup_logging()
+_parser: Final = argparse.ArgumentParser(description="Python utility to generate power bi files from fact tables")
+setup_args()
 
 
 if __name__ == '__main__':
-    main()
+    main(vars(_parser.parse_args()))
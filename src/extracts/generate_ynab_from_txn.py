@@ -4,45 +4,50 @@ Generates ynab file from transaction history
 Steps
 1. place transaction history in this format 'yyyy-mm-dd_txn.csv' in the root folder
 2. run `python generate_ynab_from_txn.py`
+    - optionally `--workers N` to process statements in parallel
+    - optionally `--chunksize N` to stream large exports N rows at a time
+    - statements are regenerated when their txn file, balances or payee mappings change,
+      `--dry-run` lists them, `--force` regenerates everything including edited ynab files
 """
 import logging
+import argparse
+import csv
+import heapq
+import os
 import pandas as pd
-import copy
 
+from contextlib import ExitStack
+from functools import partial
+from operator import itemgetter
+from typing import Final
 from pathlib import Path
 
 from utilities import write_df, setup_logging, get_files_list
-from utilities import get_payee_mapping, get_category_mapping, get_balance, get_extracts_path
+from utilities import get_payee_matcher, get_balance_index, get_extracts_path, PayeeMatcher, MissingStatementError
+from utilities import BalanceIndex, StatementError, run_statements, read_hsbc_txn, HsbcParseError, RunManifest
+from utilities import set_exact_money, to_money, to_pounds, round_money
 
 
-def transform_payee(original_payee: str) -> (str, str):
+def transform_payee(original_payee: str, matcher: PayeeMatcher = None) -> (str, str):
     """Helper function, transform payee into friendly name, category
 
     Args:
         original_payee (str): payee
+        matcher (PayeeMatcher): prebuilt matcher, built from the mapping files if not supplied
 
     Returns:
         tuple: (friendly payee name, category)
     """
-    payee_mappings = get_payee_mapping()
-    category_mappings = get_category_mapping()
-
-    friendly_name = original_payee
-    category = ""
-
-    for payee_mapping in payee_mappings:
-        if str(payee_mapping['original_payee']).lower() in original_payee.lower():
-            friendly_name = payee_mapping['friendly_name']
-            for category_mapping in category_mappings:
-                if friendly_name == category_mapping["payee"]:
-                    category = category_mapping["category"]
-
-    return friendly_name, category
+    if matcher is None:
+        matcher = get_payee_matcher()
+    return matcher.match(original_payee)
 
 
 def clean_df_ynab(df_param: pd.DataFrame) -> pd.DataFrame:
     """Helper function, clean and transform the input dataframe (columns, data types etc)
 
+    The input dataframe is not modified, the ynab dataframe is built from its columns.
+
     Args:
         df_param (dataframe): input dataframe
 
@@ -50,102 +55,223 @@ def clean_df_ynab(df_param: pd.DataFrame) -> pd.DataFrame:
         dataframe: transformed dataframe
 
     """
-    df_ynab = copy.deepcopy(df_param)
-
-    # rename columns
-    df_ynab.rename(columns={'date': 'Date', 'payee': 'Payee'}, inplace=True)
-    df_ynab['Date'] = pd.to_datetime(df_ynab['Date'])
-
     # remove balance rows
-    idx = df_ynab.loc[df_ynab['Payee'].str.contains('(?i)balance'), :].index
-    df_ynab.drop(idx, inplace=True)
-
-    # create additional ynab columns, format values
-    df_ynab['Category'] = ''
-    df_ynab['Memo'] = ''
-    df_ynab.loc[df_ynab['amount'] < 0, 'Outflow'] = df_ynab['amount'] * -1
-    df_ynab.loc[df_ynab['amount'] > 0, 'Inflow'] = df_ynab['amount']
-    df_ynab['Outflow'].fillna('', inplace=True)
-    df_ynab['Inflow'].fillna('', inplace=True)
-    cols = ['Date', 'Payee', 'Category', 'Memo', 'Outflow', 'Inflow']
-    df_ynab = df_ynab[cols]
-    df_ynab['Date'] = df_ynab['Date'].apply(lambda x: x.strftime('%Y-%m-%d'))
-
-    # process payees
-    df_ynab[['Payee', 'Category']] = df_ynab['Payee'].apply(transform_payee).apply(pd.Series)
+    _df = df_param.loc[~df_param['payee'].str.contains('(?i)balance', na=False)]
+
+    # create ynab columns, format values
+    _amount = _df['amount']
+    _df_payees = get_payee_matcher().enrich(_df['payee'])
+    df_ynab = pd.DataFrame({
+        'Date': pd.to_datetime(_df['date']).dt.strftime('%Y-%m-%d'),
+        'Payee': _df_payees['Payee'],
+        'Category': _df_payees['Category'],
+        'Memo': '',
+        'Outflow': (_amount * -1).where(_amount < 0, ''),
+        'Inflow': _amount.where(_amount > 0, ''),
+    })
     return df_ynab
 
 
-def generate_processed_files(extracts_dir: Path):
+def validate_txn_total(statement_date: str, actual_total: float, balance_index: BalanceIndex):
+    """Validate total of statement amounts reconciles with opening and closing balances
+
+    Args:
+        statement_date: (str) statement date in yyyy-mm-dd format
+        actual_total: (float) sum of statement amounts, pence in exact money mode
+        balance_index: (BalanceIndex) balances indexed by statement date
+
+    Raises:
+        StatementError: statement is not in balance.csv or amounts do not reconcile
+    """
+    try:
+        _opening, _closing = balance_index.get(statement_date)
+    except MissingStatementError as ex:
+        raise StatementError(f"{ex}. please update balance.csv") from None
+    _expected_total = round_money(to_money(_closing) - to_money(_opening))
+    _actual_total = round_money(actual_total)
+    _logger.debug(f"...actual opening balance: {_opening}")
+    _logger.debug(f"...actual closing balance: {_closing}")
+    _logger.debug(f"...expected total: {_expected_total}, actual total: {_actual_total}")
+    if _expected_total != _actual_total:
+        raise StatementError(f"some transactions are missing in statement {statement_date}. "
+                             f"expected total: {to_pounds(_expected_total)}, actual total: {to_pounds(_actual_total)}")
+
+
+def process_txn_file(txn_file: Path, balance_index: BalanceIndex) -> pd.DataFrame:
+    """Clean txn csv file into df, validate amounts reconcile with opening and closing balances
+
+    Args:
+        txn_file: (Path) txn csv file
+        balance_index: (BalanceIndex) balances indexed by statement date
+
+    Returns:
+        DataFrame: processed df
+
+    Raises:
+        StatementError: statement is not in balance.csv or amounts do not reconcile
+    """
+    _statement_date = str(txn_file.stem[0:10])
+    _logger.info(f"cleaning up {txn_file.stem} into df...")
+    try:
+        _df_in = read_hsbc_txn(txn_file)
+    except HsbcParseError as ex:
+        raise StatementError(str(ex)) from None
+
+    # sort by date, keeping export order within a day
+    _df_in = _df_in.sort_values(by=["date"], kind="mergesort").reset_index(drop=True)
+
+    _logger.info("...cleaning up complete")
+
+    _logger.info("...validating df")
+    validate_txn_total(statement_date=_statement_date, actual_total=_df_in["amount"].sum(), balance_index=balance_index)
+    _logger.info(f"...file is valid\n")
+    return _df_in
+
+
+def _merge_sorted_runs(run_paths: list, path: Path):
+    """Append rows of csv files without header, each sorted by its first column, to path in one sorted order
+
+    Rows with the same first column keep the order of the files, then their order within a file.
+
+    Args:
+        run_paths: (list) sorted csv files
+        path: (Path) csv file to append to
+    """
+    with ExitStack() as _stack:
+        _readers = [csv.reader(_stack.enter_context(open(_run_path, newline=""))) for _run_path in run_paths]
+        _out = _stack.enter_context(open(path, "a", newline=""))
+        csv.writer(_out, lineterminator=os.linesep).writerows(heapq.merge(*_readers, key=itemgetter(0)))
+
+
+def stream_txn_file(txn_file: Path, balance_index: BalanceIndex, chunksize: int) -> int:
+    """Clean txn csv file chunk by chunk straight into its processed csv file
+
+    Peak memory is bounded by chunksize. The total used to reconcile with balance.csv is accumulated
+    while streaming, the processed file is only put in place once the statement reconciles.
+    Each chunk is sorted by date into a run file and the runs are merged, so rows are in the same order as
+    process_txn_file writes them.
+
+    Args:
+        txn_file: (Path) txn csv file
+        balance_index: (BalanceIndex) balances indexed by statement date
+        chunksize: (int) number of rows read at a time
+
+    Returns:
+        int: number of rows written
+
+    Raises:
+        StatementError: statement is not in balance.csv or amounts do not reconcile
+    """
+    _statement_date = str(txn_file.stem[0:10])
+    _processed_path = Path.joinpath(txn_file.parent, f"{_statement_date}_processed.csv")
+    _partial_path = Path.joinpath(txn_file.parent, f"{_statement_date}_processed.csv.partial")
+    _logger.info(f"streaming {txn_file.stem} into {_processed_path.name}, {chunksize} rows at a time...")
+
+    _rows = 0
+    _actual_total = 0
+    _run_paths = []
+    try:
+        for _df_chunk in read_hsbc_txn(txn_file, chunksize=chunksize):
+            _actual_total += _df_chunk["amount"].sum()
+            if not _run_paths:
+                write_df(df_in=_df_chunk.iloc[:0], path=str(_partial_path))
+            # sort by date, keeping export order within a day
+            _run_paths.append(Path(f"{_partial_path}.{len(_run_paths)}"))
+            write_df(df_in=_df_chunk.sort_values(by=["date"], kind="mergesort"), path=str(_run_paths[-1]),
+                     header=False)
+            _rows += len(_df_chunk.index)
+        _logger.info(f"...{_rows} rows streamed")
+
+        _logger.info("...validating totals")
+        validate_txn_total(statement_date=_statement_date, actual_total=_actual_total, balance_index=balance_index)
+
+        _logger.info(f"...merging {len(_run_paths)} sorted runs")
+        _merge_sorted_runs(_run_paths, _partial_path)
+    except HsbcParseError as ex:
+        _partial_path.unlink(missing_ok=True)
+        raise StatementError(str(ex)) from None
+    except Exception:
+        _partial_path.unlink(missing_ok=True)
+        raise
+    finally:
+        for _run_path in _run_paths:
+            _run_path.unlink(missing_ok=True)
+
+    _partial_path.replace(_processed_path)
+    _logger.info(f"...file is valid\n")
+    return _rows
+
+
+def generate_processed_files(extracts_dir: Path, workers: int = 1, chunksize: int = None, force: bool = False,
+                             dry_run: bool = False, start_date: str = None, end_date: str = None) -> bool:
     """Process txn csv files, output to processed csv files
 
+    Statements are (re)processed when the txn file or the statement balances changed since the last run.
+
     Args:
         extracts_dir: (Path): working directory
+        workers: (int) number of statements processed in parallel
+        chunksize: (int) if supplied, stream txn files into processed files this many rows at a time
+        force: (bool) reprocess all statements
+        dry_run: (bool) only report which statements would be processed
+        start_date: (str) first statement date in yyyy-mm-dd format, all statements if not supplied
+        end_date: (str) last statement date in yyyy-mm-dd format, all statements if not supplied
+
+    Returns:
+        bool: False if any statement failed, valid statements are written regardless
     """
     _logger.info("... generating processed files")
 
     _logger.info("... get transaction files...")
-    _transaction_files_list = []
-    try:
-        _files = extracts_dir.glob(f"*.csv")
-        for _file in _files:
-            if str(_file.stem[11:]).lower() == "txn":
-                _transaction_files_list.append(_file)
-    except FileNotFoundError:
-        _logger.exception(f"File/path {extracts_dir} does not exist")
+    _transaction_files_list = get_files_list(file_path=extracts_dir, suffix=["txn"],
+                                             start_date=start_date, end_date=end_date)
 
     _logger.info(f"...{len(_transaction_files_list)} files found\n")
     if not _transaction_files_list:
         _logger.info(f"...nothing to process. terminating \n")
         exit()
 
-    _logger.info(f"...cleaning up file into df")
-    _clean_dfs = []
+    _balance_index = get_balance_index()
+    _manifest = RunManifest(extracts_dir)
+    _pending_files = []
+    _runs = {}
     for _file in _transaction_files_list:
         _statement_date = str(_file.stem[0:10])
         _processed_filename = f"{_statement_date}_processed.csv"
         _processed_path = Path.joinpath(extracts_dir, _processed_filename)
-        if _processed_path.is_file():
-            _logger.info(f"...processed file exists: {_processed_path.stem}... continuing to next file")
+        _balances = str(_balance_index.get(_statement_date)) if _statement_date in _balance_index else ""
+        _run = {"inputs": [_file], "dimensions": [_balances], "outputs": [_processed_path]}
+        _rerun, _reason = _manifest.plan(stage="processed", statement_date=_statement_date, force=force,
+                                         adopt=not dry_run, **_run)
+        if not _rerun:
+            _logger.info(f"...skipping {_processed_path.stem}: {_reason}")
             continue
+        _logger.info(f"...{'would process' if dry_run else 'processing'} {_file.stem}: {_reason}")
+        _pending_files.append(_file)
+        _runs[_statement_date] = _run
 
-        _df_in = pd.read_csv(str(_file), header=None)
-        # set columns
-        _cols = ['date', 'payee', 'amount']
-        _df_in.columns = _cols
-
-        # transform date
-        _df_in[['payee', 'amount']] = _df_in[['payee', 'amount']].astype(str)
-        _df_in['date'] = pd.to_datetime(_df_in['date'], dayfirst=True)
-
-        # transform amount
-        _df_in.loc[:, 'amount'] = _df_in['amount'].str.replace(',', '')
-        _df_in.loc[:, 'amount'] = _df_in['amount'].str.replace('"', '')
-        _df_in[['amount']] = _df_in[['amount']].astype(float)
-
-        # reset index
-        _df_in.sort_values(by=["date"])
-        _df_in.reset_index(drop=True)
-
-        _logger.info("...cleaning up complete")
-
-        _logger.info("...validating df")
-        _df_balance = get_balance()
-
-        _opening = _df_balance.loc[_df_balance["statement_date"] == _statement_date, "opening_balance"].values[0]
-        _closing = _df_balance.loc[_df_balance["statement_date"] == _statement_date, "closing_balance"].values[0]
-        _expected_total = round(_closing - _opening, 2)
-        _actual_total = round(_df_in["amount"].sum(), 2)
-        _logger.debug(f"...actual opening balance: {_opening}")
-        _logger.debug(f"...actual closing balance: {_closing}")
-        _logger.debug(f"...expected total: {_expected_total}, actual total: {_actual_total}")
-        if _expected_total != _actual_total:
-            _logger.info(f"...some transactions are missing\n")
-            exit()
+    if dry_run:
+        _manifest.close()
+        return True
+
+    if chunksize:
+        _logger.info(f"...streaming files into processed files")
+        _func = partial(stream_txn_file, balance_index=_balance_index, chunksize=chunksize)
+    else:
+        _logger.info(f"...cleaning up files into df")
+        _func = partial(process_txn_file, balance_index=_balance_index)
+    _results = run_statements(func=_func, items=_pending_files, workers=workers)
+    _clean_dfs = []
+    _failed = False
+    for _result in _results:
+        _statement_date = str(_result["item"].stem[0:10])
+        if _result["error"]:
+            _logger.error(f"...{_result['error']}\n")
+            _failed = True
+        elif chunksize:
+            _manifest.record(stage="processed", statement_date=_statement_date, **_runs[_statement_date])
         else:
-            _logger.info(f"...file is valid\n")
-            _clean_df = {"statement_date": _statement_date, "df": _df_in}
-            _clean_dfs.append(_clean_df)
+            _clean_dfs.append({"statement_date": _statement_date, "df": _result["result"]})
 
     if _clean_dfs:
         _logger.info(f"writing processed dfs to disk...")
@@ -155,45 +281,97 @@ def generate_processed_files(extracts_dir: Path):
             _processed_path = str(Path.joinpath(extracts_dir, _processed_filename))
             _logger.info(f"...writing file {_processed_filename}")
             write_df(df_in=_clean_df["df"], path=_processed_path)
+            _manifest.record(stage="processed", statement_date=_statement_date, **_runs[_statement_date])
         _logger.info("...writing to disk complete\n")
-    else:
+    elif not chunksize:
         _logger.info(f"\nnothing to process\n")
+    _manifest.close()
+    return not _failed
+
+
+def generate_ynab_df(processed_file: Path) -> pd.DataFrame:
+    """Generate ynab df from processed csv file
 
+    Args:
+        processed_file: (Path) processed csv file
+
+    Returns:
+        DataFrame: ynab df
+    """
+    _logger.info(f"generating ynab file using processed file: {processed_file.stem}...")
+    _df_in = pd.read_csv(str(processed_file), sep=",")
+    _df_ynab = clean_df_ynab(_df_in)
+    _logger.info(f"...ynab df generation complete\n")
+    return _df_ynab
 
-def generate_ynab_files(extracts_dir: Path, suffix: list):
+
+def generate_ynab_files(extracts_dir: Path, suffix: list, workers: int = 1, force: bool = False,
+                        dry_run: bool = False, start_date: str = None, end_date: str = None) -> bool:
     """Process processed csv files, output to ynab csv files
 
+    Statements are regenerated when the processed file or the payee/category mappings changed since
+    the last run, unless the ynab file was edited since it was generated.
+
     Args:
         extracts_dir (str): working directory
         suffix (list): list of files with suffix in [suffix] to process
+        workers: (int) number of statements processed in parallel
+        force: (bool) regenerate all statements, overwriting edited ynab files
+        dry_run: (bool) only report which statements would be generated
+        start_date: (str) first statement date in yyyy-mm-dd format, all statements if not supplied
+        end_date: (str) last statement date in yyyy-mm-dd format, all statements if not supplied
+
+    Returns:
+        bool: False if any statement failed, valid statements are written regardless
     """
     _logger.info("**********************************")
     _logger.info("*** generating ynab files ***")
     _logger.info("**********************************")
 
     _logger.info("get processed files...")
-    _processed_files_list = get_files_list(file_path=extracts_dir, suffix=suffix)
+    _processed_files_list = get_files_list(file_path=extracts_dir, suffix=suffix,
+                                           start_date=start_date, end_date=end_date)
     _logger.info(f"...{len(_processed_files_list)} files found\n")
     if not _processed_files_list:
         _logger.info(f"...nothing to process. terminating \n")
         exit()
 
     _logger.info(f"generating ynab dfs...")
-    _ynab_dfs = []
+    _dimensions_dir = Path.joinpath(extracts_dir, "dimensions")
+    _mapping_files = [
+        Path.joinpath(_dimensions_dir, "payee_mapping.csv"),
+        Path.joinpath(_dimensions_dir, "category_mapping.csv")
+    ]
+    _manifest = RunManifest(extracts_dir)
+    _pending_files = []
+    _runs = {}
     for _file in _processed_files_list:
         _statement_date = str(_file.stem[0:10])
         _ynab_filename = f"{_statement_date}_ynab.csv"
         _ynab_path = Path.joinpath(extracts_dir, _ynab_filename)
-        if _ynab_path.is_file():
-            _logger.info(f"...ynab file exists: {_ynab_path.stem}")
+        _run = {"inputs": [_file], "dimensions": _mapping_files, "outputs": [_ynab_path]}
+        _rerun, _reason = _manifest.plan(stage="ynab", statement_date=_statement_date, force=force,
+                                         adopt=not dry_run, **_run)
+        if not _rerun:
+            _logger.info(f"...skipping {_ynab_path.stem}: {_reason}")
             continue
+        _logger.info(f"...{'would generate' if dry_run else 'generating'} {_ynab_path.stem}: {_reason}")
+        _pending_files.append(_file)
+        _runs[_statement_date] = _run
 
-        _logger.info(f"generating ynab file using processed file: {_file.stem}...")
-        _statement_date = str(_file.stem[0:10])
-        _df_in = pd.read_csv(str(_file), sep=",")
-        _df_ynab = clean_df_ynab(_df_in)
-        _logger.info(f"...ynab df generation complete\n")
-        _ynab_dfs.append({'statement_date': _statement_date, 'df': _df_ynab})
+    if dry_run:
+        _manifest.close()
+        return True
+
+    _results = run_statements(func=generate_ynab_df, items=_pending_files, workers=workers)
+    _ynab_dfs = []
+    _failed = False
+    for _result in _results:
+        if _result["error"]:
+            _logger.error(f"...{_result['error']}\n")
+            _failed = True
+        else:
+            _ynab_dfs.append({'statement_date': str(_result["item"].stem[0:10]), 'df': _result["result"]})
 
     if _ynab_dfs:
         _logger.info(f"writing ynab dfs to disk...")
@@ -203,21 +381,58 @@ def generate_ynab_files(extracts_dir: Path, suffix: list):
             _ynab_path = str(Path.joinpath(extracts_dir, _ynab_filename))
             _logger.info(f"...writing file {_ynab_filename}")
             write_df(df_in=_ynab_df["df"], path=_ynab_path, sep=",")
+            _manifest.record(stage="ynab", statement_date=_statement_date, **_runs[_statement_date])
         _logger.info("...writing to disk complete\n")
     else:
         _logger.info(f"\nnothing to write\n")
-
-
-def main():
+    _manifest.close()
+    return not _failed
+
+
+def setup_args():
+    _parser.add_argument("-w", "--workers", type=int, default=1,
+                         help="number of statements processed in parallel")
+    _parser.add_argument("-c", "--chunksize", type=int, default=None,
+                         help="stream txn files into processed files this many rows at a time")
+    _parser.add_argument("--force", action="store_true",
+                         help="regenerate all statements, including edited ynab files")
+    _parser.add_argument("--dry-run", action="store_true",
+                         help="only report which statements would be regenerated")
+    _parser.add_argument("--start-date", default=None,
+                         help="first statement date to process, yyyy-mm-dd")
+    _parser.add_argument("--end-date", default=None,
+                         help="last statement date to process, yyyy-mm-dd")
+    _parser.add_argument("--exact-money", action="store_true",
+                         help="hold amounts as integer pence, totals and reconciliation are exact")
+
+
+def main(args_in: dict):
+    if args_in.get("exact_money"):
+        set_exact_money(True)
     extracts_dir = get_extracts_path()
-
-    generate_processed_files(extracts_dir=extracts_dir)
-    generate_ynab_files(extracts_dir=extracts_dir, suffix=["processed"])
+    workers = int(args_in.get("workers") or 1)
+    chunksize = args_in.get("chunksize")
+    force = bool(args_in.get("force"))
+    dry_run = bool(args_in.get("dry_run"))
+    start_date = args_in.get("start_date")
+    end_date = args_in.get("end_date")
+
+    if not generate_processed_files(extracts_dir=extracts_dir, workers=workers, chunksize=chunksize,
+                                    force=force, dry_run=dry_run, start_date=start_date, end_date=end_date):
+        _logger.error("...some statements could not be processed. terminating\n")
+        exit(1)
+    if not generate_ynab_files(extracts_dir=extracts_dir, suffix=["processed"], workers=workers,
+                               force=force, dry_run=dry_run, start_date=start_date, end_date=end_date):
+        _logger.error("...some ynab files could not be generated. terminating\n")
+        exit(1)
 
 
 _logger = logging.getLogger(__name__)
 setup_logging()
+_parser: Final = argparse.ArgumentParser(
+    description="Python utility to generate ynab files from hsbc transaction exports")
+setup_args()
 
 
 if __name__ == '__main__':
-    main()
+    main(vars(_parser.parse_args()))
@@ -0,0 +1,336 @@
+"""
+Runs the whole workflow, from hsbc txn exports to power bi files, in one process
+
+Steps
+1. place transaction history in this format 'yyyy-mm-dd_txn.csv' in the root folder, and ynab exports of
+   other accounts as 'yyyy-mm-dd_ynab_<account>.csv'
+2. run `python run_pipeline.py`
+    - dataframes are passed from stage to stage in memory, the combined transaction_<account>.csv files
+      and the power bi files are written as usual
+    - ynab files already in the root folder are used as they are, e.g. with categories filled in.
+      if categories are missing, the ynab files of those statements are written for review and the run stops
+    - optionally `--debug-output` to also write the intermediate files of each stage to the debug folder
+    - optionally `--until <stage>` to stop after a stage, e.g. `--until facts`
+"""
+import logging
+import argparse
+import numpy as np
+import pandas as pd
+
+from functools import partial
+from typing import Final
+from pathlib import Path
+
+from utilities import setup_logging, write_df, get_files_list, get_extracts_path, get_balance_index
+from utilities import get_category_keys, validate_statements, read_fact, run_statements
+from utilities import get_account_adapter, get_account_adapters, run_stage_graph, set_exact_money
+
+from generate_ynab_from_txn import process_txn_file, clean_df_ynab
+from generate_final_from_ynab import clean_df_txn, get_account_balance_index, combine_account_txn_dfs
+from generate_powerbi_files import generate_category_file, generate_txn_file, get_year_range, generate_rollup_files, \
+    generate_date_file, generate_budget_values, generate_combined_budget, generate_master_file, plan_aggregates, \
+    save_aggregate_plan
+
+
+def _write_debug(options: dict, df_in: pd.DataFrame, filename: str):
+    """Write intermediate df to the debug folder when debug output is requested"""
+    if not options["debug_output"]:
+        return
+    _debug_dir = Path.joinpath(options["extracts_path"], "debug")
+    _debug_dir.mkdir(exist_ok=True)
+    _logger.info(f"...writing debug file {filename}")
+    write_df(df_in=df_in, path=str(Path.joinpath(_debug_dir, filename)))
+
+
+def _exit_on_errors(results: list, message: str):
+    """Log failed statements or accounts, exit if there are any"""
+    _errors = [_result["error"] for _result in results if _result["error"]]
+    for _error in _errors:
+        _logger.error(f"...{_error}")
+    if _errors:
+        _logger.error(f"...{message}. terminating\n")
+        exit(1)
+
+
+def stage_processed(results: dict, options: dict) -> dict:
+    """Clean and validate txn exports of debit card statements without a ynab file yet
+
+    Returns:
+        dict: statement date -> processed df
+    """
+    extracts_path = options["extracts_path"]
+    _txn_files = get_files_list(file_path=extracts_path, suffix=["txn"],
+                                start_date=options["start_date"], end_date=options["end_date"])
+    _pending_files = []
+    for _file in _txn_files:
+        if Path.joinpath(extracts_path, f"{_file.stem[0:10]}_ynab.csv").is_file():
+            _logger.info(f"...skipping {_file.stem}: ynab file exists")
+            continue
+        _pending_files.append(_file)
+    _logger.info(f"...{len(_pending_files)} txn files to process")
+
+    _results = run_statements(func=partial(process_txn_file, balance_index=get_balance_index()),
+                              items=_pending_files, workers=options["workers"])
+    _exit_on_errors(_results, "some statements could not be processed")
+    _processed_dfs = {}
+    for _result in _results:
+        _statement_date = str(_result["item"].stem[0:10])
+        _processed_dfs[_statement_date] = _result["result"]
+        _write_debug(options, _result["result"], f"{_statement_date}_processed.csv")
+    return _processed_dfs
+
+
+def _as_read(df_ynab: pd.DataFrame) -> pd.DataFrame:
+    """Return generated ynab df typed as if read back from its csv file, blank values become nan"""
+    return df_ynab.assign(Outflow=pd.to_numeric(df_ynab["Outflow"].replace("", np.nan)),
+                          Inflow=pd.to_numeric(df_ynab["Inflow"].replace("", np.nan)),
+                          Category=df_ynab["Category"].replace("", np.nan))
+
+
+def stage_ynab(results: dict, options: dict) -> list:
+    """Collect ynab dfs of every account
+
+    Ynab files in the root folder are read, debit card statements without one are generated from their
+    processed df.
+
+    Returns:
+        list: ynab dfs (dict) -> account, statement_date, df, file_path (None if generated)
+    """
+    extracts_path = options["extracts_path"]
+    _ynab_dfs = []
+    for _adapter in get_account_adapters(exported=True):
+        _statements = {}
+        for _file in get_files_list(file_path=extracts_path, suffix=[_adapter.ynab_suffix],
+                                    start_date=options["start_date"], end_date=options["end_date"]):
+            _statements[str(_file.stem[0:10])] = {"account": _adapter.name, "statement_date": str(_file.stem[0:10]),
+                                                  "df": pd.read_csv(str(_file)), "file_path": _file}
+        if _adapter.name == "hsbc_dc":
+            for _statement_date, _df_processed in results["processed"].items():
+                _logger.info(f"...generating ynab df for {_statement_date}")
+                _df_ynab = _as_read(clean_df_ynab(_df_processed))
+                _write_debug(options, _df_ynab, f"{_statement_date}_ynab.csv")
+                _statements[_statement_date] = {"account": _adapter.name, "statement_date": _statement_date,
+                                                "df": _df_ynab, "file_path": None}
+        _ynab_dfs += [_statements[_statement_date] for _statement_date in sorted(_statements)]
+    _logger.info(f"...{len(_ynab_dfs)} ynab dfs")
+    return _ynab_dfs
+
+
+def stage_transaction(results: dict, options: dict) -> list:
+    """Generate transaction dfs from ynab dfs
+
+    Returns:
+        list: transaction dfs (dict) -> statement_date, file_type, df, ynab (the ynab df dict it came from)
+    """
+    _txn_dfs = []
+    for _ynab_df in results["ynab"]:
+        for _txn_df in clean_df_txn(df_param=_ynab_df["df"], statement_date=_ynab_df["statement_date"],
+                                    account=_ynab_df["account"]):
+            _write_debug(options, _txn_df["df"], f"{_txn_df['statement_date']}_transaction_{_txn_df['file_type']}.csv")
+            _txn_dfs.append({**_txn_df, "ynab": _ynab_df})
+    return _txn_dfs
+
+
+def stage_validation(results: dict, options: dict) -> pd.DataFrame:
+    """Validate transaction dfs against the balances of their account and the category dimension
+
+    Returns:
+        DataFrame: validation report, see validate_statements
+    """
+    extracts_path = options["extracts_path"]
+    _statements = []
+    _balance_indexes = {}
+    for _txn_df in results["transaction"]:
+        _adapter = get_account_adapter(_txn_df["file_type"])
+        if _adapter.reconciled and _adapter.name not in _balance_indexes:
+            _balance_indexes[_adapter.name] = get_account_balance_index(extracts_path, _adapter)
+        _statements.append({
+            "file_path": f"{_txn_df['statement_date']}_transaction_{_txn_df['file_type']}",
+            "statement_date": _txn_df["statement_date"],
+            "file_type": _txn_df["file_type"],
+            "df": _txn_df["df"],
+            "reconciled": _adapter.reconciled,
+            "balance_index": _balance_indexes.get(_adapter.name),
+        })
+    _df_report = validate_statements(_statements, category_keys=get_category_keys(), balance_index=None)
+
+    _failed = False
+    _review_files = {}
+    for _row, _txn_df in zip(_df_report.itertuples(), results["transaction"]):
+        if _row.error or not _row.amount_valid:
+            _logger.error(f"...{_row.file}: {_row.error or 'some amounts do not reconcile'}. "
+                          f"expected total {_row.expected_total}, actual total {_row.actual_total}")
+            _failed = True
+        elif not _row.category_valid:
+            _logger.error(f"...{_row.file}: missing categories: {', '.join(_row.missing_categories)}")
+            _ynab_df = _txn_df["ynab"]
+            _review_files[(_ynab_df["account"], _ynab_df["statement_date"])] = _ynab_df
+    if _failed:
+        _logger.error("...some statements do not reconcile. terminating\n")
+        exit(1)
+    if _review_files:
+        for _ynab_df in _review_files.values():
+            _file_path = _ynab_df["file_path"]
+            if _file_path is None:
+                _file_path = Path.joinpath(extracts_path, f"{_ynab_df['statement_date']}_ynab.csv")
+                write_df(df_in=_ynab_df["df"], path=str(_file_path), sep=",")
+            _logger.error(f"...please fill in categories in {_file_path}")
+        _logger.error("...some category values are not populated. terminating\n")
+        exit(1)
+    _logger.info(f"...{len(_df_report.index)} transaction dfs are valid")
+    return _df_report
+
+
+def _combine_account(statements: tuple, extracts_path: Path, full: bool) -> pd.DataFrame:
+    """Combine transaction dfs of one account with its fact table, statements is (account, sep dfs)"""
+    _account, _sep_dfs = statements
+    _df_combined, _ = combine_account_txn_dfs(account=_account, sep_dfs=_sep_dfs, extracts_path=extracts_path,
+                                              full=full)
+    return _df_combined
+
+
+def stage_facts(results: dict, options: dict) -> dict:
+    """Combine transaction dfs of each account with its fact table, accounts in parallel
+
+    Returns:
+        dict: fact table name -> combined fact df, for accounts with transaction dfs
+    """
+    _sep_dfs = {}
+    for _txn_df in results["transaction"]:
+        _name = f"{_txn_df['statement_date']}_transaction_{_txn_df['file_type']}"
+        _sep_dfs.setdefault(_txn_df["file_type"], []).append({"name": _name, "df": _txn_df["df"]})
+    _statements = [(_adapter.name, _sep_dfs[_adapter.name]) for _adapter in get_account_adapters()
+                   if _adapter.name in _sep_dfs]
+
+    _results = run_statements(func=partial(_combine_account, extracts_path=options["extracts_path"],
+                                           full=options["full_validation"]),
+                              items=_statements, workers=options["workers"])
+    for _result in _results:
+        if _result["error"]:
+            _result["error"] = f"{get_account_adapter(_result['item'][0]).label}: {_result['error']}"
+    _exit_on_errors(_results, "some accounts do not reconcile")
+    return {get_account_adapter(_result["item"][0]).fact_name: _result["result"] for _result in _results}
+
+
+def stage_powerbi_transaction(results: dict, options: dict) -> pd.DataFrame:
+    """Generate power bi transaction file from the combined fact dfs and the other fact tables"""
+    _facts_dir = Path.joinpath(options["extracts_path"], "facts")
+    _fact_dfs = dict(results["facts"])
+    for _file in get_files_list(file_path=_facts_dir, starts_with="transaction"):
+        if _file.stem not in _fact_dfs:
+            _fact_dfs[_file.stem] = read_fact(_file.stem, _facts_dir)
+    return generate_txn_file(fact_dfs={_name: _fact_dfs[_name] for _name in sorted(_fact_dfs)},
+                             df_category=results["dim_category"])
+
+
+def stage_aggregate_plan(results: dict, options: dict) -> dict:
+    """Find months whose transactions changed since the power bi aggregates were last built"""
+    min_year, max_year = get_year_range(results["powerbi_transaction"], max_year=options.get("max_year"))
+    return plan_aggregates(df_txn=results["powerbi_transaction"], min_year=min_year, max_year=max_year,
+                           full_rebuild=options.get("full_rebuild", False))
+
+
+def stage_rollup(results: dict, options: dict) -> dict:
+    """Generate transaction totals of every aggregate level in one pass over the transactions"""
+    return generate_rollup_files(df_txn=results["powerbi_transaction"], plan=results["aggregate_plan"])
+
+
+def stage_dim_category(results: dict, options: dict) -> pd.DataFrame:
+    return generate_category_file()
+
+
+def stage_dim_date(results: dict, options: dict) -> pd.DataFrame:
+    min_year, max_year = get_year_range(results["powerbi_transaction"], max_year=options.get("max_year"))
+    return generate_date_file(min_year=min_year, max_year=max_year)
+
+
+def stage_budget_values(results: dict, options: dict) -> pd.DataFrame:
+    min_year, max_year = get_year_range(results["powerbi_transaction"], max_year=options.get("max_year"))
+    return generate_budget_values(min_year=min_year, max_year=max_year, df_category=results["dim_category"])
+
+
+def stage_budget_combined(results: dict, options: dict) -> pd.DataFrame:
+    return generate_combined_budget(df_budget=results["budget_values"],
+                                    df_txn_monthly_total=results["rollup"]["monthly_total"])
+
+
+def stage_master(results: dict, options: dict) -> pd.DataFrame:
+    return generate_master_file(df_budget_combined=results["budget_combined"],
+                                df_txn_monthly_total=results["rollup"]["monthly_total"],
+                                df_date=results["dim_date"],
+                                df_category=results["dim_category"],
+                                plan=results["aggregate_plan"])
+
+
+def stage_aggregate_state(results: dict, options: dict):
+    """Record the transactions the power bi aggregates were built from"""
+    save_aggregate_plan(results["aggregate_plan"])
+
+
+# stage name -> (stages it depends on, stage function)
+STAGES = {
+    "processed": ([], stage_processed),
+    "ynab": (["processed"], stage_ynab),
+    "transaction": (["ynab"], stage_transaction),
+    "validation": (["transaction"], stage_validation),
+    "facts": (["transaction", "validation"], stage_facts),
+    "dim_category": ([], stage_dim_category),
+    "powerbi_transaction": (["facts", "dim_category"], stage_powerbi_transaction),
+    "aggregate_plan": (["powerbi_transaction"], stage_aggregate_plan),
+    "rollup": (["aggregate_plan"], stage_rollup),
+    "dim_date": (["powerbi_transaction"], stage_dim_date),
+    "budget_values": (["powerbi_transaction", "dim_category"], stage_budget_values),
+    "budget_combined": (["budget_values", "rollup"], stage_budget_combined),
+    "master": (["budget_combined", "rollup", "dim_date", "dim_category"], stage_master),
+    "aggregate_state": (["rollup", "master"], stage_aggregate_state),
+}
+
+
+def setup_args():
+    _parser.add_argument("-w", "--workers", type=int, default=1,
+                         help="number of statements and accounts processed in parallel")
+    _parser.add_argument("--start-date", default=None,
+                         help="first statement date to process, yyyy-mm-dd")
+    _parser.add_argument("--end-date", default=None,
+                         help="last statement date to process, yyyy-mm-dd")
+    _parser.add_argument("--full-validation", action="store_true",
+                         help="reconcile the whole transaction history rather than from the last checkpoint")
+    _parser.add_argument("--exact-money", action="store_true",
+                         help="hold amounts as integer pence, totals and reconciliation are exact")
+    _parser.add_argument("--debug-output", action="store_true",
+                         help="write intermediate files of each stage to the debug folder")
+    _parser.add_argument("--full-rebuild", action="store_true",
+                         help="rebuild power bi transaction totals and master file from the whole history")
+    _parser.add_argument("--max-year", type=int, default=None,
+                         help="last year of the date dimension and open-ended budgets, last year of transactions "
+                              "if not supplied")
+    _parser.add_argument("--until", default=None, choices=list(STAGES),
+                         help="last stage to run")
+
+
+def main(args_in: dict):
+    """Main entrypoint"""
+    if args_in.get("exact_money"):
+        set_exact_money(True)
+    options = {
+        "extracts_path": get_extracts_path(),
+        "workers": int(args_in.get("workers") or 1),
+        "start_date": args_in.get("start_date"),
+        "end_date": args_in.get("end_date"),
+        "full_validation": bool(args_in.get("full_validation")),
+        "debug_output": bool(args_in.get("debug_output")),
+        "max_year": args_in.get("max_year"),
+        "full_rebuild": bool(args_in.get("full_rebuild")),
+    }
+    run_stage_graph(STAGES, options=options, until=args_in.get("until"))
+
+
+_logger = logging.getLogger(__name__)
+setup_logging()
+_parser: Final = argparse.ArgumentParser(
+    description="Python utility to run the workflow from hsbc transaction exports to power bi files")
+setup_args()
+
+
+if __name__ == '__main__':
+    main(vars(_parser.parse_args()))
@@ -1,5 +1,25 @@
 from .scripts import get_json, setup_logging, get_balance, get_category, get_budget, write_df, get_files_list, \
-    validate_category, get_extracts_path, get_payee_mapping, get_category_mapping
+    validate_category, get_extracts_path, get_payee_mapping, get_category_mapping, get_payee_matcher, \
+    get_balance_index, get_category_keys
+from .payee_matcher import PayeeMatcher
+from .cache import load_cached, clear_dimension_cache
+from .balance_index import BalanceIndex, MissingStatementError
+from .parallel import StatementError, run_statements
+from .hsbc import read_hsbc_txn, HsbcParseError
+from .manifest import RunManifest
+from .fact_store import read_fact, read_fact_csv, write_fact, empty_fact, FACT_COLUMNS
+from .directory_index import DirectoryIndex, get_directory_index
+from .key_index import FactKeyIndex
+from .checkpoint import BalanceCheckpoint, hash_balances, hash_transactions
+from .reconcile import reconcile_statements, statement_detail, reconcile_periods, rank_candidates, localize_mismatch
+from .validation import build_category_keys, split_category, find_missing_categories, validate_statements
+from .money import set_exact_money, exact_money_enabled, money_dtype, to_money, to_pounds, round_money, \
+    normalise_zero, money_for_output, MONEY_COLUMNS, MissingAmountError
+from .accounts import AccountAdapter, get_account_adapter, get_account_adapters, ACCOUNT_ADAPTERS
+from .pipeline import run_stage_graph
+from .aggregates import AggregateState, month_fingerprints, hash_aggregate_inputs
+from .rollup import rollup_cube, rollup_level, rollup_levels
+from .category_key import CategoryKeyStore
 
 __all__ = [
     get_json,
@@ -12,5 +32,60 @@ __all__ = [
     get_files_list,
     validate_category,
     get_payee_mapping,
-    get_category_mapping
+    get_category_mapping,
+    get_payee_matcher,
+    PayeeMatcher,
+    load_cached,
+    clear_dimension_cache,
+    get_balance_index,
+    BalanceIndex,
+    MissingStatementError,
+    StatementError,
+    run_statements,
+    read_hsbc_txn,
+    HsbcParseError,
+    RunManifest,
+    read_fact,
+    read_fact_csv,
+    write_fact,
+    empty_fact,
+    FACT_COLUMNS,
+    DirectoryIndex,
+    get_directory_index,
+    FactKeyIndex,
+    BalanceCheckpoint,
+    hash_balances,
+    hash_transactions,
+    reconcile_statements,
+    statement_detail,
+    reconcile_periods,
+    rank_candidates,
+    localize_mismatch,
+    get_category_keys,
+    build_category_keys,
+    split_category,
+    find_missing_categories,
+    validate_statements,
+    set_exact_money,
+    exact_money_enabled,
+    money_dtype,
+    to_money,
+    to_pounds,
+    round_money,
+    normalise_zero,
+    money_for_output,
+    MONEY_COLUMNS,
+    MissingAmountError,
+    AccountAdapter,
+    get_account_adapter,
+    get_account_adapters,
+    ACCOUNT_ADAPTERS,
+    run_stage_graph,
+    AggregateState,
+    month_fingerprints,
+    hash_aggregate_inputs,
+    rollup_cube,
+    rollup_level,
+    rollup_levels,
+    CategoryKeyStore
 ]
@@ -0,0 +1,201 @@
+import logging
+import pandas as pd
+
+from .money import money_dtype, to_money
+from .validation import split_category
+
+_logger = logging.getLogger(__name__)
+
+CASH_PAYEE = "Transfer : Cash"
+
+
+class AccountAdapter:
+    """Turns ynab register exports of one account into transaction dfs
+
+    Every account is exported from ynab in the same register format (Date, Payee, Category, Memo, Outflow,
+    Inflow), as yyyy-mm-dd_ynab_<name>.csv. Its transactions are validated against balance_<name>.csv and
+    combined into the fact table transaction_<name>. Subclasses set the name and account label, and override
+    to_transactions for accounts whose exports feed another account, e.g. cash withdrawn with the debit card.
+    """
+
+    name = None
+    label = None
+    # statements reconcile with opening and closing balances, otherwise their total is nil
+    reconciled = True
+    # ynab register is exported for the account, derived accounts have none
+    exported = True
+
+    @property
+    def fact_name(self) -> str:
+        return f"transaction_{self.name}"
+
+    @property
+    def ynab_suffix(self) -> str:
+        return f"ynab_{self.name}"
+
+    @property
+    def balance_filename(self) -> str:
+        return f"balance_{self.name}.csv"
+
+    @property
+    def error_filename(self) -> str:
+        return f"transaction_error_{self.name}.csv"
+
+    @property
+    def file_types(self) -> list:
+        """Transaction file types produced from a ynab export of the account"""
+        return [self.name]
+
+    def clean(self, df_ynab: pd.DataFrame, categories: pd.Series = None) -> pd.DataFrame:
+        """Build transaction df from ynab df, the ynab df is not modified
+
+        Args:
+            df_ynab: (DataFrame) ynab register export
+            categories: (Series) ynab Category values to use instead of the Category column
+
+        Returns:
+            DataFrame: transaction df
+        """
+        _outflow = to_money(df_ynab['Outflow'].astype(float).fillna(0))
+        _inflow = to_money(df_ynab['Inflow'].astype(float).fillna(0))
+        _master_category, _subcategory = split_category(df_ynab['Category'] if categories is None else categories)
+        return pd.DataFrame({
+            'account': self.label,
+            'transaction_date': pd.to_datetime(df_ynab['Date'], dayfirst=True),
+            'payee': df_ynab['Payee'],
+            'master_category': _master_category,
+            'subcategory': _subcategory,
+            'memo': df_ynab['Memo'],
+            'amount': (_inflow - _outflow).astype(money_dtype()),
+        })
+
+    def to_transactions(self, df_ynab: pd.DataFrame, statement_date: str) -> list:
+        """Generate transaction dfs of a statement
+
+        Args:
+            df_ynab: (DataFrame) ynab register export
+            statement_date: (str) statement date in yyyy-mm-dd format
+
+        Returns:
+            list: transaction dfs (dict) -> statement_date, file_type, df
+        """
+        return [{"statement_date": statement_date, "file_type": self.name, "df": self.clean(df_ynab)}]
+
+
+class HsbcDcAdapter(AccountAdapter):
+    """HSBC debit card, cash withdrawals are also booked to the cash account
+
+    Exports and balances keep their original names, yyyy-mm-dd_ynab.csv and balance.csv.
+    """
+
+    name = "hsbc_dc"
+    label = "HSBC DC"
+
+    @property
+    def ynab_suffix(self) -> str:
+        return "ynab"
+
+    @property
+    def balance_filename(self) -> str:
+        return "balance.csv"
+
+    @property
+    def error_filename(self) -> str:
+        return "transaction_error.csv"
+
+    @property
+    def file_types(self) -> list:
+        return [self.name, CashAdapter.name]
+
+    def to_transactions(self, df_ynab: pd.DataFrame, statement_date: str) -> list:
+        _is_cash = df_ynab['Payee'] == CASH_PAYEE
+        df_txn = self.clean(df_ynab, categories=df_ynab['Category'].mask(_is_cash, 'Transfer-out: Cash'))
+        transaction_files = [{"statement_date": statement_date, "file_type": self.name, "df": df_txn}]
+
+        # each withdrawal is paid into cash and spent from it
+        df_cash = df_txn.loc[_is_cash]
+        if not df_cash.empty:
+            df_cash_credit = df_cash.assign(account=CashAdapter.label,
+                                            amount=df_cash['amount'] * -1,
+                                            payee='Transfer : HSBC DC',
+                                            master_category='Transfer-in',
+                                            subcategory='HSBC DC')
+            df_cash_debit = df_cash.assign(account=CashAdapter.label,
+                                           payee='Misc',
+                                           master_category='Monthly',
+                                           subcategory='Discretionary')
+            df_cash = pd.concat([df_cash_credit, df_cash_debit])
+            df_cash = df_cash.sort_values(by=['transaction_date', 'amount'], kind='mergesort')
+            transaction_files.append({"statement_date": statement_date, "file_type": CashAdapter.name, "df": df_cash})
+        return transaction_files
+
+
+class CashAdapter(AccountAdapter):
+    """Cash, derived from withdrawals on the debit card, every statement nets to nil"""
+
+    name = "cash"
+    label = "Cash"
+    reconciled = False
+    exported = False
+
+
+class HsbcCcAdapter(AccountAdapter):
+    name = "hsbc_cc"
+    label = "HSBC CC"
+
+
+class HsbcSavingsAdapter(AccountAdapter):
+    name = "hsbc_savings"
+    label = "HSBC Savings"
+
+
+class IsaAdapter(AccountAdapter):
+    name = "isa"
+    label = "ISA"
+
+
+class SippAdapter(AccountAdapter):
+    name = "sipp"
+    label = "SIPP"
+
+
+class TradingAdapter(AccountAdapter):
+    name = "trading"
+    label = "Trading"
+
+
+ACCOUNT_ADAPTERS = {_adapter.name: _adapter for _adapter in [
+    HsbcDcAdapter(), CashAdapter(), HsbcCcAdapter(), HsbcSavingsAdapter(), IsaAdapter(), SippAdapter(),
+    TradingAdapter(),
+]}
+
+
+def get_account_adapter(name: str) -> AccountAdapter:
+    """Return adapter of an account
+
+    Args:
+        name: (str) account name e.g. hsbc_dc, or its fact table name e.g. transaction_hsbc_dc
+
+    Returns:
+        AccountAdapter: account adapter
+
+    Raises:
+        KeyError: unknown account
+    """
+    _name = name[len("transaction_"):] if name.startswith("transaction_") else name
+    try:
+        return ACCOUNT_ADAPTERS[_name]
+    except KeyError:
+        raise KeyError(f"unknown account {name}, expected one of {', '.join(ACCOUNT_ADAPTERS)}") from None
+
+
+def get_account_adapters(exported: bool = None) -> list:
+    """Return adapters of all accounts
+
+    Args:
+        exported: (bool) True - only accounts with their own ynab export, False - only derived accounts
+
+    Returns:
+        list: account adapters, the debit card first
+    """
+    return [_adapter for _adapter in ACCOUNT_ADAPTERS.values() if exported is None or _adapter.exported == exported]
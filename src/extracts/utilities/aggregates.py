@@ -0,0 +1,120 @@
+import hashlib
+import logging
+import pandas as pd
+
+from datetime import datetime
+from pathlib import Path
+
+from .manifest import ManifestStore
+from .money import to_pounds, normalise_zero
+
+_logger = logging.getLogger(__name__)
+
+
+def month_fingerprints(df_txn: pd.DataFrame) -> pd.Series:
+    """Return a fingerprint of the transactions of each month, as far as the power bi aggregates see them
+
+    Rows are hashed on every column the aggregates group on, and the hashes of a month are summed, so the
+    fingerprint does not depend on row order and changes with any change the aggregates can show.
+
+    Args:
+        df_txn: (DataFrame) combined transaction df with account, master_category, category, year_month and amount
+
+    Returns:
+        Series: year_month -> fingerprint (str)
+    """
+    if df_txn.empty:
+        return pd.Series(dtype=object)
+    _df = pd.DataFrame({
+        "account": df_txn["account"].astype(str),
+        "master_category": df_txn["master_category"].astype(str),
+        "category": df_txn["category"].astype(str),
+        "year_month": df_txn["year_month"].astype("int64"),
+        "amount": normalise_zero(to_pounds(df_txn["amount"]).astype("float64").round(2)),
+    })
+    _hashes = pd.util.hash_pandas_object(_df, index=False)
+    _group = _hashes.groupby(df_txn["year_month"].astype("int64").to_numpy())
+    # uint64 sums wrap around
+    _sums = _group.sum()
+    _counts = _group.size()
+    return pd.Series([f"{int(_count)}:{int(_sum):016x}" for _count, _sum in zip(_counts, _sums)],
+                     index=_sums.index, dtype=object)
+
+
+def hash_aggregate_inputs(file_paths: list, *values) -> str:
+    """Return hash of the dimension files and settings the power bi aggregates are built with
+
+    Args:
+        file_paths: (list) dimension files e.g. budget.csv, category.csv, missing files hash as empty
+        values: settings e.g. first and last year
+
+    Returns:
+        str: hex digest
+    """
+    _hash = hashlib.sha256()
+    for _file_path in file_paths:
+        _hash.update(Path(_file_path).read_bytes() if Path(_file_path).is_file() else b"")
+        _hash.update(b"\x1f")
+    _hash.update("\x1f".join(str(_value) for _value in values).encode("utf-8"))
+    return _hash.hexdigest()
+
+
+class AggregateState(ManifestStore):
+    """Month fingerprints of the transactions the power bi aggregates were last built from, stored in the manifest
+
+    Months whose fingerprint differs from the current transactions are the only months whose monthly totals
+    need recomputing. When the dimension files or settings the aggregates depend on change, everything is
+    rebuilt.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS aggregate_state (
+            name TEXT PRIMARY KEY,
+            input_hash TEXT NOT NULL,
+            updated TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS aggregate_month (
+            year_month INTEGER PRIMARY KEY,
+            fingerprint TEXT NOT NULL
+        );
+    """
+
+    def touched_months(self, fingerprints: pd.Series, input_hash: str) -> list:
+        """Return months whose transactions changed since the aggregates were built
+
+        Args:
+            fingerprints: (Series) year_month -> fingerprint of the current transactions, see month_fingerprints
+            input_hash: (str) hash of the current dimension files and settings, see hash_aggregate_inputs
+
+        Returns:
+            list: sorted year_months added, changed or removed, None if the aggregates need a full rebuild
+        """
+        _row = self._connection.execute(
+            "SELECT input_hash FROM aggregate_state WHERE name = 'powerbi'").fetchone()
+        if _row is None or _row[0] != input_hash:
+            return None
+        _stored = dict(self._connection.execute("SELECT year_month, fingerprint FROM aggregate_month").fetchall())
+        _current = {int(_month): _fingerprint for _month, _fingerprint in fingerprints.items()}
+        return sorted(_month for _month in set(_stored) | set(_current) if _stored.get(_month) != _current.get(_month))
+
+    def save(self, fingerprints: pd.Series, input_hash: str):
+        """Save month fingerprints and input hash of the aggregates just built
+
+        Args:
+            fingerprints: (Series) year_month -> fingerprint, see month_fingerprints
+            input_hash: (str) hash of dimension files and settings, see hash_aggregate_inputs
+        """
+        with self._connection:
+            self._connection.execute("DELETE FROM aggregate_month")
+            self._connection.executemany(
+                "INSERT INTO aggregate_month (year_month, fingerprint) VALUES (?, ?)",
+                ((int(_month), _fingerprint) for _month, _fingerprint in fingerprints.items()))
+            self._connection.execute(
+                "INSERT OR REPLACE INTO aggregate_state (name, input_hash, updated) VALUES ('powerbi', ?, ?)",
+                (input_hash, datetime.now().isoformat(timespec="seconds")))
+
+    def clear(self):
+        """Remove the state, the next run rebuilds every aggregate"""
+        with self._connection:
+            self._connection.execute("DELETE FROM aggregate_state")
+            self._connection.execute("DELETE FROM aggregate_month")
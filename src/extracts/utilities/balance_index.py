@@ -0,0 +1,92 @@
+import logging
+import pandas as pd
+
+from bisect import bisect_left, bisect_right
+
+_logger = logging.getLogger(__name__)
+
+
+class MissingStatementError(LookupError):
+    """Raised when a statement date is not present in balance.csv"""
+
+
+def _to_date_key(value) -> str:
+    """Return date as yyyy-mm-dd string, the format used for statement dates in file names"""
+    if isinstance(value, str):
+        return value[:10]
+    return pd.Timestamp(value).strftime("%Y-%m-%d")
+
+
+class BalanceIndex:
+    """Opening and closing balances indexed by statement date
+
+    Lookups by statement date are dict lookups, range queries are binary searches over the sorted dates.
+    Dates can be supplied as yyyy-mm-dd strings, dates, datetimes or timestamps.
+    """
+
+    def __init__(self, df_balance: pd.DataFrame) -> None:
+        """
+        Args:
+            df_balance: (DataFrame) balance dataframe -> statement_date, opening_balance, closing_balance
+        """
+        self._balances = {}
+        _rows = zip(df_balance["statement_date"], df_balance["opening_balance"], df_balance["closing_balance"])
+        for _statement_date, _opening, _closing in _rows:
+            # first row wins when a statement date is repeated
+            self._balances.setdefault(_to_date_key(_statement_date), (_opening, _closing))
+        self._statement_dates = sorted(self._balances.keys())
+
+    def __contains__(self, statement_date) -> bool:
+        return _to_date_key(statement_date) in self._balances
+
+    def __len__(self) -> int:
+        return len(self._statement_dates)
+
+    @property
+    def statement_dates(self) -> list:
+        """Sorted statement dates as yyyy-mm-dd strings"""
+        return list(self._statement_dates)
+
+    def get(self, statement_date) -> (float, float):
+        """Return opening and closing balance of a statement
+
+        Args:
+            statement_date: statement date
+
+        Returns:
+            tuple: (opening balance, closing balance)
+
+        Raises:
+            MissingStatementError: statement date is not in balance.csv
+        """
+        _key = _to_date_key(statement_date)
+        try:
+            return self._balances[_key]
+        except KeyError:
+            raise MissingStatementError(f"statement date {_key} not found in balance.csv") from None
+
+    def opening(self, statement_date) -> float:
+        return self.get(statement_date)[0]
+
+    def closing(self, statement_date) -> float:
+        return self.get(statement_date)[1]
+
+    def first_on_or_after(self, value):
+        """Return first statement date on or after the supplied date, None if there is none"""
+        _position = bisect_left(self._statement_dates, _to_date_key(value))
+        if _position < len(self._statement_dates):
+            return self._statement_dates[_position]
+        return None
+
+    def last_on_or_before(self, value):
+        """Return last statement date on or before the supplied date, None if there is none"""
+        _position = bisect_right(self._statement_dates, _to_date_key(value))
+        if _position > 0:
+            return self._statement_dates[_position - 1]
+        return None
+
+    def between(self, start=None, end=None) -> list:
+        """Return statement dates within start and end, both inclusive and optional"""
+        _start = 0 if start is None else bisect_left(self._statement_dates, _to_date_key(start))
+        _end = len(self._statement_dates) if end is None else bisect_right(self._statement_dates, _to_date_key(end))
+        return self._statement_dates[_start:_end]
@@ -0,0 +1,56 @@
+import logging
+import os
+
+from pathlib import Path
+
+_logger = logging.getLogger(__name__)
+
+_dimension_cache = {}
+
+
+def _get_signature(paths: tuple) -> tuple:
+    """Return (mtime, size) of each path, changes whenever one of the files is rewritten"""
+    _signature = []
+    for _path in paths:
+        _stat = os.stat(_path)
+        _signature.append((_stat.st_mtime_ns, _stat.st_size))
+    return tuple(_signature)
+
+
+def load_cached(name: str, paths: list, loader):
+    """Load a dimension through the process-wide cache
+
+    The cache is keyed on name and file paths. An entry is reused while the modification time and size of
+    every file are unchanged, otherwise the loader is called again and the entry is replaced.
+    Cached values are shared between callers and must be treated as read-only.
+
+    Args:
+        name: (str) name of the dimension e.g. balance, category
+        paths: (list) files the dimension is loaded from
+        loader: (callable) function called with the paths to load the dimension
+
+    Returns:
+        object: loaded dimension
+    """
+    _paths = tuple(str(Path(_path)) for _path in paths)
+    _key = (name, _paths)
+    _signature = _get_signature(_paths)
+    _entry = _dimension_cache.get(_key)
+    if _entry is not None and _entry[0] == _signature:
+        return _entry[1]
+
+    _logger.debug(f"loading dimension {name} from {', '.join(_paths)}")
+    _value = loader(*_paths)
+    _dimension_cache[_key] = (_signature, _value)
+    return _value
+
+
+def clear_dimension_cache(name: str = None):
+    """Clear cached dimensions
+
+    Args:
+        name: (str) name of the dimension to clear, all dimensions if not supplied
+    """
+    for _key in list(_dimension_cache.keys()):
+        if name is None or _key[0] == name:
+            del _dimension_cache[_key]
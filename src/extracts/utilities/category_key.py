@@ -0,0 +1,46 @@
+import logging
+
+from datetime import datetime
+
+from .manifest import ManifestStore
+
+_logger = logging.getLogger(__name__)
+
+
+class CategoryKeyStore(ManifestStore):
+    """Integer keys of categories, stored in the manifest
+
+    A category keeps the key it was first given whatever its row in category.csv, so keys in the power bi
+    files stay the same when categories are inserted, reordered or removed. Categories seen for the first time
+    get the next keys, keys of removed categories are not reused.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS category_key (
+            category TEXT PRIMARY KEY,
+            category_key INTEGER NOT NULL UNIQUE,
+            added TEXT NOT NULL
+        );
+    """
+
+    def assign(self, categories: list) -> list:
+        """Return key of each category, adding keys for categories seen for the first time in the order given
+
+        Args:
+            categories: (list) distinct category labels
+
+        Returns:
+            list: key (int) of each category, in the order given
+        """
+        _keys = dict(self._connection.execute("SELECT category, category_key FROM category_key").fetchall())
+        _new = [_category for _category in categories if _category not in _keys]
+        if _new:
+            _next = max(_keys.values(), default=0) + 1
+            _keys.update({_category: _next + _position for _position, _category in enumerate(_new)})
+            _added = datetime.now().isoformat(timespec="seconds")
+            _logger.info(f"...adding keys of {len(_new)} new categories")
+            with self._connection:
+                self._connection.executemany(
+                    "INSERT INTO category_key (category, category_key, added) VALUES (?, ?, ?)",
+                    ((_category, _keys[_category], _added) for _category in _new))
+        return [_keys[_category] for _category in categories]
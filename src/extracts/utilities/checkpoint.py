@@ -0,0 +1,134 @@
+import hashlib
+import logging
+import numpy as np
+import pandas as pd
+
+from datetime import datetime
+from pathlib import Path
+
+from .manifest import ManifestStore
+from .money import to_pounds
+
+_logger = logging.getLogger(__name__)
+
+
+def hash_balances(df_balance: pd.DataFrame, statement_date) -> str:
+    """Return hash of statement balances up to and including statement_date
+
+    Args:
+        df_balance: (DataFrame) balances df
+        statement_date: (datetime) last statement date to include
+
+    Returns:
+        str: hex digest
+    """
+    _df = df_balance.loc[df_balance["statement_date"] <= statement_date,
+                         ["statement_date", "opening_balance", "closing_balance"]]
+    return hashlib.sha256(_df.to_csv(index=False).encode("utf-8")).hexdigest()
+
+
+def hash_transactions(df_txn: pd.DataFrame, statement_date) -> str:
+    """Return hash of the dates and amounts of transactions up to and including statement_date
+
+    Rows are sorted before hashing, so the hash does not depend on row order but changes when a transaction
+    moves to another date or amounts change, even when the number and total of transactions are unchanged.
+
+    Args:
+        df_txn: (DataFrame) transaction df
+        statement_date: (datetime) last transaction date to include
+
+    Returns:
+        str: hex digest
+    """
+    _dates = pd.to_datetime(df_txn["transaction_date"])
+    _before = (_dates <= statement_date).to_numpy()
+    _days = _dates.to_numpy()[_before].astype("datetime64[D]").astype("int64")
+    _pence = np.round(np.asarray(to_pounds(df_txn["amount"]), dtype="float64")[_before] * 100).astype("int64")
+    _order = np.lexsort((_pence, _days))
+    _hash = hashlib.sha256(_days[_order].tobytes())
+    _hash.update(_pence[_order].tobytes())
+    return _hash.hexdigest()
+
+
+class BalanceCheckpoint(ManifestStore):
+    """Last statement of an account whose closing balance was reconciled, stored in the manifest
+
+    A checkpoint holds the statement date, the running balance at the end of that date, the number of
+    transactions up to it, a hash of their dates and amounts, and a hash of the balances of all statements up
+    to it. While the transactions and balances up to the statement date are unchanged, only later transactions
+    need reconciling.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS balance_checkpoint (
+            account TEXT PRIMARY KEY,
+            statement_date TEXT NOT NULL,
+            balance REAL NOT NULL,
+            rows INTEGER NOT NULL,
+            balance_hash TEXT NOT NULL,
+            updated TEXT NOT NULL,
+            txn_hash TEXT NOT NULL DEFAULT ''
+        );
+    """
+
+    def __init__(self, extracts_path: Path) -> None:
+        """
+        Args:
+            extracts_path: (Path) extracts directory, checkpoints are stored in its manifest
+        """
+        super().__init__(extracts_path)
+        _columns = [_row[1] for _row in self._connection.execute("PRAGMA table_info(balance_checkpoint)")]
+        if "txn_hash" not in _columns:
+            # checkpoints saved before transactions were hashed never match, the next run reconciles in full
+            with self._connection:
+                self._connection.execute(
+                    "ALTER TABLE balance_checkpoint ADD COLUMN txn_hash TEXT NOT NULL DEFAULT ''")
+
+    def get(self, account: str) -> dict:
+        """Return checkpoint of an account
+
+        Args:
+            account: (str) account e.g. transaction_hsbc_dc
+
+        Returns:
+            dict: statement_date (datetime), balance, rows, balance_hash, txn_hash, None if there is no checkpoint
+        """
+        _row = self._connection.execute(
+            "SELECT statement_date, balance, rows, balance_hash, txn_hash FROM balance_checkpoint WHERE account = ?",
+            (account,)).fetchone()
+        if _row is None:
+            return None
+        return {
+            "statement_date": pd.Timestamp(_row[0]),
+            "balance": _row[1],
+            "rows": _row[2],
+            "balance_hash": _row[3],
+            "txn_hash": _row[4],
+        }
+
+    def save(self, account: str, statement_date, balance: float, rows: int, balance_hash: str, txn_hash: str):
+        """Save checkpoint of an account
+
+        Args:
+            account: (str) account e.g. transaction_hsbc_dc
+            statement_date: (datetime) last reconciled statement date
+            balance: (float) running balance at the end of statement_date
+            rows: (int) number of transactions up to and including statement_date
+            balance_hash: (str) hash of balances up to and including statement_date
+            txn_hash: (str) hash of transactions up to and including statement_date, see hash_transactions
+        """
+        with self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO balance_checkpoint "
+                "(account, statement_date, balance, rows, balance_hash, updated, txn_hash) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (account, pd.Timestamp(statement_date).strftime("%Y-%m-%d"), round(float(balance), 2), int(rows),
+                 balance_hash, datetime.now().isoformat(timespec="seconds"), txn_hash))
+
+    def clear(self, account: str = None):
+        """Remove checkpoint of an account, all checkpoints if not supplied"""
+        with self._connection:
+            if account is None:
+                self._connection.execute("DELETE FROM balance_checkpoint")
+            else:
+                self._connection.execute("DELETE FROM balance_checkpoint WHERE account = ?", (account,))
@@ -10,6 +10,18 @@ DATE_FORMAT = "%Y%m%d"
 DATE = datetime.now().strftime("%Y%m%d_%H%M%S")
 EXTRACTS_PATH = Path("D:/MyDocuments/ynab-files/extracts")
 
+"""
+Bank export formats
+"""
+
+HSBC_DATE_FORMAT = "%d/%m/%Y"
+
+"""
+Fact table storage: csv, or parquet/feather (requires pyarrow) kept alongside the csv files
+"""
+
+FACT_STORE_FORMAT = "csv"
+
 """
 Application configuration folders
 """
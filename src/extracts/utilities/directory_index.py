@@ -0,0 +1,132 @@
+import logging
+import os
+import re
+import time
+
+from bisect import bisect_left, bisect_right
+from datetime import datetime
+from pathlib import Path
+
+_logger = logging.getLogger(__name__)
+
+STATEMENT_FILE_PATTERN = re.compile(r"^(\d{4}-\d{2}-\d{2})_(.+)$")
+
+# directory modification times are only trusted once they are older than this, on file systems with coarse
+# timestamps a file created in the same tick as the scan would otherwise go unnoticed
+_RACY_WINDOW_NS = 2_000_000_000
+
+_directory_indexes = {}
+
+
+class DirectoryIndex:
+    """Files of a directory with a given extension, scanned once
+
+    Statement files, named yyyy-mm-dd_<suffix>.<extension>, are grouped by lower case suffix and kept
+    sorted by statement date, so a suffix and date range lookup does not touch the file system. Extensions
+    match in any case e.g. .CSV, as they do on Windows.
+    """
+
+    def __init__(self, directory: Path, extension: str = "csv") -> None:
+        """
+        Args:
+            directory: (Path) directory to scan
+            extension: (str) extension of the files to index
+        """
+        self.directory = Path(directory)
+        self.extension = extension
+        self.scanned_ns = time.time_ns()
+        self.mtime_ns = os.stat(self.directory).st_mtime_ns
+        self.files = []
+        self._statements = {}
+
+        _extension = f".{extension.lower()}"
+        _valid_dates = {}
+        with os.scandir(self.directory) as _entries:
+            for _entry in _entries:
+                if not _entry.name.lower().endswith(_extension) or not _entry.is_file():
+                    continue
+                _file = Path.joinpath(self.directory, _entry.name)
+                self.files.append(_file)
+                _match = STATEMENT_FILE_PATTERN.match(_file.stem)
+                if not _match:
+                    continue
+                _date, _suffix = _match.groups()
+                if _date not in _valid_dates:
+                    _valid_dates[_date] = _is_valid_date(_date)
+                if not _valid_dates[_date]:
+                    _logger.debug(f"file {_file.stem} is not a valid file")
+                    continue
+                self._statements.setdefault(_suffix.lower(), []).append((_date, _file))
+
+        self.files.sort()
+        for _suffix, _statements in self._statements.items():
+            _statements.sort()
+            self._statements[_suffix] = ([_date for _date, _ in _statements], [_file for _, _file in _statements])
+
+    @property
+    def suffixes(self) -> list:
+        return sorted(self._statements.keys())
+
+    def is_current(self) -> bool:
+        """Check if the directory is unchanged since it was scanned"""
+        try:
+            _mtime_ns = os.stat(self.directory).st_mtime_ns
+        except FileNotFoundError:
+            return False
+        return _mtime_ns == self.mtime_ns and _mtime_ns < self.scanned_ns - _RACY_WINDOW_NS
+
+    def statement_files(self, suffix: list, start_date: str = None, end_date: str = None) -> list:
+        """Return statement files with one of the suffixes, ordered by statement date
+
+        Args:
+            suffix: (list) type of file e.g. [ynab], [transaction_hsbc_dc]
+            start_date: (str) first statement date in yyyy-mm-dd format, inclusive
+            end_date: (str) last statement date in yyyy-mm-dd format, inclusive
+
+        Returns:
+            list: list of files -> pathlib path
+        """
+        _files = []
+        for _suffix in set(_item.lower() for _item in suffix):
+            _dates, _suffix_files = self._statements.get(_suffix, ([], []))
+            _start = bisect_left(_dates, start_date) if start_date else 0
+            _end = bisect_right(_dates, end_date) if end_date else len(_dates)
+            _files.extend(zip(_dates[_start:_end], _suffix_files[_start:_end]))
+        return [_file for _, _file in sorted(_files)]
+
+    def files_starting_with(self, starts_with: str = "") -> list:
+        """Return files whose name starts with a prefix, ordered by name
+
+        Args:
+            starts_with: (str) file name prefix, all files if empty
+
+        Returns:
+            list: list of files -> pathlib path
+        """
+        return [_file for _file in self.files if _file.stem.startswith(starts_with)]
+
+
+def _is_valid_date(date: str) -> bool:
+    try:
+        datetime.strptime(date, "%Y-%m-%d")
+        return True
+    except ValueError:
+        return False
+
+
+def get_directory_index(directory: Path, extension: str = "csv") -> DirectoryIndex:
+    """Return index of a directory, rescanned only when files were added, removed or renamed since
+
+    Args:
+        directory: (Path) directory to index
+        extension: (str) extension of the files to index
+
+    Returns:
+        DirectoryIndex: index of the directory
+    """
+    _key = (str(Path(directory).resolve()), extension)
+    _index = _directory_indexes.get(_key)
+    if _index is None or not _index.is_current():
+        _index = DirectoryIndex(directory, extension=extension)
+        _directory_indexes[_key] = _index
+    return _index
@@ -0,0 +1,155 @@
+import logging
+import os
+import pandas as pd
+
+from pathlib import Path
+
+from .constants import FACT_STORE_FORMAT
+from .money import money_dtype, to_money, money_for_output, MissingAmountError
+
+try:
+    import pyarrow.feather as feather
+    import pyarrow.parquet as parquet
+except ImportError:
+    feather = None
+    parquet = None
+
+_logger = logging.getLogger(__name__)
+
+FACT_COLUMNS = ["account", "transaction_date", "payee", "master_category", "subcategory", "memo", "amount"]
+FACT_DTYPES = {
+    "account": str,
+    "payee": str,
+    "master_category": str,
+    "subcategory": str,
+    "memo": str,
+    "amount": "float64",
+}
+FACT_DATE_COLUMNS = ["transaction_date"]
+COLUMNAR_FORMATS = {"parquet": ".parquet", "feather": ".feather"}
+
+
+def read_fact_csv(file_path, columns: list = None) -> pd.DataFrame:
+    """Read transaction csv file with declared dtypes
+
+    Args:
+        file_path: (Path) transaction csv file
+        columns: (list) columns to read, all if not supplied
+
+    Returns:
+        DataFrame: typed transaction df, amount in pence in exact money mode
+
+    Raises:
+        MissingAmountError: some amounts are blank in exact money mode, reports their rows and the file
+    """
+    _date_columns = [_column for _column in FACT_DATE_COLUMNS if columns is None or _column in columns]
+    _df = pd.read_csv(str(file_path), sep=",", usecols=columns, dtype=FACT_DTYPES, parse_dates=_date_columns)
+    try:
+        return _to_money(_df)
+    except MissingAmountError as ex:
+        raise MissingAmountError(ex.labels, source=file_path) from None
+
+
+def empty_fact() -> pd.DataFrame:
+    """Return fact df without rows, typed like a fact df read by read_fact_csv
+
+    Returns:
+        DataFrame: empty fact df
+    """
+    _dtypes = {**FACT_DTYPES, "transaction_date": "datetime64[ns]", "amount": money_dtype()}
+    return pd.DataFrame({_column: pd.Series(dtype=_dtypes[_column]) for _column in FACT_COLUMNS})
+
+
+def _to_money(df_in: pd.DataFrame) -> pd.DataFrame:
+    if "amount" in df_in.columns:
+        df_in["amount"] = to_money(df_in["amount"])
+    return df_in
+
+
+def _get_columnar_format(file_format: str):
+    if file_format not in COLUMNAR_FORMATS:
+        return None
+    if parquet is None:
+        _logger.warning(f"...pyarrow is not installed, {file_format} fact store disabled")
+        return None
+    return file_format
+
+
+def _read_columnar(file_path: Path, file_format: str, columns: list = None) -> pd.DataFrame:
+    if file_format == "parquet":
+        _table = parquet.read_table(str(file_path), columns=columns, memory_map=True)
+    else:
+        _table = feather.read_table(str(file_path), columns=columns, memory_map=True)
+    return _table.to_pandas()
+
+
+def _write_columnar(df_in: pd.DataFrame, file_path: Path, file_format: str, csv_path: Path):
+    if file_format == "parquet":
+        df_in.to_parquet(str(file_path), index=False)
+    else:
+        df_in.reset_index(drop=True).to_feather(str(file_path))
+    # stamp with the modification time of the csv it mirrors, any other time means the csv was replaced
+    _csv_stat = csv_path.stat()
+    os.utime(str(file_path), ns=(_csv_stat.st_atime_ns, _csv_stat.st_mtime_ns))
+
+
+def _is_stale(columnar_path: Path, csv_path: Path) -> bool:
+    if not columnar_path.is_file():
+        return True
+    return csv_path.is_file() and csv_path.stat().st_mtime_ns != columnar_path.stat().st_mtime_ns
+
+
+def read_fact(fact_name: str, facts_dir: Path, columns: list = None,
+              file_format: str = FACT_STORE_FORMAT) -> pd.DataFrame:
+    """Read fact table e.g. transaction_hsbc_dc
+
+    The csv file in the facts folder is the source of truth. With a columnar file format the fact table is
+    also kept as <fact_name>.parquet/.feather next to it: it is read memory-mapped and only the requested
+    columns are loaded. The columnar copy carries the modification time of the csv it was built from and is
+    rebuilt whenever the csv is replaced or edited.
+
+    Args:
+        fact_name: (str) fact table name, the csv file stem
+        facts_dir: (Path) facts folder
+        columns: (list) columns to read, all if not supplied
+        file_format: (str) csv, parquet or feather
+
+    Returns:
+        DataFrame: typed fact df
+    """
+    _csv_path = Path.joinpath(facts_dir, f"{fact_name}.csv")
+    _format = _get_columnar_format(file_format)
+    if _format is None:
+        return read_fact_csv(_csv_path, columns=columns)
+
+    _columnar_path = Path.joinpath(facts_dir, f"{fact_name}{COLUMNAR_FORMATS[_format]}")
+    if _is_stale(_columnar_path, _csv_path):
+        _logger.info(f"...refreshing {_columnar_path.name} from {_csv_path.name}")
+        _df = read_fact_csv(_csv_path)
+        _write_columnar(money_for_output(_df), _columnar_path, _format, csv_path=_csv_path)
+        return _df[columns] if columns else _df
+    return _to_money(_read_columnar(_columnar_path, _format, columns=columns))
+
+
+def write_fact(df_in: pd.DataFrame, file_path: Path, file_format: str = FACT_STORE_FORMAT) -> bool:
+    """Write fact table as csv, plus columnar copy when enabled
+
+    Args:
+        df_in: (DataFrame) fact df
+        file_path: (Path) csv file path
+        file_format: (str) csv, parquet or feather
+
+    Returns:
+        bool: confirmation if operation is successful
+    """
+    try:
+        _csv_path = Path(file_path)
+        _df = money_for_output(df_in)
+        _df.to_csv(str(_csv_path), index=False, sep=",")
+        _format = _get_columnar_format(file_format)
+        if _format is not None:
+            _write_columnar(_df, _csv_path.with_suffix(COLUMNAR_FORMATS[_format]), _format, csv_path=_csv_path)
+        return True
+    except FileNotFoundError as ex:
+        _logger.error(f"...folder path not found: {ex}")
+        return False
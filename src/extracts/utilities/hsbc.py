@@ -0,0 +1,92 @@
+import logging
+import pandas as pd
+
+from .constants import HSBC_DATE_FORMAT
+from .money import to_money
+
+_logger = logging.getLogger(__name__)
+
+HSBC_COLUMNS = ["date", "payee", "amount"]
+
+
+class HsbcParseError(ValueError):
+    """Raised when rows of an hsbc txn export cannot be parsed"""
+
+    def __init__(self, file_path, line_numbers: list) -> None:
+        self.file_path = file_path
+        self.line_numbers = line_numbers
+        _lines = ", ".join(str(_line_number) for _line_number in line_numbers[:10])
+        if len(line_numbers) > 10:
+            _lines += f" and {len(line_numbers) - 10} more"
+        super().__init__(f"malformed rows in {file_path}, line(s): {_lines}")
+
+
+def _parse_dates(dates: pd.Series, date_format: str) -> pd.Series:
+    """Parse each distinct date string once, statements repeat the same few dates on many rows"""
+    _codes, _uniques = pd.factorize(dates)
+    _parsed = pd.to_datetime(pd.Index(_uniques, dtype=object), format=date_format, errors="coerce")
+    _parsed = _parsed.take(_codes, allow_fill=True, fill_value=pd.NaT)
+    return pd.Series(_parsed, index=dates.index)
+
+
+def _parse_chunk(df_chunk: pd.DataFrame, file_path, first_line: int, date_format: str) -> pd.DataFrame:
+    """Type a chunk of raw rows, raise HsbcParseError with line numbers of malformed rows"""
+    # blank lines are kept by the reader so that row positions map onto line numbers
+    _line_numbers = pd.RangeIndex(first_line, first_line + len(df_chunk.index))
+    _blank = (df_chunk["date"].isna() & df_chunk["payee"].isna() & df_chunk["amount"].isna()).to_numpy()
+
+    _dates = _parse_dates(df_chunk["date"], date_format=date_format)
+    _amounts = df_chunk["amount"]
+    if _amounts.dtype == object:
+        # the reader falls back to strings when any amount is not numeric
+        _amounts = pd.to_numeric(_amounts.str.replace(",", "", regex=False), errors="coerce")
+
+    _malformed = (_dates.isna().to_numpy() | _amounts.isna().to_numpy()) & ~_blank
+    if _malformed.any():
+        raise HsbcParseError(file_path, list(_line_numbers[_malformed]))
+
+    _df = pd.DataFrame({
+        "date": _dates,
+        "payee": df_chunk["payee"].fillna(""),
+        "amount": to_money(_amounts),
+    })
+    return _df.loc[~_blank].reset_index(drop=True)
+
+
+def read_hsbc_txn(file_path, chunksize: int = None, date_format: str = HSBC_DATE_FORMAT):
+    """Read hsbc txn export (date, payee, amount without header) into typed df
+
+    Quotes and thousands separators in amounts are handled by the csv reader, dates are parsed with a
+    fixed format, so no per-element string clean up or format inference is needed.
+
+    Args:
+        file_path: (Path) txn csv file
+        chunksize: (int) if supplied, return an iterator of dfs of this many rows
+        date_format: (str) strftime format of the date column
+
+    Returns:
+        DataFrame: date (datetime64), payee (str), amount (float64, int64 pence in exact money mode),
+            or iterator of such dfs
+
+    Raises:
+        HsbcParseError: some rows have an invalid date or amount, reports their line numbers
+    """
+    _reader = pd.read_csv(str(file_path),
+                          header=None,
+                          names=HSBC_COLUMNS,
+                          index_col=False,
+                          dtype={"date": str, "payee": str},
+                          thousands=",",
+                          skip_blank_lines=False,
+                          chunksize=chunksize)
+    if not chunksize:
+        return _parse_chunk(_reader, file_path, first_line=1, date_format=date_format)
+
+    def _parse_chunks():
+        _first_line = 1
+        with _reader:
+            for _chunk in _reader:
+                yield _parse_chunk(_chunk, file_path, first_line=_first_line, date_format=date_format)
+                _first_line += len(_chunk.index)
+
+    return _parse_chunks()
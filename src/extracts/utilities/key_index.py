@@ -0,0 +1,172 @@
+import hashlib
+import logging
+import os
+import pandas as pd
+
+from pathlib import Path
+
+from .manifest import ManifestStore
+from .money import to_pounds, normalise_zero
+
+_logger = logging.getLogger(__name__)
+
+KEY_COLUMNS = ["transaction_date", "amount", "payee"]
+
+# sqlite limits the number of bound parameters per statement
+_LOOKUP_BATCH = 500
+
+
+def hash_keys(df_in: pd.DataFrame) -> pd.Series:
+    """Return a stable hash of (transaction_date, amount, payee) per row
+
+    Dates are normalised to yyyy-mm-dd and amounts to 2 decimal places, so a key hashes the same whether the
+    row was read from a csv or a typed fact table.
+
+    Args:
+        df_in: (DataFrame) transaction df
+
+    Returns:
+        Series: hex digest per row, same index as df_in
+    """
+    _dates = pd.to_datetime(df_in["transaction_date"]).dt.strftime("%Y-%m-%d")
+    _amounts = normalise_zero(to_pounds(df_in["amount"]).astype("float64").round(2)).map("{:.2f}".format)
+    _payees = df_in["payee"].fillna("").astype(str)
+    _keys = _dates + "\x1f" + _amounts + "\x1f" + _payees
+    return _keys.map(lambda _key: hashlib.blake2b(_key.encode("utf-8"), digest_size=16).hexdigest())
+
+
+class FactKeyIndex(ManifestStore):
+    """Persistent count of (transaction_date, amount, payee) keys of a fact table
+
+    The index is stored in the manifest and used to find rows of a statement which are not in the fact table
+    yet, without merging against the full history. Keys are counted, so a statement with the same payee and
+    amount twice on a day adds both rows.
+
+    The index records the size and modification time of the fact file it reflects. If the fact file was
+    replaced by anything else, the index is rebuilt from it.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS fact_key (
+            fact TEXT NOT NULL,
+            key_hash TEXT NOT NULL,
+            count INTEGER NOT NULL,
+            PRIMARY KEY (fact, key_hash)
+        );
+        CREATE TABLE IF NOT EXISTS fact_key_state (
+            fact TEXT PRIMARY KEY,
+            size INTEGER NOT NULL,
+            mtime_ns INTEGER NOT NULL
+        );
+    """
+
+    def __init__(self, extracts_path: Path, fact_name: str) -> None:
+        """
+        Args:
+            extracts_path: (Path) extracts directory, the index is stored in its manifest
+            fact_name: (str) fact table name e.g. transaction_hsbc_dc
+        """
+        super().__init__(extracts_path)
+        self.fact_name = fact_name
+        self._counts = {}
+        self._pending = {}
+
+    def sync(self, fact_path: Path, df_fact: pd.DataFrame):
+        """Make sure the index reflects the fact file, rebuild it otherwise
+
+        Args:
+            fact_path: (Path) fact csv file, the index is emptied if there is no fact file yet
+            df_fact: (DataFrame) contents of the fact file, used for a rebuild
+        """
+        if not Path(fact_path).is_file():
+            with self._connection:
+                self._connection.execute("DELETE FROM fact_key WHERE fact = ?", (self.fact_name,))
+                self._connection.execute("DELETE FROM fact_key_state WHERE fact = ?", (self.fact_name,))
+            self._counts = {}
+            self._pending = {}
+            return
+        _stat = os.stat(fact_path)
+        _row = self._connection.execute(
+            "SELECT size, mtime_ns FROM fact_key_state WHERE fact = ?", (self.fact_name,)).fetchone()
+        if _row and _row[0] == _stat.st_size and _row[1] == _stat.st_mtime_ns:
+            return
+
+        _logger.info(f"...rebuilding key index for {self.fact_name}")
+        _counts = hash_keys(df_fact).value_counts() if not df_fact.empty else pd.Series(dtype="int64")
+        with self._connection:
+            self._connection.execute("DELETE FROM fact_key WHERE fact = ?", (self.fact_name,))
+            self._connection.executemany(
+                "INSERT INTO fact_key (fact, key_hash, count) VALUES (?, ?, ?)",
+                ((self.fact_name, _key, int(_count)) for _key, _count in _counts.items()))
+            self._save_state(fact_path)
+        self._counts = {}
+        self._pending = {}
+
+    def _save_state(self, fact_path: Path):
+        _stat = os.stat(fact_path)
+        self._connection.execute(
+            "INSERT OR REPLACE INTO fact_key_state (fact, size, mtime_ns) VALUES (?, ?, ?)",
+            (self.fact_name, _stat.st_size, _stat.st_mtime_ns))
+
+    def _lookup(self, keys: list):
+        """Load stored counts of keys not looked up yet"""
+        _missing = [_key for _key in keys if _key not in self._counts]
+        for _start in range(0, len(_missing), _LOOKUP_BATCH):
+            _batch = _missing[_start:_start + _LOOKUP_BATCH]
+            _rows = self._connection.execute(
+                f"SELECT key_hash, count FROM fact_key WHERE fact = ? AND key_hash IN ({','.join('?' * len(_batch))})",
+                [self.fact_name] + _batch).fetchall()
+            self._counts.update({_key: 0 for _key in _batch})
+            self._counts.update(dict(_rows))
+
+    def count(self, key: str) -> int:
+        """Return number of rows with the key, including rows added but not committed"""
+        self._lookup([key])
+        return self._counts[key]
+
+    def new_rows(self, df_in: pd.DataFrame) -> pd.DataFrame:
+        """Return rows of df_in which are not in the fact table
+
+        When a key occurs n times in df_in and m times in the fact table, the last n - m occurrences are new.
+
+        Args:
+            df_in: (DataFrame) statement transaction df
+
+        Returns:
+            DataFrame: new rows, in the order of df_in
+        """
+        if df_in.empty:
+            return df_in
+        _keys = hash_keys(df_in)
+        self._lookup(list(_keys.unique()))
+        _occurrence = _keys.groupby(_keys, sort=False).cumcount()
+        _existing = _keys.map(self._counts)
+        return df_in.loc[(_occurrence >= _existing).to_numpy()]
+
+    def add(self, df_in: pd.DataFrame):
+        """Count rows appended to the fact table, stored on commit
+
+        Args:
+            df_in: (DataFrame) rows appended to the fact table
+        """
+        if df_in.empty:
+            return
+        _counts = hash_keys(df_in).value_counts()
+        self._lookup(list(_counts.index))
+        for _key, _count in _counts.items():
+            self._counts[_key] += int(_count)
+            self._pending[_key] = self._pending.get(_key, 0) + int(_count)
+
+    def commit(self, fact_path: Path):
+        """Store counts of added rows, the index now reflects the fact file written to fact_path
+
+        Args:
+            fact_path: (Path) fact csv file the added rows were written to
+        """
+        with self._connection:
+            self._connection.executemany(
+                "INSERT INTO fact_key (fact, key_hash, count) VALUES (?, ?, ?) "
+                "ON CONFLICT (fact, key_hash) DO UPDATE SET count = count + excluded.count",
+                ((self.fact_name, _key, _count) for _key, _count in self._pending.items()))
+            self._save_state(fact_path)
+        self._pending = {}
@@ -0,0 +1,177 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+
+from datetime import datetime
+from pathlib import Path
+
+_logger = logging.getLogger(__name__)
+
+MANIFEST_FILENAME = "manifest.sqlite"
+
+
+class ManifestStore:
+    """Connection to the manifest of an extracts directory, base of the state kept there between runs
+
+    Subclasses declare their tables in SCHEMA, which is run when the store is opened. Stores are context
+    managers, the connection is committed and closed on exit.
+    """
+
+    SCHEMA = ""
+
+    def __init__(self, extracts_path: Path) -> None:
+        """
+        Args:
+            extracts_path: (Path) extracts directory, the manifest is stored in it
+        """
+        self.path = Path.joinpath(extracts_path, MANIFEST_FILENAME)
+        self._connection = sqlite3.connect(str(self.path))
+        self._connection.executescript(self.SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self._connection.commit()
+        self._connection.close()
+
+
+class RunManifest(ManifestStore):
+    """Record of pipeline runs, used to rerun only statements whose inputs changed
+
+    For every stage and statement the manifest keeps the hashes of the input files, of the dimensions the
+    stage depends on, and of the outputs it produced. A statement is rerun when:
+    - it has no record and its outputs do not exist yet
+    - one of its outputs is missing
+    - an input or dimension hash differs from the record
+    Outputs which were edited after they were produced (e.g. ynab files with categories filled in) are never
+    overwritten unless forced. Outputs which existed before the manifest are adopted as up to date.
+
+    File hashes are cached against size and modification time, so unchanged files are not re-read.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS statement_run (
+            stage TEXT NOT NULL,
+            statement_date TEXT NOT NULL,
+            input_hash TEXT NOT NULL,
+            dimension_hash TEXT NOT NULL,
+            outputs TEXT NOT NULL,
+            updated TEXT NOT NULL,
+            PRIMARY KEY (stage, statement_date)
+        );
+        CREATE TABLE IF NOT EXISTS file_hash (
+            path TEXT PRIMARY KEY,
+            size INTEGER NOT NULL,
+            mtime_ns INTEGER NOT NULL,
+            hash TEXT NOT NULL
+        );
+    """
+
+    def hash_file(self, file_path: Path) -> str:
+        """Return sha256 of file contents, re-read only if size or modification time changed
+
+        Args:
+            file_path: (Path) file to hash
+
+        Returns:
+            str: hex digest
+        """
+        _path = str(Path(file_path).resolve())
+        _stat = os.stat(_path)
+        _row = self._connection.execute(
+            "SELECT size, mtime_ns, hash FROM file_hash WHERE path = ?", (_path,)).fetchone()
+        if _row and _row[0] == _stat.st_size and _row[1] == _stat.st_mtime_ns:
+            return _row[2]
+
+        _sha = hashlib.sha256()
+        with open(_path, "rb") as f:
+            for _block in iter(lambda: f.read(1 << 20), b""):
+                _sha.update(_block)
+        _hash = _sha.hexdigest()
+        self._connection.execute(
+            "INSERT OR REPLACE INTO file_hash (path, size, mtime_ns, hash) VALUES (?, ?, ?, ?)",
+            (_path, _stat.st_size, _stat.st_mtime_ns, _hash))
+        return _hash
+
+    def _combined_hash(self, items: list) -> str:
+        """Hash of files (Path) and values (str), in the order supplied"""
+        _sha = hashlib.sha256()
+        for _item in items:
+            _value = self.hash_file(_item) if isinstance(_item, Path) else str(_item)
+            _sha.update(_value.encode("utf-8"))
+            _sha.update(b"\0")
+        return _sha.hexdigest()
+
+    def plan(self, stage: str, statement_date: str, inputs: list, dimensions: list = None,
+             outputs: list = None, force: bool = False, adopt: bool = True) -> (bool, str):
+        """Decide whether a statement has to be (re)run by a stage
+
+        Args:
+            stage: (str) stage name e.g. processed, ynab
+            statement_date: (str) statement date in yyyy-mm-dd format
+            inputs: (list) input files (Path)
+            dimensions: (list) dimension files (Path) or values (str) the stage output depends on
+            outputs: (list) expected output files (Path), the recorded outputs are used if not supplied
+            force: (bool) rerun regardless of the manifest
+            adopt: (bool) record existing outputs without a record as up to date, off for dry runs
+
+        Returns:
+            tuple: (bool - statement has to be run, str - reason)
+        """
+        if force:
+            return True, "forced"
+
+        _row = self._connection.execute(
+            "SELECT input_hash, dimension_hash, outputs FROM statement_run WHERE stage = ? AND statement_date = ?",
+            (stage, statement_date)).fetchone()
+        if _row is None:
+            if outputs and all(_output.is_file() for _output in outputs):
+                if adopt:
+                    self.record(stage, statement_date, inputs, dimensions, outputs)
+                return False, "output exists, adopted into manifest"
+            return True, "new statement"
+
+        _input_hash, _dimension_hash, _recorded_outputs = _row
+        _recorded_outputs = json.loads(_recorded_outputs)
+        _output_paths = outputs or [Path(_output) for _output in _recorded_outputs.keys()]
+        for _output in _output_paths:
+            if not _output.is_file():
+                return True, f"output {_output.name} missing"
+
+        _changed = []
+        if _input_hash != self._combined_hash(inputs):
+            _changed.append("inputs")
+        if _dimension_hash != self._combined_hash(dimensions or []):
+            _changed.append("dimensions")
+        if not _changed:
+            return False, "up to date"
+
+        for _output in _output_paths:
+            _recorded_hash = _recorded_outputs.get(str(_output))
+            if _recorded_hash and _recorded_hash != self.hash_file(_output):
+                return False, f"{' and '.join(_changed)} changed but {_output.name} was edited, use --force to rerun"
+        return True, f"{' and '.join(_changed)} changed"
+
+    def record(self, stage: str, statement_date: str, inputs: list, dimensions: list, outputs: list):
+        """Record a successful run of a stage for a statement
+
+        Args:
+            stage: (str) stage name e.g. processed, ynab
+            statement_date: (str) statement date in yyyy-mm-dd format
+            inputs: (list) input files (Path)
+            dimensions: (list) dimension files (Path) or values (str) the stage output depends on
+            outputs: (list) output files (Path) produced
+        """
+        _outputs = {str(_output): self.hash_file(_output) for _output in outputs}
+        self._connection.execute(
+            "INSERT OR REPLACE INTO statement_run "
+            "(stage, statement_date, input_hash, dimension_hash, outputs, updated) VALUES (?, ?, ?, ?, ?, ?)",
+            (stage, statement_date, self._combined_hash(inputs), self._combined_hash(dimensions or []),
+             json.dumps(_outputs), datetime.now().isoformat(timespec="seconds")))
+        self._connection.commit()
@@ -0,0 +1,136 @@
+import os
+import numpy as np
+import pandas as pd
+
+EXACT_MONEY_ENV = "YNAB_EXACT_MONEY"
+MINOR_UNITS = 100
+
+# columns holding money amounts, in exact mode integer columns with these names hold minor units (pence)
+MONEY_COLUMNS = ["amount", "Outflow", "Inflow", "opening_balance", "closing_balance", "balance", "eod_balance",
+                 "actual_balance"]
+
+
+class MissingAmountError(ValueError):
+    """Raised in exact money mode when amounts are missing, pence have no missing value"""
+
+    def __init__(self, labels: list, source=None) -> None:
+        self.labels = labels
+        self.source = source
+        _labels = ", ".join(str(_label) for _label in labels[:10])
+        if len(labels) > 10:
+            _labels += f" and {len(labels) - 10} more"
+        super().__init__(f"amounts missing in row(s) {_labels}{f' of {source}' if source else ''}")
+
+
+def set_exact_money(enabled: bool = True):
+    """Switch exact money mode on or off
+
+    In exact mode amounts are held in memory as int64 minor units (pence), from the hsbc parse through the
+    facts, so totals and comparisons are exact. Files are still written with amounts in pounds.
+    The mode is kept in the environment, so worker processes inherit it.
+
+    Args:
+        enabled: (bool) exact money mode
+    """
+    if enabled:
+        os.environ[EXACT_MONEY_ENV] = "1"
+    else:
+        os.environ.pop(EXACT_MONEY_ENV, None)
+
+
+def exact_money_enabled() -> bool:
+    return os.environ.get(EXACT_MONEY_ENV, "") not in ("", "0")
+
+
+def money_dtype() -> str:
+    """Return dtype of amounts in memory, int64 in exact mode, float64 otherwise"""
+    return "int64" if exact_money_enabled() else "float64"
+
+
+def to_money(values):
+    """Convert amounts in pounds (float or Series) to the in-memory representation
+
+    Args:
+        values: (float or Series) amounts in pounds
+
+    Returns:
+        int or float, or Series: pence in exact mode, pounds otherwise
+
+    Raises:
+        MissingAmountError: some amounts are missing in exact mode, reports their row labels
+    """
+    if isinstance(values, pd.Series):
+        _values = values.astype("float64")
+        if not exact_money_enabled():
+            return _values
+        _missing = _values.isna().to_numpy()
+        if _missing.any():
+            raise MissingAmountError(list(values.index[_missing]))
+        return pd.Series(np.rint(_values.to_numpy() * MINOR_UNITS).astype("int64"), index=values.index,
+                         name=values.name)
+    if not exact_money_enabled():
+        return float(values)
+    if np.isnan(float(values)):
+        raise MissingAmountError([0])
+    return int(round(float(values) * MINOR_UNITS))
+
+
+def to_pounds(values):
+    """Convert amounts from the in-memory representation back to pounds
+
+    Args:
+        values: (int, float or Series) amounts, pence in exact mode
+
+    Returns:
+        float or Series: amounts in pounds
+    """
+    if isinstance(values, pd.Series):
+        return values / MINOR_UNITS if exact_money_enabled() else values
+    return float(values) / MINOR_UNITS if exact_money_enabled() else values
+
+
+def round_money(values):
+    """Round amounts for comparison, to 2 decimal places unless exact
+
+    Args:
+        values: (int, float or Series) amounts in the in-memory representation
+
+    Returns:
+        int, float or Series: rounded amounts
+    """
+    if exact_money_enabled():
+        return values
+    if isinstance(values, (pd.Series, np.ndarray)):
+        return values.round(2)
+    return round(values, 2)
+
+
+def normalise_zero(values):
+    """Turn -0.0 into 0.0, as left by rounding small negative amounts, so it is not written or hashed as -0.0
+
+    Args:
+        values: (int, float, Series or DataFrame) amounts
+
+    Returns:
+        int, float, Series or DataFrame: amounts, of the same type
+    """
+    # adding 0 turns -0.0 into 0.0 and leaves everything else, integers included, unchanged
+    return values + 0
+
+
+def money_for_output(df_in: pd.DataFrame) -> pd.DataFrame:
+    """Return df with integer money columns converted to pounds in exact mode, df_in itself otherwise
+
+    Args:
+        df_in: (DataFrame) df to be written
+
+    Returns:
+        DataFrame: df with amounts in pounds
+    """
+    if not exact_money_enabled():
+        return df_in
+    _columns = [_column for _column in MONEY_COLUMNS
+                if _column in df_in.columns and pd.api.types.is_integer_dtype(df_in[_column])]
+    if not _columns:
+        return df_in
+    return df_in.assign(**{_column: df_in[_column] / MINOR_UNITS for _column in _columns})
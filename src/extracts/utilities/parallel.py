@@ -0,0 +1,87 @@
+import logging
+
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+_logger = logging.getLogger(__name__)
+
+
+class StatementError(Exception):
+    """Raised when a single statement cannot be processed, e.g. amounts do not reconcile"""
+
+
+class _RecordCollector(logging.Handler):
+    """Collect log records emitted in a worker process so they can be replayed by the parent"""
+
+    def __init__(self) -> None:
+        super().__init__(level=logging.DEBUG)
+        self.records = []
+
+    def emit(self, record: logging.LogRecord):
+        # format message and traceback up front, records have to be pickled back to the parent
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        self.records.append(record)
+
+
+def _run_statement(func, item) -> dict:
+    """Run func for one statement, failures are returned rather than raised"""
+    _result = {"item": item, "result": None, "error": None, "records": []}
+    try:
+        _result["result"] = func(item)
+    except StatementError as ex:
+        _result["error"] = str(ex)
+    except Exception as ex:
+        _logger.exception(f"...unexpected error processing {item}")
+        _result["error"] = f"{type(ex).__name__}: {ex}"
+    return _result
+
+
+def _run_statement_captured(func, log_level: int, item) -> dict:
+    """Run func for one statement in a worker process, capturing its log records"""
+    _root = logging.getLogger()
+    _collector = _RecordCollector()
+    _handlers = _root.handlers[:]
+    for _handler in _handlers:
+        _root.removeHandler(_handler)
+    _root.addHandler(_collector)
+    _root.setLevel(log_level)
+    try:
+        _result = _run_statement(func, item)
+    finally:
+        _root.removeHandler(_collector)
+        for _handler in _handlers:
+            _root.addHandler(_handler)
+    _result["records"] = _collector.records
+    return _result
+
+
+def run_statements(func, items: list, workers: int = 1) -> list:
+    """Run func once per statement, optionally fanned out to a process pool
+
+    Statements are independent of each other, so a failure in one statement does not stop the others.
+    Results come back in the order of items. With more than one worker, log records emitted by func are
+    collected in the worker and replayed here in item order, so logs read the same as a serial run.
+
+    Args:
+        func: (callable) module level function called with a single item, picklable when workers > 1
+        items: (list) statements to process, e.g. file paths
+        workers: (int) number of worker processes, 1 runs in this process
+
+    Returns:
+        list: one dict per item -> item, result, error (None if successful)
+    """
+    if workers <= 1 or len(items) <= 1:
+        return [_run_statement(func, _item) for _item in items]
+
+    _log_level = logging.getLogger().getEffectiveLevel()
+    _results = []
+    with ProcessPoolExecutor(max_workers=min(workers, len(items))) as _executor:
+        for _result in _executor.map(partial(_run_statement_captured, func, _log_level), items):
+            for _record in _result.pop("records"):
+                logging.getLogger(_record.name).handle(_record)
+            _results.append(_result)
+    return _results
@@ -0,0 +1,143 @@
+import logging
+import pandas as pd
+
+from collections import deque
+
+_logger = logging.getLogger(__name__)
+
+
+class PayeeMatcher:
+    """Classify bank payees into friendly names and categories
+
+    Builds an Aho-Corasick automaton over the lower-cased `original_payee` patterns of the payee mapping,
+    so every pattern contained in a payee is found in a single scan of the payee text. Friendly names are
+    resolved to categories with a hash map built from the category mapping.
+
+    Matching keeps the rules of the original per-row scan:
+    - mappings are applied in file order, the last matching payee mapping sets the friendly name
+    - the category is taken from the last matching payee mapping whose friendly name has a category mapping
+    - when a friendly name appears more than once in the category mapping, the last entry wins
+    """
+
+    def __init__(self, payee_mappings: list, category_mappings: list) -> None:
+        """
+        Args:
+            payee_mappings: (list) rows of payee_mapping.csv -> dict(original_payee, friendly_name)
+            category_mappings: (list) rows of category_mapping.csv -> dict(payee, category)
+        """
+        self._friendly_names = [payee_mapping["friendly_name"] for payee_mapping in payee_mappings]
+        self._categories = {}
+        for category_mapping in category_mappings:
+            self._categories[category_mapping["payee"]] = category_mapping["category"]
+
+        # patterns which are empty strings are contained in every payee
+        self._always = []
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [[]]
+        for _index, payee_mapping in enumerate(payee_mappings):
+            _pattern = str(payee_mapping["original_payee"]).lower()
+            if _pattern:
+                self._add_pattern(_pattern, _index)
+            else:
+                self._always.append(_index)
+        self._build_failure_links()
+        _logger.debug(f"payee matcher built: {len(payee_mappings)} patterns, {len(self._goto)} states")
+
+    def _add_pattern(self, pattern: str, index: int):
+        _state = 0
+        for _char in pattern:
+            _next = self._goto[_state].get(_char)
+            if _next is None:
+                _next = len(self._goto)
+                self._goto[_state][_char] = _next
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+            _state = _next
+        self._output[_state].append(index)
+
+    def _build_failure_links(self):
+        _queue = deque(self._goto[0].values())
+        while _queue:
+            _state = _queue.popleft()
+            for _char, _next in self._goto[_state].items():
+                _queue.append(_next)
+                _fail = self._fail[_state]
+                while _fail and _char not in self._goto[_fail]:
+                    _fail = self._fail[_fail]
+                _fail = self._goto[_fail].get(_char, 0)
+                self._fail[_next] = _fail
+                self._output[_next] = self._output[_next] + self._output[_fail]
+
+    def find_mappings(self, original_payee: str) -> set:
+        """Return indices of all payee mappings whose pattern is contained in the payee
+
+        Args:
+            original_payee: (str) payee as it appears on the statement
+
+        Returns:
+            set: indices into the payee mapping
+        """
+        _matches = set(self._always)
+        _state = 0
+        for _char in original_payee.lower():
+            while _state and _char not in self._goto[_state]:
+                _state = self._fail[_state]
+            _state = self._goto[_state].get(_char, 0)
+            if self._output[_state]:
+                _matches.update(self._output[_state])
+        return _matches
+
+    def match(self, original_payee: str) -> (str, str):
+        """Transform payee into friendly name, category
+
+        Args:
+            original_payee: (str) payee as it appears on the statement
+
+        Returns:
+            tuple: (friendly payee name, category)
+        """
+        friendly_name = original_payee
+        category = ""
+        for _index in sorted(self.find_mappings(original_payee)):
+            friendly_name = self._friendly_names[_index]
+            category = self._categories.get(friendly_name, category)
+        return friendly_name, category
+
+    def match_all(self, original_payees) -> list:
+        """Classify a column of payees in one pass
+
+        Args:
+            original_payees: (iterable) payees as they appear on the statement
+
+        Returns:
+            list: (friendly payee name, category) per payee, in input order
+        """
+        _results = {}
+        _matched = []
+        for original_payee in original_payees:
+            _result = _results.get(original_payee)
+            if _result is None:
+                _result = self.match(original_payee)
+                _results[original_payee] = _result
+            _matched.append(_result)
+        return _matched
+
+    def enrich(self, original_payees: pd.Series) -> pd.DataFrame:
+        """Batch enrichment of a payee column into Payee (friendly name) and Category columns
+
+        Each distinct payee is classified once into a normalized mapping table,
+        which is then joined back onto every row by its factorized code.
+
+        Args:
+            original_payees: (Series) payees as they appear on the statement
+
+        Returns:
+            DataFrame: Payee, Category columns aligned with the index of the input
+        """
+        _codes, _uniques = pd.factorize(original_payees)
+        _df_mapping = pd.DataFrame(self.match_all(_uniques), columns=["Payee", "Category"])
+        _df_enriched = _df_mapping.take(_codes[_codes >= 0])
+        _df_enriched.index = original_payees.index[_codes >= 0]
+        return _df_enriched.reindex(original_payees.index)
@@ -0,0 +1,58 @@
+import logging
+import time
+
+from graphlib import TopologicalSorter
+
+_logger = logging.getLogger(__name__)
+
+
+def _required_stages(stages: dict, until: str) -> set:
+    """Return until and every stage it depends on, directly or indirectly"""
+    _required = set()
+    _pending = [until]
+    while _pending:
+        _name = _pending.pop()
+        if _name in _required:
+            continue
+        _required.add(_name)
+        _pending += list(stages[_name][0])
+    return _required
+
+
+def run_stage_graph(stages: dict, options: dict, until: str = None) -> dict:
+    """Run pipeline stages in dependency order, passing their results on in memory
+
+    Each stage is called with the results of the stages run so far and the run options, and returns its
+    result. Stages run one at a time, in an order where every stage runs after the stages it depends on.
+
+    Args:
+        stages: (dict) stage name -> (list of stage names it depends on, callable(results, options))
+        options: (dict) run options passed to every stage
+        until: (str) last stage to run, together with the stages it depends on, all stages if not supplied
+
+    Returns:
+        dict: stage name -> result
+
+    Raises:
+        ValueError: a stage depends on a stage which is not defined
+        graphlib.CycleError: stages depend on each other in a cycle
+    """
+    for _name, (_requires, _) in stages.items():
+        _unknown = [_required for _required in _requires if _required not in stages]
+        if _unknown:
+            raise ValueError(f"stage {_name} depends on unknown stage(s) {', '.join(_unknown)}")
+    if until is not None and until not in stages:
+        raise ValueError(f"unknown stage {until}, expected one of {', '.join(stages)}")
+
+    _required = set(stages) if until is None else _required_stages(stages, until)
+    _order = [_name for _name in TopologicalSorter({_name: stages[_name][0] for _name in stages}).static_order()
+              if _name in _required]
+    _logger.info(f"running stages: {' -> '.join(_order)}")
+
+    _results = {}
+    for _name in _order:
+        _logger.info(f"stage {_name}...")
+        _start = time.perf_counter()
+        _results[_name] = stages[_name][1](_results, options)
+        _logger.info(f"...stage {_name} complete in {time.perf_counter() - _start:.2f}s\n")
+    return _results
@@ -0,0 +1,238 @@
+import logging
+import numpy as np
+import pandas as pd
+
+from .money import money_dtype, to_money, to_pounds, round_money, normalise_zero
+
+_logger = logging.getLogger(__name__)
+
+REPORT_COLUMNS = ["statement_date", "opening_balance", "closing_balance", "last_transaction_date", "actual_balance",
+                  "difference", "match"]
+
+
+def _running_balance(df_txn: pd.DataFrame) -> (np.ndarray, np.ndarray, np.ndarray):
+    """Return transaction dates sorted, running balance in that order, and the sort order"""
+    _dates = pd.to_datetime(df_txn["transaction_date"]).to_numpy(dtype="datetime64[ns]")
+    _order = np.argsort(_dates, kind="mergesort")
+    # pence in exact money mode, the cumulative sum is then exact
+    _balances = np.cumsum(df_txn["amount"].to_numpy(dtype=money_dtype())[_order])
+    return _dates[_order], _balances, _order
+
+
+def reconcile_statements(df_txn: pd.DataFrame, df_balance: pd.DataFrame) -> pd.DataFrame:
+    """Compare the closing balance of each statement with the running balance of the transactions
+
+    The running balance at a statement date is the balance after the last transaction on or before it, found
+    with a binary search over the sorted transaction dates. Statements are compared up to the first statement
+    on or after the latest transaction. Statements before the first transaction have no actual balance and do
+    not match.
+
+    Args:
+        df_txn: (DataFrame) full bank df, transaction_date and amount are used
+        df_balance: (DataFrame) balances df
+
+    Returns:
+        DataFrame: one row per statement -> statement_date, opening_balance, closing_balance,
+            last_transaction_date, actual_balance, difference, match (bool)
+    """
+    if df_txn.empty:
+        return pd.DataFrame(columns=REPORT_COLUMNS)
+
+    _dates, _balances, _ = _running_balance(df_txn)
+    _max_txn_date = _dates[-1]
+
+    _df_report = df_balance[["statement_date", "opening_balance", "closing_balance"]].copy()
+    _df_report["statement_date"] = pd.to_datetime(_df_report["statement_date"])
+    _df_report = _df_report.sort_values(by=["statement_date"], kind="mergesort").reset_index(drop=True)
+    _statement_dates = _df_report["statement_date"].to_numpy(dtype="datetime64[ns]")
+
+    _covering = np.searchsorted(_statement_dates, _max_txn_date, side="left")
+    _max_date = _statement_dates[_covering] if _covering < len(_statement_dates) else _max_txn_date
+    _logger.debug(f"...reconciling statements up to {pd.Timestamp(_max_date).date()}")
+    _df_report = _df_report.loc[_statement_dates <= _max_date].reset_index(drop=True)
+
+    _position = np.searchsorted(_dates, _df_report["statement_date"].to_numpy(dtype="datetime64[ns]"),
+                                side="right") - 1
+    _found = _position >= 0
+    _position = np.clip(_position, 0, None)
+    _df_report["last_transaction_date"] = np.where(_found, _dates[_position], np.datetime64("NaT"))
+    # integer valued floats in exact money mode, so statements without a transaction can be nan
+    _actual = pd.Series(np.where(_found, _balances[_position], np.nan), index=_df_report.index)
+    _expected = to_money(_df_report["closing_balance"]).astype("float64")
+    _df_report["match"] = round_money(_expected) == round_money(_actual)
+    _df_report["actual_balance"] = to_pounds(_actual)
+    _df_report["difference"] = (_df_report["actual_balance"] - _df_report["closing_balance"]).round(2)
+    return _df_report[REPORT_COLUMNS]
+
+
+def statement_detail(df_txn: pd.DataFrame, df_report: pd.DataFrame) -> pd.DataFrame:
+    """Return transactions with running and end of day balances, next to the statement closing balances
+
+    Statement dates without transactions get a row of their own. Rows on a statement date whose end of day
+    balance differs from the closing balance have match False.
+
+    Args:
+        df_txn: (DataFrame) full bank df
+        df_report: (DataFrame) statement report from reconcile_statements
+
+    Returns:
+        DataFrame: transaction_date, payee, amount, balance, eod_balance, closing_balance, match
+    """
+    _dates, _balances, _order = _running_balance(df_txn)
+    _df = pd.DataFrame({
+        "transaction_date": _dates,
+        "payee": df_txn["payee"].to_numpy()[_order],
+        "amount": to_pounds(pd.Series(df_txn["amount"].to_numpy(dtype=money_dtype())[_order])),
+        "balance": to_pounds(pd.Series(_balances)),
+    })
+    _df["eod_balance"] = _df.groupby("transaction_date")["balance"].transform("last")
+
+    _df_statements = df_report.drop_duplicates(subset=["statement_date"])
+    _df_missing = _df_statements.loc[~_df_statements["statement_date"].isin(_df["transaction_date"])]
+    _df_missing = pd.DataFrame({
+        "transaction_date": _df_missing["statement_date"],
+        "eod_balance": _df_missing["actual_balance"],
+    })
+    _df = pd.concat([_df, _df_missing], ignore_index=True)
+    _df = _df.sort_values(by=["transaction_date"], kind="mergesort").reset_index(drop=True)
+
+    _closing = _df_statements.set_index("statement_date")["closing_balance"]
+    _df["closing_balance"] = _df["transaction_date"].map(_closing).fillna(0)
+    _match = (_df["closing_balance"] == 0) | (_df["closing_balance"].round(2) == _df["eod_balance"].round(2))
+    _df["match"] = np.where(_match, "True", "False")
+    return _df
+
+
+PERIOD_COLUMNS = ["period_start", "statement_date", "opening_balance", "closing_balance", "rows", "expected_change",
+                  "actual_change", "period_difference", "cumulative_difference", "opening_gap", "match"]
+CANDIDATE_COLUMNS = ["rank", "transaction_date", "payee", "amount", "explanation", "residual", "duplicate"]
+
+
+def reconcile_periods(df_txn: pd.DataFrame, df_balance: pd.DataFrame) -> pd.DataFrame:
+    """Compare the change in balance over each statement period with the transactions in that period
+
+    A statement period runs from the day after the previous statement up to and including the statement date,
+    the first period covers all transactions up to the first statement. The expected change of a period is
+    its closing balance less the previous closing balance (nil before the first statement), so period
+    differences add up to the difference between running and closing balance. Period totals are computed in
+    one pass over the sorted transactions.
+
+    Args:
+        df_txn: (DataFrame) full bank df, transaction_date and amount are used
+        df_balance: (DataFrame) balances df
+
+    Returns:
+        DataFrame: one row per statement up to the first statement on or after the latest transaction ->
+            period_start, statement_date, opening_balance, closing_balance, rows, expected_change, actual_change,
+            period_difference, cumulative_difference, opening_gap (opening less previous closing balance),
+            match (bool, period difference is nil)
+    """
+    if df_txn.empty:
+        return pd.DataFrame(columns=PERIOD_COLUMNS)
+
+    _dates, _balances, _ = _running_balance(df_txn)
+    _df = df_balance[["statement_date", "opening_balance", "closing_balance"]].copy()
+    _df["statement_date"] = pd.to_datetime(_df["statement_date"])
+    _df = _df.sort_values(by=["statement_date"], kind="mergesort").reset_index(drop=True)
+    _statement_dates = _df["statement_date"].to_numpy(dtype="datetime64[ns]")
+    _covering = np.searchsorted(_statement_dates, _dates[-1], side="left")
+    _df = _df.iloc[:_covering + 1].reset_index(drop=True)
+    _statement_dates = _statement_dates[:_covering + 1]
+
+    # running balance before the first transaction is nil
+    _cumulative = np.concatenate([np.zeros(1, dtype=_balances.dtype), _balances])
+    _end = np.searchsorted(_dates, _statement_dates, side="right")
+    _start = np.concatenate([[0], _end[:-1]])
+    _closing = to_money(_df["closing_balance"]).to_numpy()
+    _previous_closing = np.concatenate([np.zeros(1, dtype=_closing.dtype), _closing[:-1]])
+
+    _df.insert(0, "period_start", _df["statement_date"].shift(1) + pd.Timedelta(days=1))
+    _df["rows"] = _end - _start
+    _expected_change = pd.Series(_closing - _previous_closing)
+    _actual_change = pd.Series(_cumulative[_end] - _cumulative[_start])
+    _period_difference = round_money(_actual_change - _expected_change)
+    _df["expected_change"] = to_pounds(round_money(_expected_change))
+    _df["actual_change"] = to_pounds(round_money(_actual_change))
+    _df["period_difference"] = to_pounds(_period_difference)
+    _df["cumulative_difference"] = to_pounds(round_money(pd.Series(_cumulative[_end] - _closing)))
+    _df["opening_gap"] = to_pounds(round_money(to_money(_df["opening_balance"]) - pd.Series(_previous_closing)))
+    _money_columns = ["expected_change", "actual_change", "period_difference", "cumulative_difference", "opening_gap"]
+    _df[_money_columns] = normalise_zero(_df[_money_columns])
+    _df["match"] = _period_difference == 0
+    return _df[PERIOD_COLUMNS]
+
+
+def rank_candidates(df_txn: pd.DataFrame, df_period: pd.Series, limit: int = 10) -> pd.DataFrame:
+    """Rank transactions of a statement period by how well their amount explains the period difference
+
+    A row whose amount equals the difference may be a duplicate or should not be there, a row worth half the
+    difference may have the wrong sign. Those come first, duplicates of another row in the period before the
+    rest, then the other rows by the difference left after removing them or reversing their sign.
+
+    Args:
+        df_txn: (DataFrame) full bank df
+        df_period: (Series) row of reconcile_periods
+        limit: (int) number of candidates to return
+
+    Returns:
+        DataFrame: rank, transaction_date, payee, amount, explanation, residual (difference left if the row is
+            removed or its sign reversed), duplicate (bool)
+    """
+    _dates = pd.to_datetime(df_txn["transaction_date"])
+    _in_period = (_dates <= df_period["statement_date"]).to_numpy()
+    if not pd.isna(df_period["period_start"]):
+        _in_period &= (_dates >= df_period["period_start"]).to_numpy()
+    _df = pd.DataFrame({
+        "transaction_date": _dates[_in_period].to_numpy(),
+        "payee": df_txn["payee"].to_numpy()[_in_period],
+        "amount": df_txn["amount"].to_numpy(dtype=money_dtype())[_in_period],
+    })
+    if _df.empty:
+        return pd.DataFrame(columns=CANDIDATE_COLUMNS)
+
+    _difference = to_money(df_period["period_difference"])
+    _removed = round_money(pd.Series(_difference - _df["amount"]))
+    _reversed = round_money(pd.Series(_difference - 2 * _df["amount"]))
+    _df["duplicate"] = _df.duplicated(subset=["transaction_date", "payee", "amount"], keep=False)
+    _df["explanation"] = np.select([_removed == 0, _reversed == 0], ["extra or duplicated row", "sign reversed"],
+                                   default="nearest amount")
+    _df["residual"] = np.where(_reversed.abs() < _removed.abs(), _reversed, _removed)
+    _df["_exact"] = (_removed == 0) | (_reversed == 0)
+    _df["_distance"] = _df["residual"].abs()
+    _df = _df.sort_values(by=["_exact", "duplicate", "_distance", "transaction_date"],
+                          ascending=[False, False, True, True], kind="mergesort").head(limit)
+    _df["rank"] = range(1, len(_df.index) + 1)
+    _df["amount"] = to_pounds(_df["amount"])
+    _df["residual"] = to_pounds(_df["residual"])
+    return _df[CANDIDATE_COLUMNS].reset_index(drop=True)
+
+
+def localize_mismatch(df_txn: pd.DataFrame, df_balance: pd.DataFrame, limit: int = 10) -> dict:
+    """Find the first statement period and day where the running balance diverges from the statements
+
+    The day is the date of the best candidate row when its amount explains the period difference exactly,
+    otherwise it is not known.
+
+    Args:
+        df_txn: (DataFrame) full bank df
+        df_balance: (DataFrame) balances df
+        limit: (int) number of candidate rows to return
+
+    Returns:
+        dict: periods (DataFrame, see reconcile_periods), first_period (Series row of periods, None if all
+            periods match), first_day (Timestamp or None), candidates (DataFrame, see rank_candidates)
+    """
+    _df_periods = reconcile_periods(df_txn=df_txn, df_balance=df_balance)
+    _diagnosis = {"periods": _df_periods, "first_period": None, "first_day": None,
+                  "candidates": pd.DataFrame(columns=CANDIDATE_COLUMNS)}
+    _df_mismatch = _df_periods.loc[~_df_periods["match"].astype(bool)]
+    if _df_mismatch.empty:
+        return _diagnosis
+
+    _first_period = _df_mismatch.iloc[0]
+    _df_candidates = rank_candidates(df_txn=df_txn, df_period=_first_period, limit=limit)
+    _diagnosis["first_period"] = _first_period
+    _diagnosis["candidates"] = _df_candidates
+    if not _df_candidates.empty and _df_candidates["explanation"].iloc[0] != "nearest amount":
+        _diagnosis["first_day"] = _df_candidates["transaction_date"].iloc[0]
+    return _diagnosis
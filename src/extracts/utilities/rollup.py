@@ -0,0 +1,56 @@
+import logging
+import pandas as pd
+
+from .money import money_dtype, round_money, normalise_zero
+
+_logger = logging.getLogger(__name__)
+
+
+def rollup_cube(df_in: pd.DataFrame, grain: list, value: str = "amount") -> pd.DataFrame:
+    """Sum a value over the finest grain every aggregate level is rolled up from, the only pass over the rows
+
+    Args:
+        df_in: (DataFrame) transaction df, label columns may be categoricals, only combinations present are kept
+        grain: (list) grouping columns of the finest grain
+        value: (str) column to sum
+
+    Returns:
+        DataFrame: grain columns and the summed value, one row per combination present, sorted by grain
+    """
+    # groupby on categoricals with observed=True does not sort every pandas version, sorted explicitly
+    _df_cube = df_in.groupby(grain, sort=True, observed=True)[value].sum().sort_index().reset_index()
+    _df_cube[value] = _df_cube[value].astype(money_dtype())
+    return _df_cube
+
+
+def rollup_level(df_cube: pd.DataFrame, columns: list, value: str = "amount") -> pd.DataFrame:
+    """Roll a cube up to a coarser level, reading only the cube
+
+    Args:
+        df_cube: (DataFrame) cube, see rollup_cube
+        columns: (list) grouping columns, a subset of the cube grain, the grand total if empty
+        value: (str) column to sum
+
+    Returns:
+        DataFrame: grouping columns and the summed value, rounded to pence unless exact
+    """
+    if columns:
+        _df_level = df_cube.groupby(columns, sort=True, observed=True)[value].sum().sort_index().reset_index()
+    else:
+        _df_level = pd.DataFrame({value: [df_cube[value].sum()]})
+    _df_level[value] = normalise_zero(round_money(_df_level[value])).astype(money_dtype())
+    return _df_level
+
+
+def rollup_levels(df_cube: pd.DataFrame, levels: dict, value: str = "amount") -> dict:
+    """Roll a cube up to every level
+
+    Args:
+        df_cube: (DataFrame) cube, see rollup_cube
+        levels: (dict) level name -> grouping columns
+        value: (str) column to sum
+
+    Returns:
+        dict: level name -> aggregate df
+    """
+    return {_name: rollup_level(df_cube, _columns, value=value) for _name, _columns in levels.items()}
@@ -3,11 +3,16 @@ import json
 import pandas as pd
 
 from pathlib import Path
-from dateutil.parser import parse
 from logging.config import dictConfig
 from csv import DictReader
 
 from .constants import CONFIG_DIR, LOG_FILENAME, LOG_CONF_FILENAME, EXTRACTS_PATH
+from .payee_matcher import PayeeMatcher
+from .cache import load_cached
+from .balance_index import BalanceIndex
+from .directory_index import get_directory_index
+from .validation import build_category_keys, find_missing_categories
+from .money import money_for_output
 
 _logger = logging.getLogger(__name__)
 
@@ -22,45 +27,39 @@ def setup_logging(logging_config=LOG_CONF_FILENAME, log_filename=LOG_FILENAME):
         _logger.exception("File/path does not exist")
 
 
-def get_files_list(file_path: Path, suffix: list = None, starts_with: str = "", extension: str = "csv") -> list:
+def get_files_list(file_path: Path, suffix: list = None, starts_with: str = "", extension: str = "csv",
+                   start_date: str = None, end_date: str = None) -> list:
     """
     - If suffix is supplied as a list, such as ['txn'],
         then files matching this pattern are returned: yyyy-mm-dd_<suffix>.<extension>
+        optionally limited to statement dates between start_date and end_date
     - If starts_with parameter is supplied,
         then all files matching this pattern are <starts_with>,,,.<extension>
     - If neither parameter is specified,
         then all files matching this pattern are ,,,.<extension>
 
+    The directory is scanned once and indexed, later calls reuse the index until files are added or removed.
+    Files are returned ordered by statement date, or by name.
+
     Args:
         file_path: (Path) Pathlib Path
         suffix: (list) type of file e.g. [ynab], [transaction]
         starts_with: str
         extension: (str) extension to search
+        start_date: (str) first statement date in yyyy-mm-dd format, inclusive
+        end_date: (str) last statement date in yyyy-mm-dd format, inclusive
 
     Returns:
         list: list of files -> pathlib path
     """
-    if not suffix:
-        suffix = []
     try:
-        _files = file_path.glob(f"*.{extension}")
-        _files_list = []
-        for _file in _files:
-            try:
-                if suffix:
-                    parse(str(_file.stem[0:10]))
-                    if str(_file.stem[11:]).lower() in suffix:
-                        _files_list.append(_file)
-                elif starts_with:
-                    if _file.stem.startswith(starts_with):
-                        _files_list.append(_file)
-                else:
-                    _files_list.append(_file)
-            except ValueError:
-                _logger.debug(f"file {_file.stem} is not a valid file")
-        return _files_list
+        _index = get_directory_index(file_path, extension=extension)
     except FileNotFoundError:
         _logger.exception(f"File/path {file_path} does not exist")
+        return []
+    if suffix:
+        return _index.statement_files(suffix, start_date=start_date, end_date=end_date)
+    return _index.files_starting_with(starts_with)
 
 
 def get_json(json_path: Path) -> dict:
@@ -85,14 +84,8 @@ def get_extracts_path() -> Path:
     return EXTRACTS_PATH
 
 
-def get_balance() -> pd.DataFrame:
-    """Return balance df
-
-    Returns:
-        DataFrame: balance dataframe
-    """
-    balance_file_path = Path.joinpath(get_extracts_path(), "balance.csv")
-    _df_balance = pd.read_csv(str(balance_file_path), sep=",")
+def _read_balance(balance_file_path: str) -> pd.DataFrame:
+    _df_balance = pd.read_csv(balance_file_path, sep=",")
     _df_balance = _df_balance.astype({
         "opening_balance": 'float64',
         "closing_balance": 'float64',
@@ -101,61 +94,114 @@ def get_balance() -> pd.DataFrame:
     return _df_balance
 
 
+def _read_csv(file_path: str) -> pd.DataFrame:
+    return pd.read_csv(file_path, sep=",")
+
+
+def _read_dict_rows(file_path: str) -> list:
+    with open(file_path, 'r') as f:
+        dict_reader = DictReader(f)
+        return list(dict_reader)
+
+
+def get_balance(file_name: str = "balance.csv") -> pd.DataFrame:
+    """Return balance df, cached until the balance file changes
+
+    Args:
+        file_name: (str) balance file of the account, balance.csv for the debit card
+
+    Returns:
+        DataFrame: balance dataframe
+    """
+    balance_file_path = Path.joinpath(get_extracts_path(), file_name)
+    return load_cached("balance", [balance_file_path], _read_balance)
+
+
+def get_balance_index(file_name: str = "balance.csv") -> BalanceIndex:
+    """Return balances indexed by statement date, cached until the balance file changes
+
+    Args:
+        file_name: (str) balance file of the account, balance.csv for the debit card
+
+    Returns:
+        BalanceIndex: opening and closing balance lookup by statement date
+    """
+    balance_file_path = Path.joinpath(get_extracts_path(), file_name)
+
+    def _build_index(*_paths) -> BalanceIndex:
+        return BalanceIndex(get_balance(file_name))
+
+    return load_cached("balance_index", [balance_file_path], _build_index)
+
+
 def get_category() -> pd.DataFrame:
-    """Return category df
+    """Return category df, cached until category.csv changes
 
     Returns:
         DataFrame: category dataframe
     """
     extracts_path = get_extracts_path()
     category_file_path = Path.joinpath(extracts_path, "dimensions", "category.csv")
-    _df_category = pd.read_csv(str(category_file_path), sep=",")
-    return _df_category
+    return load_cached("category", [category_file_path], _read_csv)
 
 
 def get_budget() -> pd.DataFrame:
-    """Return budget df
+    """Return budget df, cached until budget_values.csv changes
 
     Returns:
         DataFrame: budget dataframe
     """
     budget_file_path = Path.joinpath(get_extracts_path(), "powerbi_dir", "budget_values.csv")
-    _df_budget = pd.read_csv(str(budget_file_path), sep=",")
-    return _df_budget
+    return load_cached("budget", [budget_file_path], _read_csv)
+
+
+def get_category_keys() -> frozenset:
+    """Return (master_category, subcategory) pairs of the category dimension, cached until category.csv changes
+
+    Returns:
+        frozenset: (master_category, subcategory) tuples
+    """
+    category_file_path = Path.joinpath(get_extracts_path(), "dimensions", "category.csv")
+
+    def _build_keys(*_paths) -> frozenset:
+        return build_category_keys(get_category())
+
+    return load_cached("category_keys", [category_file_path], _build_keys)
 
 
 def validate_category(file_path, file_type) -> (bool, pd.DataFrame):
     """Validate all categories in file exist in category dimension
 
+    Use find_missing_categories to validate a df already in memory.
+
     Returns:
         tuple: (bool - status of comparison, dataframe if missing categories)
     """
     df_txn = pd.read_csv(file_path)
-    if file_type == "ynab":
-        df_txn['master_category'] = df_txn["Category"].str.split(':').str[0]
-        df_txn['subcategory'] = df_txn["Category"].str.split(':').str[1].str.strip()
-    df_cat = get_category()
-    result = pd.merge(left=df_txn, right=df_cat, how="left", on=["master_category", "subcategory"])
-    result = result.loc[result["enabled"].isnull(), ["master_category", "subcategory"]]
+    result = find_missing_categories(df_txn, get_category_keys(), file_type=file_type)
     if result.empty:
         return True, result
     else:
         return False, result
 
 
-def write_df(df_in: pd.DataFrame, path: str, sep: str = ",") -> bool:
+def write_df(df_in: pd.DataFrame, path: str, sep: str = ",", mode: str = "w", header: bool = True) -> bool:
     """Write dataframe to disk
 
+    In exact money mode amounts held in pence are written in pounds.
+
     Args:
         df_in (pd.DataFrame): dataframe to write
         path (str): file path
         sep (str): separator
+        mode (str): file mode, "a" to append to an existing file
+        header (bool): write column names
 
     Returns:
         bool: confirmation if operation is successful
     """
     try:
-        df_in.to_csv(path, index=False, sep=sep)
+        money_for_output(df_in).to_csv(path, index=False, sep=sep, mode=mode, header=header)
         return True
     except FileNotFoundError as ex:
         _logger.error(f"...folder path not found", ex)
@@ -163,18 +209,38 @@ def write_df(df_in: pd.DataFrame, path: str, sep: str = ",") -> bool:
 
 
 def get_payee_mapping() -> list:
-    payee_mapping_csv = Path.joinpath(EXTRACTS_PATH,"dimensions", "payee_mapping.csv")
-    with open(payee_mapping_csv, 'r') as f:
-        dict_reader = DictReader(f)
-        payee_mappings = list(dict_reader)
+    """Return payee mappings, cached until payee_mapping.csv changes
 
-    return payee_mappings
+    Returns:
+        list: rows of payee mapping -> dict(original_payee, friendly_name)
+    """
+    payee_mapping_csv = Path.joinpath(get_extracts_path(), "dimensions", "payee_mapping.csv")
+    return load_cached("payee_mapping", [payee_mapping_csv], _read_dict_rows)
 
 
 def get_category_mapping() -> list:
-    category_mapping_csv = Path.joinpath(EXTRACTS_PATH,"dimensions", "category_mapping.csv")
-    with open(category_mapping_csv, 'r') as f:
-        dict_reader = DictReader(f)
-        category_mappings = list(dict_reader)
+    """Return category mappings, cached until category_mapping.csv changes
+
+    Returns:
+        list: rows of category mapping -> dict(payee, category)
+    """
+    category_mapping_csv = Path.joinpath(get_extracts_path(), "dimensions", "category_mapping.csv")
+    return load_cached("category_mapping", [category_mapping_csv], _read_dict_rows)
+
+
+def get_payee_matcher() -> PayeeMatcher:
+    """Return payee matcher built from payee and category mappings, cached until either file changes
+
+    Returns:
+        PayeeMatcher: matcher to transform payees into friendly name, category
+    """
+    dimensions_path = Path.joinpath(get_extracts_path(), "dimensions")
+    mapping_paths = [
+        Path.joinpath(dimensions_path, "payee_mapping.csv"),
+        Path.joinpath(dimensions_path, "category_mapping.csv")
+    ]
+
+    def _build_matcher(*_paths) -> PayeeMatcher:
+        return PayeeMatcher(payee_mappings=get_payee_mapping(), category_mappings=get_category_mapping())
 
-    return category_mappings
+    return load_cached("payee_matcher", mapping_paths, _build_matcher)
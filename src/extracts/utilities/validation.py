@@ -0,0 +1,113 @@
+import logging
+import pandas as pd
+
+from .balance_index import BalanceIndex, MissingStatementError
+from .money import to_money, to_pounds, round_money
+
+_logger = logging.getLogger(__name__)
+
+REPORT_COLUMNS = ["file", "statement_date", "file_type", "expected_total", "actual_total", "amount_valid",
+                  "missing_categories", "category_valid", "valid", "error"]
+
+
+def build_category_keys(df_category: pd.DataFrame) -> frozenset:
+    """Return set of (master_category, subcategory) pairs of the category dimension
+
+    Args:
+        df_category: (DataFrame) category df
+
+    Returns:
+        frozenset: (master_category, subcategory) tuples
+    """
+    _df = df_category.loc[df_category["enabled"].notna()]
+    return frozenset(zip(_df["master_category"], _df["subcategory"]))
+
+
+def split_category(categories: pd.Series) -> (pd.Series, pd.Series):
+    """Split ynab Category values "master: sub" into master category and subcategory
+
+    Args:
+        categories: (Series) ynab Category values, read as float when every value is blank e.g. transfers only
+
+    Returns:
+        tuple: (master_category Series, subcategory Series)
+    """
+    _parts = categories.astype("object").str.split(":")
+    return _parts.str[0], _parts.str[1].str.strip()
+
+
+def find_missing_categories(df_in: pd.DataFrame, category_keys: frozenset, file_type: str = "txn") -> pd.DataFrame:
+    """Return rows whose category is not in the category dimension
+
+    Args:
+        df_in: (DataFrame) ynab or transaction df
+        category_keys: (frozenset) (master_category, subcategory) pairs, see build_category_keys
+        file_type: (str) ynab - categories are read from Category, txn - from master_category, subcategory
+
+    Returns:
+        DataFrame: master_category, subcategory of rows with a missing category
+    """
+    if file_type == "ynab":
+        _master, _sub = split_category(df_in["Category"])
+    else:
+        _master, _sub = df_in["master_category"], df_in["subcategory"]
+    _found = [(_key in category_keys) for _key in zip(_master, _sub)]
+    _missing = ~pd.Series(_found, index=df_in.index, dtype=bool)
+    return pd.DataFrame({"master_category": _master[_missing], "subcategory": _sub[_missing]})
+
+
+def _format_categories(df_missing: pd.DataFrame) -> list:
+    _categories = df_missing["master_category"].astype(str) + ": " + df_missing["subcategory"].astype(str)
+    return list(dict.fromkeys(_categories))
+
+
+def validate_statements(statements: list, category_keys: frozenset, balance_index: BalanceIndex) -> pd.DataFrame:
+    """Validate amounts and categories of statement transaction dfs in one pass
+
+    Statements of reconciled accounts reconcile when their total equals closing less opening balance of the
+    statement, other statements (cash) when their total is nil.
+
+    Args:
+        statements: (list) dicts -> statement_date, file_type e.g. hsbc_dc, df, file_path (optional),
+            reconciled (optional, default True), balance_index (optional, balances of the account)
+        category_keys: (frozenset) (master_category, subcategory) pairs, see build_category_keys
+        balance_index: (BalanceIndex) balances indexed by statement date, for statements without their own
+
+    Returns:
+        DataFrame: one row per statement -> file, statement_date, file_type, expected_total, actual_total
+            (in pounds), amount_valid, missing_categories (list), category_valid, valid, error
+    """
+    _rows = []
+    for _statement in statements:
+        _df = _statement["df"]
+        _statement_date = _statement["statement_date"]
+        _row = {
+            "file": str(_statement.get("file_path", "")),
+            "statement_date": _statement_date,
+            "file_type": _statement["file_type"],
+            "expected_total": None,
+            "actual_total": round_money(_df["amount"].sum()),
+            "error": None,
+        }
+        if not _statement.get("reconciled", True):
+            _row["expected_total"] = 0
+        else:
+            try:
+                _balance_index = _statement.get("balance_index") or balance_index
+                _opening_balance, _closing_balance = _balance_index.get(_statement_date)
+                _row["expected_total"] = round_money(to_money(_closing_balance) - to_money(_opening_balance))
+            except MissingStatementError as ex:
+                _row["error"] = str(ex)
+        _row["amount_valid"] = _row["expected_total"] is not None and _row["expected_total"] == _row["actual_total"]
+
+        _missing = _format_categories(find_missing_categories(_df, category_keys))
+        _row["missing_categories"] = _missing
+        _row["category_valid"] = not _missing
+        _row["valid"] = _row["amount_valid"] and _row["category_valid"]
+        _logger.debug(f"...{_statement_date} {_statement['file_type']}: expected total {_row['expected_total']}, "
+                      f"actual total {_row['actual_total']}, {len(_missing)} missing categories")
+        _rows.append(_row)
+    _df_report = pd.DataFrame(_rows, columns=REPORT_COLUMNS)
+    _df_report["expected_total"] = to_pounds(_df_report["expected_total"].astype("float64"))
+    _df_report["actual_total"] = to_pounds(_df_report["actual_total"].astype("float64"))
+    return _df_report
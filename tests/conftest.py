@@ -0,0 +1,17 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+# scripts import utilities as a top-level package, as when run from src/extracts
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src" / "extracts"))
+
+
+@pytest.fixture
+def extracts_path(tmp_path, monkeypatch):
+    """Empty extracts directory the scripts read from and write to"""
+    import utilities.scripts
+    monkeypatch.setattr(utilities.scripts, "EXTRACTS_PATH", tmp_path)
+    for _folder in ["dimensions", "facts", "powerbi"]:
+        Path.joinpath(tmp_path, _folder).mkdir()
+    return tmp_path
@@ -0,0 +1,57 @@
+import io
+
+import numpy as np
+import pandas as pd
+
+from utilities import get_account_adapter
+
+YNAB_COLUMNS = "Date,Payee,Category,Memo,Outflow,Inflow\n"
+
+
+def _read_ynab(rows: str) -> pd.DataFrame:
+    """Read a ynab register export as the scripts read it"""
+    return pd.read_csv(io.StringIO(YNAB_COLUMNS + rows))
+
+
+def test_transfer_only_export_has_blank_categories():
+    _df_ynab = _read_ynab("10/01/2024,Transfer : HSBC DC,,,,100.00\n20/01/2024,Transfer : HSBC DC,,,25.50,\n")
+    assert _df_ynab["Category"].dtype == "float64"
+
+    _dfs = get_account_adapter("isa").to_transactions(_df_ynab, "2024-01-25")
+
+    assert [_df["file_type"] for _df in _dfs] == ["isa"]
+    _df_txn = _dfs[0]["df"]
+    assert _df_txn["master_category"].isna().all()
+    assert _df_txn["subcategory"].isna().all()
+    assert _df_txn["amount"].tolist() == [100.0, -25.5]
+
+
+def test_debit_card_cash_withdrawals_are_split_as_before():
+    _df_ynab = _read_ynab("2024-01-03,Tesco,Monthly: Groceries,,12.50,\n"
+                          "2024-01-05,Transfer : Cash,,,50.00,\n"
+                          "2024-01-10,Employer,Income: Salary,,,1500.00\n"
+                          "2024-01-12,Transfer : Cash,,,20.00,\n")
+
+    _dfs = get_account_adapter("hsbc_dc").to_transactions(_df_ynab, "2024-01-25")
+
+    assert [_df["file_type"] for _df in _dfs] == ["hsbc_dc", "cash"]
+    assert {_df["statement_date"] for _df in _dfs} == {"2024-01-25"}
+    # rows and order of the transaction files written before accounts had adapters
+    pd.testing.assert_frame_equal(_dfs[0]["df"], pd.DataFrame({
+        "account": "HSBC DC",
+        "transaction_date": pd.to_datetime(["2024-01-03", "2024-01-05", "2024-01-10", "2024-01-12"]),
+        "payee": ["Tesco", "Transfer : Cash", "Employer", "Transfer : Cash"],
+        "master_category": ["Monthly", "Transfer-out", "Income", "Transfer-out"],
+        "subcategory": ["Groceries", "Cash", "Salary", "Cash"],
+        "memo": np.nan,
+        "amount": [-12.5, -50.0, 1500.0, -20.0],
+    }))
+    pd.testing.assert_frame_equal(_dfs[1]["df"], pd.DataFrame({
+        "account": "Cash",
+        "transaction_date": pd.to_datetime(["2024-01-05", "2024-01-05", "2024-01-12", "2024-01-12"]),
+        "payee": ["Misc", "Transfer : HSBC DC", "Misc", "Transfer : HSBC DC"],
+        "master_category": ["Monthly", "Transfer-in", "Monthly", "Transfer-in"],
+        "subcategory": ["Discretionary", "HSBC DC", "Discretionary", "HSBC DC"],
+        "memo": np.nan,
+        "amount": [-50.0, 50.0, -20.0, 20.0],
+    }, index=[1, 1, 3, 3]))
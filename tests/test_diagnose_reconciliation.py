@@ -0,0 +1,39 @@
+import pandas as pd
+
+from pathlib import Path
+
+from diagnose_reconciliation import diagnose_account
+
+BALANCE_CSV = """statement_date,opening_balance,closing_balance
+2023-01-25,0.0,950.0
+2023-02-25,950.0,1621.0
+2023-03-25,1621.0,1611.0
+"""
+
+FACT_CSV = """account,transaction_date,payee,master_category,subcategory,memo,amount
+HSBC CC,2023-01-01,Opening balance,Income,Salary,,1000.0
+HSBC CC,2023-01-15,GARAGE,Monthly,Transport,,-50.0
+HSBC CC,2023-02-03,BAKERY,Monthly,Groceries,,-4.5
+HSBC CC,2023-02-03,LANDLORD,Monthly,Rent,,-300.0
+HSBC CC,2023-02-10,CAFE,Monthly,Discretionary,,-4.5
+HSBC CC,2023-02-10,CAFE,Monthly,Discretionary,,-4.5
+HSBC CC,2023-02-15,SHOP,Monthly,Groceries,,-20.0
+HSBC CC,2023-02-20,SALARY,Income,Salary,,1000.0
+HSBC CC,2023-03-05,BUTCHER,Monthly,Groceries,,-10.0
+"""
+
+
+def test_diagnosis_of_account_file_is_written_next_to_its_error_file(extracts_path):
+    Path.joinpath(extracts_path, "balance_hsbc_cc.csv").write_text(BALANCE_CSV)
+    Path.joinpath(extracts_path, "transaction_hsbc_cc.csv").write_text(FACT_CSV)
+
+    _diagnosis = diagnose_account(extracts_path=extracts_path, account="hsbc_cc", file_name="transaction_hsbc_cc.csv",
+                                  limit=2)
+
+    assert _diagnosis["first_period"]["statement_date"] == pd.Timestamp("2023-02-25")
+    assert _diagnosis["first_day"] == pd.Timestamp("2023-02-10")
+    _df_periods = pd.read_csv(Path.joinpath(extracts_path, "transaction_error_hsbc_cc_periods.csv"))
+    assert _df_periods["match"].tolist() == [True, False, True]
+    _df_candidates = pd.read_csv(Path.joinpath(extracts_path, "transaction_error_hsbc_cc_candidates.csv"))
+    assert _df_candidates["payee"].tolist() == ["CAFE", "CAFE"]
+    assert _df_candidates["explanation"].tolist() == ["extra or duplicated row", "extra or duplicated row"]
@@ -0,0 +1,80 @@
+import os
+
+from pathlib import Path
+
+from utilities import DirectoryIndex, get_directory_index, get_files_list
+
+STATEMENT_FILES = ["2024-01-25_txn.CSV", "2024-02-25_txn.csv", "2024-03-25_TXN.csv", "2024-04-25_txn.csv",
+                   "2024-02-25_ynab.csv", "2024-13-25_txn.csv", "balance.csv", "2024-05-25_txn.json"]
+
+
+def _write_files(directory: Path, names: list):
+    for _name in names:
+        Path.joinpath(directory, _name).write_text("")
+
+
+def _age_directory(directory: Path):
+    """Set the directory modification time well in the past, so its index is trusted"""
+    _mtime = os.stat(directory).st_mtime - 60
+    os.utime(directory, (_mtime, _mtime))
+
+
+def _names(files: list) -> list:
+    return [_file.name for _file in files]
+
+
+def test_statement_files_are_found_in_any_case(tmp_path):
+    _write_files(tmp_path, STATEMENT_FILES)
+
+    _index = DirectoryIndex(tmp_path)
+
+    assert _names(_index.statement_files(["txn"])) == ["2024-01-25_txn.CSV", "2024-02-25_txn.csv",
+                                                       "2024-03-25_TXN.csv", "2024-04-25_txn.csv"]
+    assert _names(_index.statement_files(["TXN", "ynab"])) == ["2024-01-25_txn.CSV", "2024-02-25_txn.csv",
+                                                               "2024-02-25_ynab.csv", "2024-03-25_TXN.csv",
+                                                               "2024-04-25_txn.csv"]
+    # invalid dates are not statements, other extensions are not indexed
+    assert _index.suffixes == ["txn", "ynab"]
+    assert "2024-05-25_txn.json" not in _names(_index.files)
+    assert _names(DirectoryIndex(tmp_path, extension="JSON").files) == ["2024-05-25_txn.json"]
+
+
+def test_statement_files_are_limited_to_the_date_range(tmp_path):
+    _write_files(tmp_path, STATEMENT_FILES)
+
+    _index = DirectoryIndex(tmp_path)
+
+    assert _names(_index.statement_files(["txn"], start_date="2024-02-25", end_date="2024-03-25")) == [
+        "2024-02-25_txn.csv", "2024-03-25_TXN.csv"]
+    _files = _index.statement_files(["txn"], start_date="2024-02-26")
+    assert _names(_files) == ["2024-03-25_TXN.csv", "2024-04-25_txn.csv"]
+    assert _names(_index.statement_files(["txn"], end_date="2024-02-24")) == ["2024-01-25_txn.CSV"]
+    assert _index.statement_files(["txn"], start_date="2024-04-26") == []
+    assert _names(get_files_list(tmp_path, suffix=["txn"], start_date="2024-03-01", end_date="2024-12-31")) == [
+        "2024-03-25_TXN.csv", "2024-04-25_txn.csv"]
+
+
+def test_index_is_reused_until_a_file_is_added(tmp_path):
+    _write_files(tmp_path, STATEMENT_FILES)
+    _age_directory(tmp_path)
+
+    _index = get_directory_index(tmp_path)
+    assert get_directory_index(tmp_path) is _index
+
+    _write_files(tmp_path, ["2024-05-25_txn.csv"])
+
+    _rescanned = get_directory_index(tmp_path)
+    assert _rescanned is not _index
+    _files = _rescanned.statement_files(["txn"], start_date="2024-04-01")
+    assert _names(_files) == ["2024-04-25_txn.csv", "2024-05-25_txn.csv"]
+    assert _names(get_files_list(tmp_path, starts_with="2024-05")) == ["2024-05-25_txn.csv"]
+
+
+def test_index_is_rescanned_after_a_file_is_removed(tmp_path):
+    _write_files(tmp_path, STATEMENT_FILES)
+    _age_directory(tmp_path)
+    assert len(get_directory_index(tmp_path).statement_files(["txn"])) == 4
+
+    Path.joinpath(tmp_path, "2024-01-25_txn.CSV").unlink()
+
+    assert _names(get_files_list(tmp_path, suffix=["txn"], end_date="2024-02-25")) == ["2024-02-25_txn.csv"]
@@ -0,0 +1,124 @@
+import pandas as pd
+import pytest
+
+from pathlib import Path
+
+from generate_final_from_ynab import reconcile_amount_bank, combine_txn_files, validate_master_txn_file
+from utilities import BalanceCheckpoint
+
+
+def _df_balance() -> pd.DataFrame:
+    return pd.DataFrame({
+        "statement_date": pd.to_datetime(["2023-01-25", "2023-02-25"]),
+        "opening_balance": [100.0, 90.0],
+        "closing_balance": [90.0, 70.0],
+    })
+
+
+def _df_txn(dates: list) -> pd.DataFrame:
+    """Opening balance, a transaction on each of the dates and one after the last statement"""
+    return pd.DataFrame({
+        "account": "HSBC DC",
+        "transaction_date": pd.to_datetime(["2023-01-01"] + dates + ["2023-03-01"]),
+        "payee": ["Opening balance", "SHOP", "LANDLORD", "CAFE", "BAKERY"],
+        "amount": [100.0, -10.0, -15.0, -5.0, -1.0],
+    })
+
+
+def test_checkpoint_detects_transaction_moved_between_reconciled_periods(tmp_path):
+    with BalanceCheckpoint(tmp_path) as _checkpoint:
+        _status, _ = reconcile_amount_bank(df_in=_df_txn(["2023-01-10", "2023-02-10", "2023-02-20"]),
+                                           df_balance=_df_balance(), checkpoint=_checkpoint, account="test")
+        assert _status
+        assert _checkpoint.get("test")["statement_date"] == pd.Timestamp("2023-02-25")
+
+        # same number and total of transactions up to the checkpoint, the first period no longer reconciles
+        _status, _df_mismatch = reconcile_amount_bank(df_in=_df_txn(["2023-02-05", "2023-02-10", "2023-02-20"]),
+                                                      df_balance=_df_balance(), checkpoint=_checkpoint,
+                                                      account="test")
+    assert not _status
+    assert not _df_mismatch.empty
+
+
+FACT_COLUMNS = "account,transaction_date,payee,master_category,subcategory,memo,amount\n"
+
+CATEGORY_CSV = """master_category,subcategory,category,enabled
+Income,Salary,Income: Salary,1
+Monthly,Groceries,Monthly: Groceries,1
+"""
+
+# each account reconciles with its own balances only
+BALANCES = {
+    "hsbc_dc": ("balance.csv", """statement_date,opening_balance,closing_balance
+2023-12-25,0.0,500.0
+2024-01-25,500.0,470.0
+"""),
+    "hsbc_cc": ("balance_hsbc_cc.csv", """statement_date,opening_balance,closing_balance
+2023-12-25,0.0,-100.0
+2024-01-25,-100.0,-112.5
+"""),
+}
+
+OPENING_ROWS = {
+    "hsbc_dc": "HSBC DC,2023-12-25,Opening balance,Income,Salary,,500.0\n",
+    "hsbc_cc": "HSBC CC,2023-12-25,Opening balance,Income,Salary,,-100.0\n",
+}
+
+STATEMENT_ROWS = {
+    "hsbc_dc": "HSBC DC,2024-01-10,SHOP,Monthly,Groceries,,-30.0\n",
+    "hsbc_cc": "HSBC CC,2024-01-12,SHOP,Monthly,Groceries,,-12.5\n",
+}
+
+
+def _write_accounts(extracts_path: Path, statement_rows: dict = None):
+    """Fact tables, balances and a statement transaction file of the debit and credit card"""
+    Path.joinpath(extracts_path, "dimensions", "category.csv").write_text(CATEGORY_CSV)
+    for _account, (_balance_filename, _balance_csv) in BALANCES.items():
+        Path.joinpath(extracts_path, _balance_filename).write_text(_balance_csv)
+        Path.joinpath(extracts_path, "facts", f"transaction_{_account}.csv").write_text(
+            FACT_COLUMNS + OPENING_ROWS[_account])
+        Path.joinpath(extracts_path, f"2024-01-25_transaction_{_account}.csv").write_text(
+            FACT_COLUMNS + {**STATEMENT_ROWS, **(statement_rows or {})}[_account])
+
+
+def test_accounts_are_combined_with_their_own_balances(extracts_path):
+    _write_accounts(extracts_path)
+
+    combine_txn_files(extracts_path=extracts_path)
+
+    for _account in ["hsbc_dc", "hsbc_cc"]:
+        _df = pd.read_csv(Path.joinpath(extracts_path, f"transaction_{_account}.csv"))
+        assert _df["amount"].sum() == pytest.approx(float(BALANCES[_account][1].split(",")[-1]))
+        assert _df["payee"].tolist() == ["Opening balance", "SHOP"]
+    assert not Path.joinpath(extracts_path, "transaction_error.csv").exists()
+    assert not Path.joinpath(extracts_path, "transaction_error_hsbc_cc.csv").exists()
+
+
+def test_account_which_does_not_reconcile_does_not_block_the_others(extracts_path):
+    _write_accounts(extracts_path, statement_rows={"hsbc_cc": "HSBC CC,2024-01-12,SHOP,Monthly,Groceries,,-13.5\n"})
+
+    with pytest.raises(SystemExit):
+        combine_txn_files(extracts_path=extracts_path)
+
+    assert Path.joinpath(extracts_path, "transaction_hsbc_dc.csv").is_file()
+    assert not Path.joinpath(extracts_path, "transaction_hsbc_cc.csv").exists()
+    assert Path.joinpath(extracts_path, "transaction_error_hsbc_cc.csv").is_file()
+    assert not Path.joinpath(extracts_path, "transaction_error.csv").exists()
+
+
+def test_master_validation_reconciles_each_account_and_reports_the_failing_one(extracts_path):
+    _write_accounts(extracts_path)
+    for _account, _rows in [("hsbc_dc", STATEMENT_ROWS["hsbc_dc"]),
+                            ("hsbc_cc", "HSBC CC,2024-01-12,SHOP,Monthly,Groceries,,-13.5\n")]:
+        Path.joinpath(extracts_path, "facts", f"transaction_{_account}.csv").write_text(
+            FACT_COLUMNS + OPENING_ROWS[_account] + _rows)
+
+    with pytest.raises(SystemExit):
+        validate_master_txn_file(extracts_path=extracts_path)
+
+    with BalanceCheckpoint(extracts_path) as _checkpoint:
+        # the last statement before the latest transaction
+        assert _checkpoint.get("transaction_hsbc_dc")["statement_date"] == pd.Timestamp("2023-12-25")
+        assert _checkpoint.get("transaction_hsbc_cc") is None
+    assert Path.joinpath(extracts_path, "transaction_error_hsbc_cc.csv").is_file()
+    assert not Path.joinpath(extracts_path, "transaction_error.csv").exists()
@@ -0,0 +1,127 @@
+import pandas as pd
+import pytest
+
+from pathlib import Path
+
+import generate_powerbi_files
+
+CATEGORY_CSV = """master_category,subcategory,category,enabled
+Monthly,Groceries,Monthly: Groceries,1
+Monthly,Rent,Monthly: Rent,1
+Annual,Insurance,Annual: Insurance,1
+"""
+
+BUDGET_CSV = """category,start,end,amount
+Monthly: Groceries,190001,999912,300
+Monthly: Rent,202302,999912,1000
+Annual: Insurance,202303,202305,-1
+Annual: Insurance,202306,202312,0
+"""
+
+
+def _write_extracts(extracts_path: Path):
+    Path.joinpath(extracts_path, "dimensions", "category.csv").write_text(CATEGORY_CSV)
+    Path.joinpath(extracts_path, "dimensions", "budget.csv").write_text(BUDGET_CSV)
+    _rows = []
+    for _day in range(1, 28, 3):
+        for _month in range(1, 7):
+            _rows.append(["HSBC DC", f"2023-{_month:02d}-{_day:02d}", f"SHOP {_day}", "Monthly", "Groceries", "",
+                          -round(_day * 1.1 + _month * 0.7, 2)])
+        _rows.append(["HSBC DC", f"2023-04-{_day:02d}", "LANDLORD", "Monthly", "Rent", "", -333.33])
+        _rows.append(["HSBC DC", f"2023-03-{_day:02d}", "INSURER", "Annual", "Insurance", "", -0.1])
+    _columns = ["account", "transaction_date", "payee", "master_category", "subcategory", "memo", "amount"]
+    pd.DataFrame(_rows, columns=_columns).to_csv(_fact_path(extracts_path, "hsbc_dc"), index=False)
+    pd.DataFrame([["Cash", "2023-02-14", "CAFE", "Monthly", "Groceries", "", -4.5]],
+                 columns=_columns).to_csv(_fact_path(extracts_path, "cash"), index=False)
+
+
+def _fact_path(extracts_path: Path, account: str) -> Path:
+    return Path.joinpath(extracts_path, "facts", f"transaction_{account}.csv")
+
+
+def _read_powerbi(extracts_path: Path) -> dict:
+    return {_path.name: _path.read_bytes() for _path in sorted(Path.joinpath(extracts_path, "powerbi").iterdir())}
+
+
+def _build(full_rebuild: bool = False):
+    generate_powerbi_files.main({"max_year": 2023, "full_rebuild": full_rebuild})
+
+
+def test_incremental_build_equals_full_rebuild_after_account_change(extracts_path):
+    _write_extracts(extracts_path)
+    _build()
+
+    # move one row to another account, its category, month and amount are unchanged
+    _df_dc = pd.read_csv(_fact_path(extracts_path, "hsbc_dc"), keep_default_na=False)
+    _df_cash = pd.read_csv(_fact_path(extracts_path, "cash"), keep_default_na=False)
+    _moved = _df_dc["transaction_date"] == "2023-04-04"
+    pd.concat([_df_cash, _df_dc.loc[_moved].assign(account="Cash")]).to_csv(
+        _fact_path(extracts_path, "cash"), index=False)
+    _df_dc.loc[~_moved].to_csv(_fact_path(extracts_path, "hsbc_dc"), index=False)
+    _build()
+    _incremental = _read_powerbi(extracts_path)
+
+    _build(full_rebuild=True)
+    assert _read_powerbi(extracts_path) == _incremental
+    _df_account = pd.read_csv(Path.joinpath(extracts_path, "powerbi", "transaction_account_monthly_total.csv"))
+    assert ((_df_account["account"] == "Cash") & (_df_account["year_month"] == 202304)).any()
+
+
+def test_category_keys_survive_inserted_category(extracts_path):
+    _write_extracts(extracts_path)
+    _keys = generate_powerbi_files.generate_category_file().set_index("category")["category_key"]
+
+    _lines = CATEGORY_CSV.splitlines()
+    Path.joinpath(extracts_path, "dimensions", "category.csv").write_text(
+        "\n".join(_lines[:1] + ["Annual,Travel,Annual: Travel,1"] + _lines[1:]) + "\n")
+    _df_category = generate_powerbi_files.generate_category_file()
+
+    assert _df_category.set_index("category")["category_key"].reindex(_keys.index).tolist() == _keys.tolist()
+    assert _df_category.loc[_df_category["category"] == "Annual: Travel", "category_key"].tolist() == [4]
+
+
+def test_duplicate_category_is_rejected(extracts_path):
+    Path.joinpath(extracts_path, "dimensions", "category.csv").write_text(
+        CATEGORY_CSV + "Monthly,Rent,Monthly: Rent,1\n")
+    with pytest.raises(ValueError, match="Monthly: Rent"):
+        generate_powerbi_files.generate_category_file()
+
+
+@pytest.mark.parametrize("exact_money", ["", "1"])
+def test_incremental_build_equals_full_rebuild(extracts_path, monkeypatch, exact_money):
+    monkeypatch.setenv("YNAB_EXACT_MONEY", exact_money)
+    _write_extracts(extracts_path)
+    _build()
+
+    _df_dc = pd.read_csv(_fact_path(extracts_path, "hsbc_dc"), keep_default_na=False)
+    _df_dc.loc[0, "amount"] = -123.45
+    _df_dc.loc[_df_dc["transaction_date"] == "2023-05-07", ["master_category", "subcategory"]] = ["Monthly", "Rent"]
+    _df_dc = _df_dc.loc[~_df_dc["transaction_date"].str.startswith("2023-02")]
+    _df_dc = pd.concat([_df_dc, _df_dc.iloc[:2].assign(transaction_date="2023-07-03")])
+    _df_dc.to_csv(_fact_path(extracts_path, "hsbc_dc"), index=False)
+    _build()
+    _incremental = _read_powerbi(extracts_path)
+
+    _build(full_rebuild=True)
+    assert _read_powerbi(extracts_path) == _incremental
+
+
+def test_budget_values_expand_every_month_of_each_interval(extracts_path):
+    _write_extracts(extracts_path)
+    _df_category = generate_powerbi_files.generate_category_file()
+    _df_budget = generate_powerbi_files.generate_budget_values(min_year=2022, max_year=2023, df_category=_df_category)
+
+    _rows = []
+    for _interval in pd.read_csv(Path.joinpath(extracts_path, "dimensions", "budget.csv")).itertuples():
+        if _interval.amount == 0:
+            continue
+        _start = 202201 if _interval.start == 190001 else _interval.start
+        _end = 202312 if _interval.end == 999912 else _interval.end
+        for _period in pd.period_range(pd.Period(str(_start), "M"), pd.Period(str(_end), "M"), freq="M"):
+            _year_month = _period.year * 100 + _period.month
+            _rows.append([_interval.category, _year_month, f"{_interval.category}-{_year_month}", _interval.amount])
+    _df_expected = pd.DataFrame(_rows, columns=["category", "year_month", "category_year_month", "budget_amount"])
+
+    pd.testing.assert_frame_equal(_df_budget.drop(columns=["category_key"]), _df_expected, check_dtype=False)
+    assert _df_budget["category_key"].tolist() == \
+        _df_budget["category"].map(_df_category.set_index("category")["category_key"]).tolist()
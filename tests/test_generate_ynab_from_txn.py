@@ -0,0 +1,33 @@
+import pandas as pd
+
+from pathlib import Path
+
+from generate_ynab_from_txn import process_txn_file, stream_txn_file
+from utilities import BalanceIndex, write_df
+
+TXN_CSV = """14/01/2023,SHOP 1,-1.50
+03/01/2023,SHOP 2,-2.25
+14/01/2023,"SHOP 3, LONDON",-3.00
+03/01/2023,SALARY,"1,000.00"
+20/01/2023,SHOP 4,-4.10
+14/01/2023,SHOP 5,-5.00
+01/01/2023,SHOP 6,-6.60
+"""
+
+
+def test_streamed_processed_file_is_sorted_as_in_memory(tmp_path):
+    _txn_file = Path.joinpath(tmp_path, "2023-01-25_txn.csv")
+    _txn_file.write_text(TXN_CSV)
+    _balance_index = BalanceIndex(pd.DataFrame({
+        "statement_date": pd.to_datetime(["2023-01-25"]),
+        "opening_balance": [100.0],
+        "closing_balance": [1077.55],
+    }))
+
+    _in_memory_path = Path.joinpath(tmp_path, "in_memory.csv")
+    write_df(df_in=process_txn_file(_txn_file, balance_index=_balance_index), path=str(_in_memory_path))
+    assert stream_txn_file(_txn_file, balance_index=_balance_index, chunksize=2) == 7
+
+    assert Path.joinpath(tmp_path, "2023-01-25_processed.csv").read_bytes() == _in_memory_path.read_bytes()
+    _names = sorted(_path.name for _path in tmp_path.iterdir())
+    assert _names == ["2023-01-25_processed.csv", "2023-01-25_txn.csv", "in_memory.csv"]
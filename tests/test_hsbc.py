@@ -0,0 +1,41 @@
+import pandas as pd
+import pytest
+
+from pathlib import Path
+
+from utilities import read_hsbc_txn, HsbcParseError
+
+TXN_CSV = """25/01/2023,SHOP 1,-1.50
+24/01/2023,"SHOP 2, LONDON","1,234.56"
+31/02/2023,SHOP 3,-3.00
+
+24/01/2023,SHOP 4,abc
+23/01/2023,SHOP 5,-5.00
+"""
+
+
+def test_malformed_rows_are_reported_with_line_numbers(tmp_path):
+    _txn_file = Path.joinpath(tmp_path, "2023-01-25_txn.csv")
+    _txn_file.write_text(TXN_CSV)
+    with pytest.raises(HsbcParseError) as _info:
+        read_hsbc_txn(_txn_file)
+    assert _info.value.line_numbers == [3, 5]
+    assert "line(s): 3, 5" in str(_info.value)
+
+
+def test_malformed_rows_are_reported_with_line_numbers_when_streamed(tmp_path):
+    _txn_file = Path.joinpath(tmp_path, "2023-01-25_txn.csv")
+    _txn_file.write_text(TXN_CSV)
+    _chunks = read_hsbc_txn(_txn_file, chunksize=4)
+    with pytest.raises(HsbcParseError) as _info:
+        list(_chunks)
+    assert _info.value.line_numbers == [3]
+
+
+def test_rows_are_typed_and_blank_lines_skipped(tmp_path):
+    _txn_file = Path.joinpath(tmp_path, "2023-01-25_txn.csv")
+    _txn_file.write_text("\n".join(_line for _index, _line in enumerate(TXN_CSV.splitlines()) if _index not in [2, 4]))
+    _df = read_hsbc_txn(_txn_file)
+    assert _df["date"].tolist() == list(pd.to_datetime(["2023-01-25", "2023-01-24", "2023-01-23"]))
+    assert _df["payee"].tolist() == ["SHOP 1", "SHOP 2, LONDON", "SHOP 5"]
+    assert _df["amount"].tolist() == [-1.5, 1234.56, -5.0]
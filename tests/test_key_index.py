@@ -0,0 +1,50 @@
+import pandas as pd
+
+from pathlib import Path
+
+from utilities import FactKeyIndex
+
+
+def _df_txn(rows: list) -> pd.DataFrame:
+    return pd.DataFrame(rows, columns=["transaction_date", "payee", "amount"])
+
+
+def _write(df_in: pd.DataFrame, path: Path):
+    df_in.to_csv(path, index=False)
+
+
+def test_duplicate_keys_are_counted(tmp_path):
+    _fact_path = Path.joinpath(tmp_path, "transaction_test.csv")
+    _df_fact = _df_txn([["2023-01-03", "CAFE", -2.5], ["2023-01-03", "CAFE", -2.5], ["2023-01-04", "SHOP", -1.0]])
+    _write(_df_fact, _fact_path)
+    # the same coffee three times on a day, two are in the fact table already
+    _df_statement = _df_txn([["2023-01-03", "CAFE", -2.5], ["2023-01-03", "CAFE", -2.5],
+                             ["2023-01-03", "CAFE", -2.5], ["2023-01-04", "SHOP", -1.0], ["2023-01-05", "BAR", -3.0]])
+
+    with FactKeyIndex(tmp_path, "transaction_test") as _index:
+        _index.sync(_fact_path, _df_fact)
+        _df_new = _index.new_rows(_df_statement)
+        assert _df_new.index.tolist() == [2, 4]
+
+        _index.add(_df_new)
+        _write(pd.concat([_df_fact, _df_new]), _fact_path)
+        _index.commit(_fact_path)
+        assert _index.new_rows(_df_statement).empty
+
+    with FactKeyIndex(tmp_path, "transaction_test") as _index:
+        _index.sync(_fact_path, pd.read_csv(_fact_path))
+        assert _index.new_rows(_df_statement).empty
+
+
+def test_index_is_rebuilt_when_fact_file_is_edited(tmp_path):
+    _fact_path = Path.joinpath(tmp_path, "transaction_test.csv")
+    _df_fact = _df_txn([["2023-01-03", "CAFE", -2.5], ["2023-01-03", "CAFE", -2.5]])
+    _write(_df_fact, _fact_path)
+    with FactKeyIndex(tmp_path, "transaction_test") as _index:
+        _index.sync(_fact_path, _df_fact)
+
+    # one of the duplicates removed by hand
+    _write(_df_fact.iloc[:1], _fact_path)
+    with FactKeyIndex(tmp_path, "transaction_test") as _index:
+        _index.sync(_fact_path, pd.read_csv(_fact_path))
+        assert _index.new_rows(_df_fact).index.tolist() == [1]
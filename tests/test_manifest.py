@@ -0,0 +1,116 @@
+import sqlite3
+
+import pytest
+
+from pathlib import Path
+
+import generate_ynab_from_txn
+from utilities import RunManifest, FactKeyIndex, BalanceCheckpoint, AggregateState, CategoryKeyStore
+from utilities.manifest import MANIFEST_FILENAME
+
+
+@pytest.fixture
+def statement(tmp_path):
+    """Input, dimension and output files of one statement, with the statement run recorded"""
+    _files = {_name: Path.joinpath(tmp_path, _name) for _name in ["2024-01-25_txn.csv", "payee_mapping.csv",
+                                                                  "2024-01-25_ynab.csv"]}
+    _files["2024-01-25_txn.csv"].write_text("25/01/2024,SHOP,-1.00\n")
+    _files["payee_mapping.csv"].write_text("original_payee,friendly_name\nSHOP,Shop\n")
+    _files["2024-01-25_ynab.csv"].write_text("Date,Payee,Category\n2024-01-25,Shop,\n")
+    with RunManifest(tmp_path) as _manifest:
+        _manifest.record(stage="ynab", statement_date="2024-01-25", inputs=[_files["2024-01-25_txn.csv"]],
+                         dimensions=[_files["payee_mapping.csv"], "v1"], outputs=[_files["2024-01-25_ynab.csv"]])
+    return _files
+
+
+def _plan(extracts_path: Path, files: dict, **kwargs) -> (bool, str):
+    _kwargs = {"inputs": [files["2024-01-25_txn.csv"]], "dimensions": [files["payee_mapping.csv"], "v1"],
+               "outputs": [files["2024-01-25_ynab.csv"]], **kwargs}
+    with RunManifest(extracts_path) as _manifest:
+        return _manifest.plan(stage="ynab", statement_date="2024-01-25", **_kwargs)
+
+
+def test_recorded_statement_is_up_to_date(tmp_path, statement):
+    assert _plan(tmp_path, statement) == (False, "up to date")
+    # the recorded outputs are checked when none are supplied
+    assert _plan(tmp_path, statement, outputs=None) == (False, "up to date")
+
+
+def test_changed_input_reruns_statement(tmp_path, statement):
+    statement["2024-01-25_txn.csv"].write_text("25/01/2024,SHOP,-1.00\n24/01/2024,CAFE,-2.50\n")
+    assert _plan(tmp_path, statement) == (True, "inputs changed")
+
+
+def test_changed_dimension_reruns_statement(tmp_path, statement):
+    statement["payee_mapping.csv"].write_text("original_payee,friendly_name\nSHOP,Corner shop\n")
+    assert _plan(tmp_path, statement) == (True, "dimensions changed")
+    # dimension values count as dimensions too
+    assert _plan(tmp_path, statement, dimensions=[statement["payee_mapping.csv"], "v2"]) == (
+        True, "dimensions changed")
+
+
+def test_missing_output_reruns_statement(tmp_path, statement):
+    statement["2024-01-25_ynab.csv"].unlink()
+    assert _plan(tmp_path, statement) == (True, "output 2024-01-25_ynab.csv missing")
+    assert _plan(tmp_path, statement, outputs=None) == (True, "output 2024-01-25_ynab.csv missing")
+
+
+def test_edited_output_is_kept_unless_forced(tmp_path, statement):
+    statement["2024-01-25_ynab.csv"].write_text("Date,Payee,Category\n2024-01-25,Shop,Monthly: Groceries\n")
+    # edited outputs are not a reason to rerun on their own
+    assert _plan(tmp_path, statement) == (False, "up to date")
+
+    statement["2024-01-25_txn.csv"].write_text("25/01/2024,SHOP,-1.50\n")
+    _rerun, _reason = _plan(tmp_path, statement)
+    assert not _rerun
+    assert _reason == "inputs changed but 2024-01-25_ynab.csv was edited, use --force to rerun"
+    assert _plan(tmp_path, statement, force=True) == (True, "forced")
+
+
+def test_existing_output_is_adopted_unless_dry_run(tmp_path, statement):
+    _kwargs = {"statement_date": "2024-02-25", "inputs": [statement["2024-01-25_txn.csv"]],
+               "outputs": [statement["2024-01-25_ynab.csv"]]}
+    with RunManifest(tmp_path) as _manifest:
+        assert _manifest.plan(stage="processed", adopt=False, **_kwargs) == (
+            False, "output exists, adopted into manifest")
+    with RunManifest(tmp_path) as _manifest:
+        # not recorded by the dry run, adopted by the real run
+        assert _manifest.plan(stage="processed", **_kwargs) == (False, "output exists, adopted into manifest")
+    with RunManifest(tmp_path) as _manifest:
+        assert _manifest.plan(stage="processed", **_kwargs) == (False, "up to date")
+
+
+def test_new_statement_without_outputs_is_run(tmp_path, statement):
+    with RunManifest(tmp_path) as _manifest:
+        assert _manifest.plan(stage="ynab", statement_date="2024-02-25", inputs=[statement["2024-01-25_txn.csv"]],
+                              outputs=[Path.joinpath(tmp_path, "2024-02-25_ynab.csv")]) == (True, "new statement")
+
+
+def test_dry_run_writes_no_files_and_records_nothing(extracts_path):
+    Path.joinpath(extracts_path, "balance.csv").write_text(
+        "statement_date,opening_balance,closing_balance\n2024-01-25,10.0,9.0\n")
+    Path.joinpath(extracts_path, "2024-01-25_txn.csv").write_text("25/01/2024,SHOP,-1.00\n")
+    # processed file of an earlier run, before the manifest existed
+    Path.joinpath(extracts_path, "2024-01-25_processed.csv").write_text("date,payee,amount\n2024-01-25,SHOP,-1.0\n")
+    _files = sorted(_path.name for _path in extracts_path.iterdir())
+
+    generate_ynab_from_txn.main({"dry_run": True})
+
+    assert sorted(_path.name for _path in extracts_path.iterdir() if _path.name != MANIFEST_FILENAME) == _files
+    with sqlite3.connect(str(Path.joinpath(extracts_path, MANIFEST_FILENAME))) as _connection:
+        assert _connection.execute("SELECT COUNT(*) FROM statement_run").fetchone() == (0,)
+
+
+def test_stores_keep_their_tables_in_one_manifest(tmp_path):
+    with RunManifest(tmp_path), FactKeyIndex(tmp_path, "transaction_hsbc_dc"), BalanceCheckpoint(tmp_path), \
+            AggregateState(tmp_path):
+        with CategoryKeyStore(tmp_path) as _store:
+            assert _store.assign(["Monthly: Groceries"]) == [1]
+
+    assert [_path.name for _path in tmp_path.iterdir()] == [MANIFEST_FILENAME]
+    with sqlite3.connect(str(Path.joinpath(tmp_path, MANIFEST_FILENAME))) as _connection:
+        _tables = [_row[0] for _row in _connection.execute("SELECT name FROM sqlite_master WHERE type = 'table'")]
+        assert sorted(_tables) == ["aggregate_month", "aggregate_state", "balance_checkpoint", "category_key",
+                                   "fact_key", "fact_key_state", "file_hash", "statement_run"]
+        assert _connection.execute("SELECT category, category_key FROM category_key").fetchall() == [
+            ("Monthly: Groceries", 1)]
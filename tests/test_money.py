@@ -0,0 +1,48 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from pathlib import Path
+
+from utilities import to_money, read_fact_csv, normalise_zero, MissingAmountError
+
+
+@pytest.fixture
+def exact_money(monkeypatch):
+    monkeypatch.setenv("YNAB_EXACT_MONEY", "1")
+
+
+def test_amounts_are_held_in_pence(exact_money):
+    assert to_money(pd.Series([1.005, -2.5, 0.1 + 0.2])).tolist() == [100, -250, 30]
+    assert to_money(12.34) == 1234
+
+
+def test_missing_amounts_are_rejected(exact_money):
+    with pytest.raises(MissingAmountError, match=r"row\(s\) 1, 3$"):
+        to_money(pd.Series([1.0, np.nan, 2.0, np.nan]))
+    with pytest.raises(MissingAmountError):
+        to_money(float("nan"))
+
+
+def test_missing_amounts_are_kept_without_exact_money(monkeypatch):
+    monkeypatch.delenv("YNAB_EXACT_MONEY", raising=False)
+    assert to_money(pd.Series([1.0, np.nan])).isna().tolist() == [False, True]
+
+
+def test_blank_fact_amount_names_the_file(exact_money, tmp_path):
+    _fact_path = Path.joinpath(tmp_path, "transaction_hsbc_dc.csv")
+    _fact_path.write_text("account,transaction_date,payee,master_category,subcategory,memo,amount\n"
+                          "HSBC DC,2023-01-03,SHOP,Monthly,Groceries,,-1.50\n"
+                          "HSBC DC,2023-01-04,CAFE,Monthly,Groceries,,\n")
+    with pytest.raises(MissingAmountError) as _info:
+        read_fact_csv(_fact_path)
+    assert _info.value.labels == [1]
+    assert str(_fact_path) in str(_info.value)
+
+
+def test_negative_zero_is_normalised():
+    _values = normalise_zero(pd.Series([-0.001, 1.0, -2.5]).round(2))
+    assert np.signbit(_values).tolist() == [False, False, True]
+    assert str(normalise_zero(round(-0.001, 2))) == "0.0"
+    _df = normalise_zero(pd.DataFrame({"amount": [-0.0], "pence": pd.Series([-5], dtype="int64")}))
+    assert _df.to_csv(index=False) == "amount,pence\n0.0,-5\n"
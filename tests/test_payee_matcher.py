@@ -0,0 +1,53 @@
+import random
+
+from utilities import PayeeMatcher
+
+PAYEE_MAPPINGS = [
+    {"original_payee": "tesco", "friendly_name": "Tesco"},
+    {"original_payee": "TESCO STORES", "friendly_name": "Tesco Stores"},
+    {"original_payee": "tfl", "friendly_name": "TfL"},
+    {"original_payee": "tfl travel", "friendly_name": "Unmapped"},
+    {"original_payee": "esco", "friendly_name": "Esco"},
+    {"original_payee": "amazon", "friendly_name": "Amazon"},
+    {"original_payee": "amazon prime", "friendly_name": "Tesco"},
+]
+
+CATEGORY_MAPPINGS = [
+    {"payee": "Tesco", "category": "Monthly: Groceries"},
+    {"payee": "TfL", "category": "Monthly: Travel"},
+    {"payee": "Amazon", "category": "Monthly: Shopping"},
+    {"payee": "Tesco", "category": "Monthly: Food"},
+]
+
+
+def _loop_match(original_payee: str, payee_mappings: list, category_mappings: list) -> (str, str):
+    """Per-row scan PayeeMatcher replaced"""
+    friendly_name = original_payee
+    category = ""
+    for payee_mapping in payee_mappings:
+        if str(payee_mapping["original_payee"]).lower() in original_payee.lower():
+            friendly_name = payee_mapping["friendly_name"]
+            for category_mapping in category_mappings:
+                if friendly_name == category_mapping["payee"]:
+                    category = category_mapping["category"]
+    return friendly_name, category
+
+
+def test_last_matching_mapping_wins():
+    _matcher = PayeeMatcher(PAYEE_MAPPINGS, CATEGORY_MAPPINGS)
+    # esco is the last pattern contained in the payee, it has no category so the one of Tesco is kept
+    assert _matcher.match("TESCO STORES 1234") == ("Esco", "Monthly: Food")
+    assert _matcher.match("TESCO EXPRESS") == ("Esco", "Monthly: Food")
+    assert _matcher.match("TFL TRAVEL CH") == ("Unmapped", "Monthly: Travel")
+    assert _matcher.match("AMAZON PRIME UK") == ("Tesco", "Monthly: Food")
+    assert _matcher.match("CORNER SHOP") == ("CORNER SHOP", "")
+
+
+def test_matches_per_row_scan():
+    _random = random.Random(0)
+    _words = ["tesco", "stores", "tfl", "travel", "esco", "amazon", "prime", "uk", "ltd", "t", "s"]
+    _payee_mappings = PAYEE_MAPPINGS + [{"original_payee": "", "friendly_name": "Everything"}] + PAYEE_MAPPINGS[:2]
+    _matcher = PayeeMatcher(_payee_mappings, CATEGORY_MAPPINGS)
+    _payees = [" ".join(_random.choice(_words) for _ in range(_random.randint(1, 4))).upper() for _ in range(500)]
+    assert _matcher.match_all(_payees) == [_loop_match(_payee, _payee_mappings, CATEGORY_MAPPINGS)
+                                           for _payee in _payees]
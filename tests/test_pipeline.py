@@ -0,0 +1,84 @@
+from graphlib import CycleError
+
+import pytest
+
+from utilities import run_stage_graph
+
+
+def _stages(calls: list) -> dict:
+    """Stages which record the order they run in and return the names of the results they were given"""
+    def _stage(name: str):
+        def _run(results: dict, options: dict) -> list:
+            calls.append(name)
+            return sorted(results)
+        return _run
+
+    return {
+        "extract": ([], _stage("extract")),
+        "dimension": ([], _stage("dimension")),
+        "transform": (["extract"], _stage("transform")),
+        "load": (["transform", "dimension"], _stage("load")),
+        "report": (["load"], _stage("report")),
+        "archive": (["extract"], _stage("archive")),
+    }
+
+
+def test_all_stages_run_after_their_dependencies():
+    _calls = []
+    _results = run_stage_graph(_stages(_calls), options={})
+
+    assert sorted(_calls) == ["archive", "dimension", "extract", "load", "report", "transform"]
+    for _before, _after in [("extract", "transform"), ("transform", "load"), ("dimension", "load"),
+                            ("load", "report"), ("extract", "archive")]:
+        assert _calls.index(_before) < _calls.index(_after)
+    assert set(_results["load"]) >= {"extract", "dimension", "transform"}
+
+
+def test_until_runs_only_the_stages_it_depends_on():
+    _calls = []
+    _results = run_stage_graph(_stages(_calls), options={}, until="load")
+
+    assert sorted(_calls) == ["dimension", "extract", "load", "transform"]
+    assert _calls.index("extract") < _calls.index("transform") < _calls.index("load")
+    assert sorted(_results) == ["dimension", "extract", "load", "transform"]
+    assert _results["load"] == ["dimension", "extract", "transform"]
+
+
+def test_until_first_stage_runs_it_alone():
+    _calls = []
+    run_stage_graph(_stages(_calls), options={}, until="extract")
+    assert _calls == ["extract"]
+
+
+def test_options_are_passed_to_every_stage():
+    _seen = []
+    _stages_options = {
+        "first": ([], lambda results, options: _seen.append(options["workers"])),
+        "second": (["first"], lambda results, options: _seen.append(options["workers"])),
+    }
+    run_stage_graph(_stages_options, options={"workers": 3})
+    assert _seen == [3, 3]
+
+
+def test_unknown_dependency_is_rejected_before_any_stage_runs():
+    _calls = []
+    _stages_unknown = {**_stages(_calls), "publish": (["report", "upload"], lambda results, options: None)}
+    with pytest.raises(ValueError, match="stage publish depends on unknown stage"):
+        run_stage_graph(_stages_unknown, options={})
+    assert _calls == []
+
+
+def test_unknown_until_is_rejected():
+    _calls = []
+    with pytest.raises(ValueError, match="unknown stage upload"):
+        run_stage_graph(_stages(_calls), options={}, until="upload")
+    assert _calls == []
+
+
+def test_cycle_is_rejected_before_any_stage_runs():
+    _calls = []
+    _stages_cycle = _stages(_calls)
+    _stages_cycle["extract"] = (["report"], _stages_cycle["extract"][1])
+    with pytest.raises(CycleError):
+        run_stage_graph(_stages_cycle, options={})
+    assert _calls == []
@@ -0,0 +1,162 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from utilities import reconcile_statements, localize_mismatch, to_money
+
+
+def _per_statement(df_txn: pd.DataFrame, df_balance: pd.DataFrame) -> list:
+    """Balance after the last transaction on or before each statement, statement by statement"""
+    _max_txn_date = df_txn["transaction_date"].max()
+    _covering = df_balance.loc[df_balance["statement_date"] >= _max_txn_date, "statement_date"]
+    _max_date = _covering.min() if not _covering.empty else _max_txn_date
+    _results = []
+    for _row in df_balance.loc[df_balance["statement_date"] <= _max_date].itertuples():
+        _upto = df_txn["transaction_date"] <= _row.statement_date
+        _actual = round(df_txn.loc[_upto, "amount"].sum(), 2) if _upto.any() else np.nan
+        _results.append((_row.statement_date, _actual, round(_row.closing_balance, 2) == _actual))
+    return _results
+
+
+def test_matches_per_statement_reconciliation():
+    _random = np.random.default_rng(0)
+    _dates = pd.to_datetime("2023-01-01") + pd.to_timedelta(_random.integers(0, 180, 400), unit="D")
+    _df_txn = pd.DataFrame({
+        "transaction_date": _dates,
+        "amount": _random.integers(-5000, 5000, 400) / 100,
+    })
+    _statement_dates = pd.date_range("2022-12-25", "2023-09-25", freq="MS") + pd.Timedelta(days=24)
+    _closing = [round(_df_txn.loc[_df_txn["transaction_date"] <= _date, "amount"].sum(), 2)
+                for _date in _statement_dates]
+    # statements 3 and 5 do not reconcile
+    _closing[3] += 1.0
+    _closing[5] -= 0.01
+    _df_balance = pd.DataFrame({
+        "statement_date": _statement_dates,
+        "opening_balance": [0.0] + _closing[:-1],
+        "closing_balance": _closing,
+    })
+
+    _df_report = reconcile_statements(df_txn=_df_txn.sample(frac=1, random_state=1), df_balance=_df_balance)
+
+    _expected = _per_statement(_df_txn, _df_balance)
+    assert _df_report["statement_date"].tolist() == [_statement_date for _statement_date, _, _ in _expected]
+    assert _df_report["match"].tolist() == [_match for _, _, _match in _expected]
+    np.testing.assert_array_equal(_df_report["actual_balance"].round(2).to_numpy(),
+                                  np.array([_actual for _, _actual, _ in _expected]))
+    assert (~_df_report["match"]).sum() == 2
+
+
+def _df_diagnosis_balance() -> pd.DataFrame:
+    return pd.DataFrame({
+        "statement_date": pd.to_datetime(["2023-01-25", "2023-02-25", "2023-03-25"]),
+        "opening_balance": [0.0, 950.0, 1621.0],
+        "closing_balance": [950.0, 1621.0, 1611.0],
+    })
+
+
+def _df_diagnosis_txn(rows: list = None) -> pd.DataFrame:
+    """Transactions which reconcile with _df_diagnosis_balance, with rows added or replaced by payee"""
+    _rows = {
+        "Opening balance": ("2023-01-01", 1000.0),
+        "GARAGE": ("2023-01-15", -50.0),
+        "BAKERY": ("2023-02-03", -4.5),
+        "LANDLORD": ("2023-02-03", -300.0),
+        "CAFE": ("2023-02-10", -4.5),
+        "SHOP": ("2023-02-15", -20.0),
+        "SALARY": ("2023-02-20", 1000.0),
+        "BUTCHER": ("2023-03-05", -10.0),
+    }
+    _extra = []
+    for _payee, _date, _amount in rows or []:
+        if _payee in _rows and _date is None:
+            _rows[_payee] = (_rows[_payee][0], _amount)
+        else:
+            _extra.append((_payee, _date, _amount))
+    _records = [(_payee, _date, _amount) for _payee, (_date, _amount) in _rows.items()] + _extra
+    return pd.DataFrame({
+        "account": "HSBC DC",
+        "transaction_date": pd.to_datetime([_date for _, _date, _ in _records]),
+        "payee": [_payee for _payee, _, _ in _records],
+        "amount": to_money(pd.Series([_amount for _, _, _amount in _records])),
+    })
+
+
+@pytest.fixture(params=[False, True], ids=["float", "exact"])
+def money_mode(request, monkeypatch):
+    if request.param:
+        monkeypatch.setenv("YNAB_EXACT_MONEY", "1")
+    else:
+        monkeypatch.delenv("YNAB_EXACT_MONEY", raising=False)
+
+
+def _candidates(diagnosis: dict) -> list:
+    return [(str(_row.transaction_date.date()), _row.payee, _row.explanation)
+            for _row in diagnosis["candidates"].itertuples()]
+
+
+def test_reconciled_transactions_have_no_diverging_period(money_mode):
+    _diagnosis = localize_mismatch(df_txn=_df_diagnosis_txn(), df_balance=_df_diagnosis_balance())
+    assert _diagnosis["periods"]["match"].tolist() == [True, True, True]
+    assert _diagnosis["first_period"] is None
+    assert _diagnosis["first_day"] is None
+    assert _diagnosis["candidates"].empty
+
+
+def test_duplicated_row_is_located(money_mode):
+    _df_txn = _df_diagnosis_txn([("CAFE", "2023-02-10", -4.5)])
+
+    _diagnosis = localize_mismatch(df_txn=_df_txn, df_balance=_df_diagnosis_balance())
+
+    # later periods only carry the difference forward
+    assert _diagnosis["periods"]["match"].tolist() == [True, False, True]
+    assert _diagnosis["periods"]["cumulative_difference"].tolist() == [0.0, -4.5, -4.5]
+    assert _diagnosis["first_period"]["statement_date"] == pd.Timestamp("2023-02-25")
+    assert _diagnosis["first_period"]["period_difference"] == -4.5
+    assert _diagnosis["first_day"] == pd.Timestamp("2023-02-10")
+    # duplicates first, then the other row of the same amount, then the rest by residual
+    assert _candidates(_diagnosis) == [
+        ("2023-02-10", "CAFE", "extra or duplicated row"),
+        ("2023-02-10", "CAFE", "extra or duplicated row"),
+        ("2023-02-03", "BAKERY", "extra or duplicated row"),
+        ("2023-02-15", "SHOP", "nearest amount"),
+        ("2023-02-03", "LANDLORD", "nearest amount"),
+        ("2023-02-20", "SALARY", "nearest amount"),
+    ]
+    assert _diagnosis["candidates"]["duplicate"].tolist() == [True, True, False, False, False, False]
+    assert _diagnosis["candidates"]["rank"].tolist() == [1, 2, 3, 4, 5, 6]
+
+
+def test_reversed_sign_is_located(money_mode):
+    _df_txn = _df_diagnosis_txn([("LANDLORD", None, 300.0)])
+
+    _diagnosis = localize_mismatch(df_txn=_df_txn, df_balance=_df_diagnosis_balance())
+
+    assert _diagnosis["first_period"]["statement_date"] == pd.Timestamp("2023-02-25")
+    assert _diagnosis["first_period"]["period_difference"] == 600.0
+    assert _diagnosis["first_day"] == pd.Timestamp("2023-02-03")
+    assert _candidates(_diagnosis) == [
+        ("2023-02-03", "LANDLORD", "sign reversed"),
+        ("2023-02-20", "SALARY", "nearest amount"),
+        ("2023-02-03", "BAKERY", "nearest amount"),
+        ("2023-02-10", "CAFE", "nearest amount"),
+        ("2023-02-15", "SHOP", "nearest amount"),
+    ]
+    assert _diagnosis["candidates"]["residual"].tolist() == [0.0, -400.0, 604.5, 604.5, 620.0]
+
+
+def test_wrong_amount_falls_back_to_nearest_amount(money_mode):
+    _df_txn = _df_diagnosis_txn([("SHOP", None, -27.3)])
+
+    _diagnosis = localize_mismatch(df_txn=_df_txn, df_balance=_df_diagnosis_balance(), limit=3)
+
+    assert _diagnosis["first_period"]["statement_date"] == pd.Timestamp("2023-02-25")
+    assert _diagnosis["first_period"]["period_difference"] == -7.3
+    # no row explains the difference, the day is not known
+    assert _diagnosis["first_day"] is None
+    assert _candidates(_diagnosis) == [
+        ("2023-02-03", "BAKERY", "nearest amount"),
+        ("2023-02-10", "CAFE", "nearest amount"),
+        ("2023-02-15", "SHOP", "nearest amount"),
+    ]
+    assert _diagnosis["candidates"]["residual"].tolist() == [1.7, 1.7, 20.0]
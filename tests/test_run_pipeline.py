@@ -0,0 +1,138 @@
+import shutil
+
+import pytest
+
+from pathlib import Path
+
+import generate_final_from_ynab
+import generate_powerbi_files
+import generate_ynab_from_txn
+import run_pipeline
+import utilities.scripts
+
+CATEGORY_CSV = """master_category,subcategory,category,enabled
+Monthly,Groceries,Monthly: Groceries,1
+Monthly,Rent,Monthly: Rent,1
+Monthly,Discretionary,Monthly: Discretionary,1
+Income,Salary,Income: Salary,1
+Transfer-out,Cash,Transfer-out: Cash,1
+Transfer-in,HSBC DC,Transfer-in: HSBC DC,1
+"""
+
+PAYEE_MAPPING_CSV = """original_payee,friendly_name
+TESCO,Tesco
+LANDLORD,Landlord
+EMPLOYER,Employer
+CASH,Transfer : Cash
+"""
+
+CATEGORY_MAPPING_CSV = """payee,category
+Tesco,Monthly: Groceries
+Landlord,Monthly: Rent
+Employer,Income: Salary
+Transfer : Cash,Transfer-out: Cash
+"""
+
+BUDGET_CSV = """category,start,end,amount
+Monthly: Groceries,190001,999912,300
+Monthly: Rent,202301,999912,1000
+"""
+
+BALANCE_CSV = """statement_date,opening_balance,closing_balance
+2022-12-25,0.0,1000.0
+2023-01-25,1000.0,1711.40
+2023-02-25,1711.40,2373.15
+"""
+
+# hsbc exports, newest transaction first
+TXN_CSVS = {
+    "2023-01-25": """24/01/2023,TESCO STORES 1234,-42.10
+20/01/2023,CASH WITHDRAWAL,-50.00
+03/01/2023,LANDLORD LTD,-950.00
+02/01/2023,TESCO STORES 1234,-12.50
+01/01/2023,BALANCE BROUGHT FORWARD,0.00
+31/12/2022,EMPLOYER PLC,"1,766.00"
+""",
+    "2023-02-25": """21/02/2023,TESCO EXPRESS,-33.25
+14/02/2023,CASH WITHDRAWAL,-20.00
+03/02/2023,LANDLORD LTD,-950.00
+31/01/2023,EMPLOYER PLC,"1,665.00"
+""",
+}
+
+FACT_COLUMNS = "account,transaction_date,payee,master_category,subcategory,memo,amount\n"
+
+
+def _write_extracts(extracts_path: Path):
+    _dimensions = Path.joinpath(extracts_path, "dimensions")
+    Path.joinpath(_dimensions, "category.csv").write_text(CATEGORY_CSV)
+    Path.joinpath(_dimensions, "payee_mapping.csv").write_text(PAYEE_MAPPING_CSV)
+    Path.joinpath(_dimensions, "category_mapping.csv").write_text(CATEGORY_MAPPING_CSV)
+    Path.joinpath(_dimensions, "budget.csv").write_text(BUDGET_CSV)
+    Path.joinpath(extracts_path, "balance.csv").write_text(BALANCE_CSV)
+    for _statement_date, _txn_csv in TXN_CSVS.items():
+        Path.joinpath(extracts_path, f"{_statement_date}_txn.csv").write_text(_txn_csv)
+    # fact tables start from the opening balance of the account
+    Path.joinpath(extracts_path, "facts", "transaction_hsbc_dc.csv").write_text(
+        FACT_COLUMNS + "HSBC DC,2022-12-25,Opening,Income,Salary,,1000.0\n")
+    Path.joinpath(extracts_path, "facts", "transaction_cash.csv").write_text(FACT_COLUMNS)
+
+
+def _move_facts(extracts_path: Path):
+    """Move combined fact tables into the facts folder, as done by hand once they are reviewed"""
+    for _path in sorted(extracts_path.glob("transaction_*.csv")):
+        shutil.move(str(_path), str(Path.joinpath(extracts_path, "facts", _path.name)))
+
+
+def _read_outputs(extracts_path: Path) -> dict:
+    _paths = sorted(extracts_path.glob("transaction_*.csv"))
+    _paths += sorted(Path.joinpath(extracts_path, "facts").glob("*.csv"))
+    _paths += sorted(Path.joinpath(extracts_path, "powerbi").iterdir())
+    return {str(_path.relative_to(extracts_path)): _path.read_bytes() for _path in _paths}
+
+
+def test_run_pipeline_writes_the_facts_and_powerbi_files_of_the_standalone_scripts(tmp_path, monkeypatch):
+    _standalone_path = Path.joinpath(tmp_path, "standalone")
+    _pipeline_path = Path.joinpath(tmp_path, "pipeline")
+    for _extracts_path in [_standalone_path, _pipeline_path]:
+        for _folder in ["dimensions", "facts", "powerbi"]:
+            Path.joinpath(_extracts_path, _folder).mkdir(parents=True)
+        _write_extracts(_extracts_path)
+
+    monkeypatch.setattr(utilities.scripts, "EXTRACTS_PATH", _standalone_path)
+    generate_ynab_from_txn.main({})
+    generate_final_from_ynab.main({})
+    _move_facts(_standalone_path)
+    generate_powerbi_files.main({"max_year": 2023})
+
+    monkeypatch.setattr(utilities.scripts, "EXTRACTS_PATH", _pipeline_path)
+    run_pipeline.main({"max_year": 2023})
+    _move_facts(_pipeline_path)
+
+    _standalone = _read_outputs(_standalone_path)
+    _pipeline = _read_outputs(_pipeline_path)
+    assert sorted(_pipeline) == sorted(_standalone)
+    assert {"facts/transaction_cash.csv", "facts/transaction_hsbc_dc.csv",
+            "powerbi/master.csv"} <= set(_pipeline)
+    for _name, _content in _standalone.items():
+        assert _pipeline[_name] == _content, _name
+    # every transaction and both halves of each cash withdrawal reached the fact tables
+    assert _pipeline["facts/transaction_hsbc_dc.csv"].count(b"\n") == 1 + 1 + 9
+    assert _pipeline["facts/transaction_cash.csv"].count(b"\n") == 1 + 4
+
+
+@pytest.mark.parametrize("until, written", [
+    ("facts", {"transaction_cash.csv", "transaction_hsbc_dc.csv"}),
+    ("dim_category", {"powerbi/dim_category.csv"}),
+])
+def test_run_pipeline_until_stops_after_the_stage(tmp_path, monkeypatch, until, written):
+    for _folder in ["dimensions", "facts", "powerbi"]:
+        Path.joinpath(tmp_path, _folder).mkdir()
+    _write_extracts(tmp_path)
+    monkeypatch.setattr(utilities.scripts, "EXTRACTS_PATH", tmp_path)
+    _before = _read_outputs(tmp_path)
+
+    run_pipeline.main({"max_year": 2023, "until": until})
+
+    _changed = {_name for _name, _content in _read_outputs(tmp_path).items() if _before.get(_name) != _content}
+    assert _changed == written
@@ -0,0 +1,119 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from utilities import BalanceIndex, build_category_keys, find_missing_categories, validate_statements
+
+CATEGORY_KEYS = frozenset([("Monthly", "Groceries"), ("Income", "Salary"), ("Transfer-in", "HSBC DC"),
+                           ("Monthly", "Discretionary")])
+
+
+@pytest.fixture(params=[False, True], ids=["float", "exact"])
+def money_mode(request, monkeypatch):
+    if request.param:
+        monkeypatch.setenv("YNAB_EXACT_MONEY", "1")
+    else:
+        monkeypatch.delenv("YNAB_EXACT_MONEY", raising=False)
+    return request.param
+
+
+def _df_txn(rows: list, exact: bool) -> pd.DataFrame:
+    """Transaction df from (master_category, subcategory, amount in pounds) rows"""
+    _amounts = pd.Series([_amount for _, _, _amount in rows], dtype="float64")
+    return pd.DataFrame({
+        "master_category": [_master for _master, _, _ in rows],
+        "subcategory": [_sub for _, _sub, _ in rows],
+        "amount": np.rint(_amounts * 100).astype("int64") if exact else _amounts,
+    })
+
+
+def _balance_index() -> BalanceIndex:
+    return BalanceIndex(pd.DataFrame({
+        "statement_date": ["2024-01-25", "2024-02-25"],
+        "opening_balance": [100.0, 90.9],
+        "closing_balance": [90.9, 1090.6],
+    }))
+
+
+def test_statements_reconcile_with_their_balances(money_mode):
+    _statements = [
+        {"statement_date": "2024-01-25", "file_type": "hsbc_dc", "file_path": "2024-01-25_transaction_hsbc_dc",
+         "df": _df_txn([("Monthly", "Groceries", -4.6), ("Monthly", "Groceries", -4.5)], money_mode)},
+        {"statement_date": "2024-02-25", "file_type": "hsbc_dc",
+         "df": _df_txn([("Income", "Salary", 1000.0), ("Monthly", "Groceries", -0.3)], money_mode)},
+    ]
+
+    _df_report = validate_statements(_statements, category_keys=CATEGORY_KEYS, balance_index=_balance_index())
+
+    assert _df_report["file"].tolist() == ["2024-01-25_transaction_hsbc_dc", ""]
+    assert _df_report["expected_total"].tolist() == [-9.1, 999.7]
+    assert _df_report["actual_total"].tolist() == [-9.1, 999.7]
+    assert _df_report["amount_valid"].tolist() == [True, True]
+    assert _df_report["valid"].tolist() == [True, True]
+    assert _df_report["error"].isna().all()
+
+
+def test_statement_missing_from_balance_index_is_reported(money_mode):
+    _statements = [
+        {"statement_date": "2024-03-25", "file_type": "hsbc_dc",
+         "df": _df_txn([("Monthly", "Groceries", -4.5)], money_mode)},
+        # balances of the statement's own account are used over the shared ones
+        {"statement_date": "2024-01-25", "file_type": "hsbc_cc", "balance_index": BalanceIndex(pd.DataFrame({
+            "statement_date": ["2024-01-25"], "opening_balance": [0.0], "closing_balance": [-4.5]})),
+         "df": _df_txn([("Monthly", "Groceries", -4.5)], money_mode)},
+    ]
+
+    _df_report = validate_statements(_statements, category_keys=CATEGORY_KEYS, balance_index=_balance_index())
+
+    assert _df_report["error"].tolist() == ["statement date 2024-03-25 not found in balance.csv", None]
+    assert np.isnan(_df_report["expected_total"].iloc[0])
+    assert _df_report["actual_total"].tolist() == [-4.5, -4.5]
+    assert _df_report["amount_valid"].tolist() == [False, True]
+    assert _df_report["valid"].tolist() == [False, True]
+
+
+def test_cash_statements_total_nil(money_mode):
+    _statements = [
+        {"statement_date": "2024-01-25", "file_type": "cash", "reconciled": False,
+         "df": _df_txn([("Transfer-in", "HSBC DC", 50.0), ("Monthly", "Discretionary", -50.0)], money_mode)},
+        {"statement_date": "2024-02-25", "file_type": "cash", "reconciled": False,
+         "df": _df_txn([("Transfer-in", "HSBC DC", 20.0), ("Monthly", "Discretionary", -19.99)], money_mode)},
+    ]
+
+    # no balances are needed for cash
+    _df_report = validate_statements(_statements, category_keys=CATEGORY_KEYS, balance_index=None)
+
+    assert _df_report["expected_total"].tolist() == [0.0, 0.0]
+    assert _df_report["actual_total"].tolist() == [0.0, 0.01]
+    assert _df_report["amount_valid"].tolist() == [True, False]
+    assert _df_report["error"].isna().all()
+
+
+def test_missing_categories_are_listed_once_each(money_mode):
+    _df = _df_txn([("Monthly", "Groceries", -1.0), ("Monthly", "Rent", -1.0), ("Monthly", "Groceries", -1.0),
+                   (np.nan, np.nan, -1.0), ("Monthly", "Rent", -2.0), ("Annual", "Insurance", -1.0)], money_mode)
+
+    _df_missing = find_missing_categories(_df, CATEGORY_KEYS)
+    _df_report = validate_statements([{"statement_date": "2024-01-25", "file_type": "hsbc_dc", "df": _df}],
+                                     category_keys=CATEGORY_KEYS, balance_index=_balance_index())
+
+    assert _df_missing.index.tolist() == [1, 3, 4, 5]
+    assert _df_report["missing_categories"].iloc[0] == ["Monthly: Rent", "nan: nan", "Annual: Insurance"]
+    assert not _df_report["category_valid"].iloc[0]
+    assert not _df_report["valid"].iloc[0]
+
+
+def test_missing_categories_of_ynab_df():
+    _df_ynab = pd.DataFrame({"Category": ["Monthly: Groceries", "Monthly: Rent", np.nan, "Income: Salary"]})
+    _df_category = pd.DataFrame({
+        "master_category": ["Monthly", "Monthly", "Income"],
+        "subcategory": ["Groceries", "Rent", "Salary"],
+        "enabled": [1, np.nan, 1],
+    })
+
+    _df_missing = find_missing_categories(_df_ynab, build_category_keys(_df_category), file_type="ynab")
+
+    # disabled categories are missing
+    assert _df_missing.index.tolist() == [1, 2]
+    assert _df_missing["master_category"].tolist()[0] == "Monthly"
+    assert _df_missing["subcategory"].tolist()[0] == "Rent"